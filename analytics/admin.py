@@ -0,0 +1,8 @@
+from django.contrib import admin
+
+from .models import ItemActionDailyStat, RollupMark
+
+# Register your models here.
+
+admin.site.register(ItemActionDailyStat)
+admin.site.register(RollupMark)
@@ -0,0 +1,132 @@
+"""Archiving old log entries to compressed JSON lines files.
+
+ProductItemLogEntries and UserLogEntries older than LOG_ARCHIVE_DAYS are moved out of
+the database by the archive_logs command, run by cron every night. Entries are
+appended to one gzipped JSON lines file per log and day,
+LOG_ARCHIVE_DIR/<log>/<year>/<month>/<date>.jsonl.gz, and deleted in batches of
+BATCH_SIZE entries, one transaction per batch, so the tables are never locked for
+long. A batch is written to its files before it's deleted, so an interrupted run can
+archive entries twice but never loses them, reading skips the duplicates.
+ProductItemLogEntries are archived only after they have been rolled up to the
+analytics stats.
+
+read_archive reads the entries of a date range back one day file at a time, so they
+can be streamed without loading the whole archive.
+"""
+
+import gzip
+import json
+from datetime import date
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import ProductItemLogEntry
+from tavarat_kiertoon.cache import bump_model_cache_version
+from users.models import UserLogEntry
+
+from .models import RollupMark
+from .rollup import ITEM_ACTIONS
+
+BATCH_SIZE = 5000
+PRODUCT_ITEM_LOG = "product_item_log"
+USER_LOG = "user_log"
+SUFFIX = ".jsonl.gz"
+
+
+def archivable_item_log_entries():
+    """ProductItemLogEntries already counted by roll_up_item_actions"""
+    last_id = (
+        RollupMark.objects.filter(name=ITEM_ACTIONS)
+        .values_list("last_id", flat=True)
+        .first()
+    )
+    return ProductItemLogEntry.objects.filter(id__lte=last_id or 0)
+
+
+# log -> (function returning the entries that can be archived, archived fields)
+ARCHIVED_LOGS = {
+    PRODUCT_ITEM_LOG: (
+        archivable_item_log_entries,
+        ["id", "date", "action", "product_item", "user"],
+    ),
+    USER_LOG: (
+        UserLogEntry.objects.all,
+        ["id", "date", "action", "target", "user_who_did_this_action"],
+    ),
+}
+
+
+def archive_path(log, day):
+    return (
+        Path(settings.LOG_ARCHIVE_DIR)
+        / log
+        / f"{day:%Y}"
+        / f"{day:%m}"
+        / f"{day.isoformat()}{SUFFIX}"
+    )
+
+
+def write_entries(log, entries):
+    """Appends entries, dicts of the archived fields, to the files of their days"""
+    days = {}
+    for entry in entries:
+        days.setdefault(timezone.localdate(entry["date"]), []).append(entry)
+    for day, day_entries in days.items():
+        path = archive_path(log, day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # every append is a new gzip member, gzip reads them as one file
+        with gzip.open(path, "at", encoding="utf-8") as file:
+            file.writelines(
+                json.dumps(entry, cls=DjangoJSONEncoder) + "\n" for entry in day_entries
+            )
+
+
+def archive_log(log, before, batch_size=BATCH_SIZE):
+    """Moves entries of log older than before from the database to the archive files.
+    Returns amount of archived entries."""
+    entries_of_log, fields = ARCHIVED_LOGS[log]
+    archived = 0
+    while True:
+        with transaction.atomic():
+            entries = list(
+                entries_of_log()
+                .select_for_update(skip_locked=True)
+                .filter(date__lt=before)
+                .order_by("id")
+                .values(*fields)[:batch_size]
+            )
+            write_entries(log, entries)
+            entries_of_log().filter(id__in=[entry["id"] for entry in entries]).delete()
+            # the log models aren't tracked, their deletes don't signal every row
+            bump_model_cache_version(entries_of_log().model)
+        archived += len(entries)
+        if len(entries) < batch_size:
+            return archived
+
+
+def archive_days(log, start=None, end=None):
+    """Archive files of log from start to end date, in date order"""
+    for path in sorted(Path(settings.LOG_ARCHIVE_DIR, log).glob(f"*/*/*{SUFFIX}")):
+        day = date.fromisoformat(path.name.removesuffix(SUFFIX))
+        if (start is None or day >= start) and (end is None or day <= end):
+            yield path
+
+
+def read_archive(log, start=None, end=None, **filters):
+    """Archived entries of log from start to end date, oldest day first, whose fields
+    have the values in filters"""
+    for path in archive_days(log, start, end):
+        seen = set()
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            for line in file:
+                entry = json.loads(line)
+                if entry["id"] in seen or any(
+                    entry[field] != value for field, value in filters.items()
+                ):
+                    continue
+                seen.add(entry["id"])
+                yield entry
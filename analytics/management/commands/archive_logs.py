@@ -0,0 +1,37 @@
+import time
+from datetime import timedelta
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from analytics.archive import ARCHIVED_LOGS, BATCH_SIZE, archive_log
+
+
+class Command(BaseCommand):
+    help = "Moves old product item and user log entries to the log archive files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.LOG_ARCHIVE_DAYS,
+            help="Entries older than this many days are archived",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Amount of log entries archived per transaction",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        before = timezone.now() - timedelta(days=options["days"])
+        for log in ARCHIVED_LOGS:
+            start = time.monotonic()
+            archived = archive_log(log, before, options["batch_size"])
+            self.stdout.write(
+                f"Archived {archived} {log} entries in "
+                f"{time.monotonic() - start:.2f}s."
+            )
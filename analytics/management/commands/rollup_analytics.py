@@ -0,0 +1,25 @@
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from analytics.rollup import BATCH_SIZE, roll_up_item_actions
+
+
+class Command(BaseCommand):
+    help = "Rolls up new ProductItemLogEntries to the analytics stats"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Amount of log entries rolled up per transaction",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        start = time.monotonic()
+        rolled_up = roll_up_item_actions(options["batch_size"])
+        self.stdout.write(
+            f"Rolled up {rolled_up} log entries in {time.monotonic() - start:.2f}s."
+        )
@@ -0,0 +1,75 @@
+# Generated by Django 4.1.4 on 2026-10-17 12:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("products", "0024_productitem_modified_idx"),
+        ("categories", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupMark",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("last_id", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ItemActionDailyStat",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("date", models.DateField()),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("Created", "Create"),
+                            ("Added to shopping cart", "Cart Add"),
+                            ("Removed from shopping cart", "Cart Remove"),
+                            ("Timed out from shopping cart", "Cart Timeout"),
+                            ("Ordered", "Order"),
+                            ("Added to order", "Order Add"),
+                            ("Removed from order", "Order Remove"),
+                            ("Came back to circulation", "Circulation"),
+                            ("Modified at storage", "Modify"),
+                            ("Gifted away", "Gift"),
+                        ],
+                        max_length=255,
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="categories.category",
+                    ),
+                ),
+                (
+                    "storage",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="products.storage",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="itemactiondailystat",
+            index=models.Index(
+                fields=["date", "action"], name="itemactiondailystat_idx"
+            ),
+        ),
+    ]
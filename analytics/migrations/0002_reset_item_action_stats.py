@@ -0,0 +1,21 @@
+# Generated by Django 4.1.4 on 2026-10-17 12:20
+
+from django.db import migrations
+
+
+def reset_item_action_stats(apps, schema_editor):
+    """Log entries got new ids when they were split per item, so the stats are rolled
+    up again from the start"""
+    apps.get_model("analytics", "ItemActionDailyStat").objects.all().delete()
+    apps.get_model("analytics", "RollupMark").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0001_initial"),
+        ("products", "0027_remove_productitem_log_entries"),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_item_action_stats, migrations.RunPython.noop),
+    ]
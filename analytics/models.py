@@ -0,0 +1,42 @@
+from django.db import models
+
+from categories.models import Category
+from products.models import ProductItemLogEntry, Storage
+
+
+class ItemActionDailyStat(models.Model):
+    """Amount of ProductItems that had action done to them on date, per Category of
+    their Product and their Storage. Rolled up from ProductItemLogEntries, see
+    analytics.rollup."""
+
+    id = models.BigAutoField(primary_key=True)
+    date = models.DateField()
+    action = models.CharField(
+        max_length=255, choices=ProductItemLogEntry.ActionChoices.choices
+    )
+    category = models.ForeignKey(
+        Category, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    storage = models.ForeignKey(
+        Storage, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.date} {self.action}: {self.count}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["date", "action"], name="itemactiondailystat_idx")
+        ]
+
+
+class RollupMark(models.Model):
+    """High-water mark of a rollup, id of the last row it has rolled up"""
+
+    id = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=255, unique=True)
+    last_id = models.BigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"Rollup {self.name} at {self.last_id}"
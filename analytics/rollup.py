@@ -0,0 +1,93 @@
+"""Rolling ProductItemLogEntries up to ItemActionDailyStats.
+
+Every run continues from the high-water mark, the id of the last rolled up log entry,
+and adds the newer entries to the daily counts with one aggregate query per batch, so
+reports never have to read the raw log. Entries younger than ROLLUP_DELAY are left
+for the next run, so that entries of transactions committing after newer ones aren't
+skipped over. The mark is locked for the batch, concurrent runs wait for each other
+instead of counting entries twice.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from products.models import ProductItemLogEntry
+
+from .models import ItemActionDailyStat, RollupMark
+
+BATCH_SIZE = 5000
+ROLLUP_DELAY = timedelta(minutes=5)
+ITEM_ACTIONS = "item_actions"
+
+
+def add_item_action_counts(log_entries):
+    """Adds the counts of log_entries to the daily stats with one aggregate query, one
+    read of the stats of those days and one bulk update and insert"""
+    counts = list(
+        log_entries.values(
+            "action",
+            day=TruncDate("date"),
+            category=F("product_item__product__category"),
+            storage=F("product_item__storage"),
+        )
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    stats = {
+        (stat.date, stat.action, stat.category_id, stat.storage_id): stat
+        for stat in ItemActionDailyStat.objects.filter(
+            date__in={row["day"] for row in counts}
+        )
+    }
+    updated = []
+    created = []
+    for row in counts:
+        key = (row["day"], row["action"], row["category"], row["storage"])
+        if key in stats:
+            stats[key].count += row["count"]
+            updated.append(stats[key])
+        else:
+            created.append(
+                ItemActionDailyStat(
+                    date=row["day"],
+                    action=row["action"],
+                    category_id=row["category"],
+                    storage_id=row["storage"],
+                    count=row["count"],
+                )
+            )
+    ItemActionDailyStat.objects.bulk_update(updated, ["count"])
+    ItemActionDailyStat.objects.bulk_create(created)
+
+
+def roll_up_item_actions(batch_size=BATCH_SIZE):
+    """Rolls up the log entries after the high-water mark, batch_size entries per
+    transaction. Returns amount of rolled up log entries."""
+    rolled_up = 0
+    while True:
+        with transaction.atomic():
+            RollupMark.objects.get_or_create(name=ITEM_ACTIONS)
+            mark = RollupMark.objects.select_for_update().get(name=ITEM_ACTIONS)
+            entry_ids = list(
+                ProductItemLogEntry.objects.filter(
+                    id__gt=mark.last_id, date__lte=timezone.now() - ROLLUP_DELAY
+                )
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not entry_ids:
+                return rolled_up
+            add_item_action_counts(
+                ProductItemLogEntry.objects.filter(
+                    id__gt=mark.last_id, id__lte=entry_ids[-1]
+                )
+            )
+            mark.last_id = entry_ids[-1]
+            mark.save()
+        rolled_up += len(entry_ids)
+        if len(entry_ids) < batch_size:
+            return rolled_up
@@ -0,0 +1,49 @@
+from rest_framework import serializers
+
+from products.models import ProductItemLogEntry
+from users.models import UserLogEntry
+
+
+class ItemActionStatSerializer(serializers.Serializer):
+    period = serializers.DateField()
+    action = serializers.ChoiceField(choices=ProductItemLogEntry.ActionChoices.choices)
+    category = serializers.IntegerField(allow_null=True)
+    storage = serializers.IntegerField(allow_null=True)
+    count = serializers.IntegerField()
+
+
+class ArchivedLogRequestSerializer(serializers.Serializer):
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+
+class ArchivedItemLogRequestSerializer(ArchivedLogRequestSerializer):
+    action = serializers.ChoiceField(
+        choices=ProductItemLogEntry.ActionChoices.choices, required=False
+    )
+    product_item = serializers.IntegerField(required=False)
+    user = serializers.IntegerField(required=False)
+
+
+class ArchivedUserLogRequestSerializer(ArchivedLogRequestSerializer):
+    action = serializers.ChoiceField(
+        choices=UserLogEntry.ActionChoices.choices, required=False
+    )
+    target = serializers.IntegerField(required=False)
+    user_who_did_this_action = serializers.IntegerField(required=False)
+
+
+class ArchivedItemLogEntrySerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    date = serializers.DateTimeField()
+    action = serializers.ChoiceField(choices=ProductItemLogEntry.ActionChoices.choices)
+    product_item = serializers.IntegerField(allow_null=True)
+    user = serializers.IntegerField(allow_null=True)
+
+
+class ArchivedUserLogEntrySerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    date = serializers.DateTimeField()
+    action = serializers.ChoiceField(choices=UserLogEntry.ActionChoices.choices)
+    target = serializers.IntegerField(allow_null=True)
+    user_who_did_this_action = serializers.IntegerField(allow_null=True)
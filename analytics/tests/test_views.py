@@ -0,0 +1,247 @@
+import datetime
+import json
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db.models.deletion import Collector
+from django.test import TestCase
+from django.utils import timezone
+
+from analytics.archive import (
+    ARCHIVED_LOGS,
+    PRODUCT_ITEM_LOG,
+    USER_LOG,
+    archive_log,
+    write_entries,
+)
+from analytics.models import ItemActionDailyStat, RollupMark
+from analytics.rollup import ITEM_ACTIONS, roll_up_item_actions
+from categories.models import Category
+from products.bulk import create_product_items, transition_product_items
+from products.models import Product, ProductItem, ProductItemLogEntry, Storage
+from users.models import CustomUser, UserLogEntry
+
+
+class TestAnalytics(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = CustomUser.objects.create_user(
+            first_name="Analyysi",
+            last_name="Anna",
+            email="analyysianna@turku.fi",
+            phone_number="1112223344",
+            password="asd123",
+            address="Karvakuja 1",
+            zip_code="100100",
+            city="Puuhamaa",
+            username="analyysianna@turku.fi",
+            group="user_group",
+        )
+        cls.test_user.is_active = True
+        cls.test_user.save()
+        group, _ = Group.objects.get_or_create(name="admin_group")
+        group.user_set.add(cls.test_user)
+
+        cls.test_storage1 = Storage.objects.create(name="mokkavarasto")
+        cls.test_storage2 = Storage.objects.create(name="italiangoldstorage")
+        cls.test_parentcategory = Category.objects.create(name="huonekalut")
+        cls.test_category1 = Category.objects.create(
+            name="sohvat", parent=cls.test_parentcategory
+        )
+        cls.test_category2 = Category.objects.create(name="astiat")
+        cls.test_product1 = Product.objects.create(
+            category=cls.test_category1, name="nahkasohva", price=0, weight=50
+        )
+        cls.test_product2 = Product.objects.create(
+            category=cls.test_category2, name="kahvikuppi", price=0, weight=1
+        )
+        create_product_items(
+            cls.test_product1, 3, cls.test_user, storage=cls.test_storage1
+        )
+        create_product_items(
+            cls.test_product2, 5, cls.test_user, storage=cls.test_storage2
+        )
+        transition_product_items(
+            ProductItem.objects.filter(product=cls.test_product2),
+            "Unavailable",
+            cls.test_user,
+            amount=2,
+        )
+        cls.last_month = timezone.now() - datetime.timedelta(days=31)
+        ProductItemLogEntry.objects.update(date=cls.last_month)
+
+    def test_roll_up_item_actions(self):
+        self.assertEqual(roll_up_item_actions(batch_size=3), 10)
+        self.assertEqual(
+            RollupMark.objects.get(name=ITEM_ACTIONS).last_id,
+            ProductItemLogEntry.objects.latest("id").id,
+        )
+        stats = {
+            (stat.action, stat.category_id, stat.storage_id): stat.count
+            for stat in ItemActionDailyStat.objects.all()
+        }
+        self.assertEqual(
+            stats,
+            {
+                ("Created", self.test_category1.id, self.test_storage1.id): 3,
+                ("Created", self.test_category2.id, self.test_storage2.id): 5,
+                (
+                    "Modified at storage",
+                    self.test_category2.id,
+                    self.test_storage2.id,
+                ): 2,
+            },
+        )
+
+        # later entries are added to the counts, recent ones are left for later
+        transition_product_items(
+            ProductItem.objects.filter(product=self.test_product1),
+            "Unavailable",
+            self.test_user,
+        )
+        self.assertEqual(roll_up_item_actions(), 0)
+        ProductItemLogEntry.objects.update(date=self.last_month)
+        out = StringIO()
+        call_command("rollup_analytics", stdout=out)
+        self.assertIn("Rolled up 3 log entries in", out.getvalue())
+        self.assertEqual(ItemActionDailyStat.objects.count(), 4)
+        self.assertEqual(
+            ItemActionDailyStat.objects.get(
+                action="Modified at storage", category=self.test_category1
+            ).count,
+            3,
+        )
+
+    def test_get_item_action_stats(self):
+        roll_up_item_actions()
+        url = "/analytics/item_actions/"
+        self.client.login(username="analyysianna@turku.fi", password="asd123")
+        month = timezone.localdate(self.last_month).replace(day=1).isoformat()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            [
+                {
+                    "period": month,
+                    "action": "Created",
+                    "category": self.test_category1.id,
+                    "storage": self.test_storage1.id,
+                    "count": 3,
+                },
+                {
+                    "period": month,
+                    "action": "Created",
+                    "category": self.test_category2.id,
+                    "storage": self.test_storage2.id,
+                    "count": 5,
+                },
+                {
+                    "period": month,
+                    "action": "Modified at storage",
+                    "category": self.test_category2.id,
+                    "storage": self.test_storage2.id,
+                    "count": 2,
+                },
+            ],
+        )
+
+        # subcategories are included in their parent category
+        response = self.client.get(
+            url, {"category": self.test_parentcategory.id, "period": "day"}
+        )
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(
+            response.json()[0]["period"],
+            timezone.localdate(self.last_month).isoformat(),
+        )
+
+        response = self.client.get(
+            url,
+            {
+                "action": "Modified at storage",
+                "start_date": timezone.localdate().isoformat(),
+            },
+        )
+        self.assertEqual(response.json(), [])
+
+    def test_get_item_action_stats_forbidden(self):
+        self.client.login(username="analyysianna@turku.fi", password="asd123")
+        Group.objects.get(name="admin_group").user_set.remove(self.test_user)
+        response = self.client.get("/analytics/item_actions/")
+        self.assertEqual(response.status_code, 403)
+
+    def test_archive_logs(self):
+        # cron runs the command outside the project directory
+        self.assertTrue(settings.LOG_ARCHIVE_DIR.is_absolute())
+        # archived batches are deleted with one query, without signals per row
+        self.assertTrue(Collector("default").can_fast_delete(UserLogEntry))
+        self.assertTrue(Collector("default").can_fast_delete(ProductItemLogEntry))
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        self.enterContext(self.settings(LOG_ARCHIVE_DIR=archive_dir))
+        old_user_entry = UserLogEntry.objects.create(
+            target=self.test_user, action=UserLogEntry.ActionChoices.CREATED
+        )
+        UserLogEntry.objects.update(date=self.last_month)
+        UserLogEntry.objects.create(
+            target=self.test_user, action=UserLogEntry.ActionChoices.ACTIVATED
+        )
+        week_ago = timezone.now() - datetime.timedelta(days=7)
+
+        # entries that aren't rolled up yet are kept
+        self.assertEqual(archive_log(PRODUCT_ITEM_LOG, week_ago), 0)
+        roll_up_item_actions()
+        # an interrupted run archived some entries without deleting them
+        entries_of_log, fields = ARCHIVED_LOGS[PRODUCT_ITEM_LOG]
+        write_entries(
+            PRODUCT_ITEM_LOG, entries_of_log().order_by("id").values(*fields)[:3]
+        )
+
+        out = StringIO()
+        call_command("archive_logs", days=7, batch_size=3, stdout=out)
+        self.assertIn("Archived 10 product_item_log entries in", out.getvalue())
+        self.assertIn("Archived 1 user_log entries in", out.getvalue())
+        self.assertFalse(ProductItemLogEntry.objects.exists())
+        self.assertEqual(UserLogEntry.objects.count(), 1)
+
+        self.client.login(username="analyysianna@turku.fi", password="asd123")
+        response = self.client.get("/analytics/archive/item_log/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        entries = [json.loads(line) for line in response.streaming_content]
+        self.assertEqual(len(entries), 10)
+        self.assertEqual(len({entry["id"] for entry in entries}), 10)
+
+        item = ProductItem.objects.filter(product=self.test_product2).first()
+        response = self.client.get(
+            "/analytics/archive/item_log/",
+            {"product_item": item.id, "action": "Created"},
+        )
+        entries = [json.loads(line) for line in response.streaming_content]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]["product_item"], item.id)
+        self.assertEqual(entries[0]["user"], self.test_user.id)
+
+        response = self.client.get(
+            "/analytics/archive/item_log/",
+            {"start_date": timezone.localdate().isoformat()},
+        )
+        self.assertEqual(list(response.streaming_content), [])
+
+        response = self.client.get(
+            "/analytics/archive/user_log/", {"target": self.test_user.id}
+        )
+        entries = [json.loads(line) for line in response.streaming_content]
+        self.assertEqual(
+            [(entry["id"], entry["action"]) for entry in entries],
+            [(old_user_entry.id, "User was created")],
+        )
+
+        response = self.client.get("/analytics/archive/user_log/", {"action": "x"})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,160 @@
+import json
+
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.http import StreamingHttpResponse
+from django_filters import rest_framework as filters
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
+from rest_framework import generics
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from categories.models import Category
+from products.models import ProductItemLogEntry, Storage
+from users.models import UserLogEntry
+from users.permissions import HasGroupPermission
+from users.views import CustomJWTAuthentication
+
+from .archive import PRODUCT_ITEM_LOG, USER_LOG, read_archive
+from .models import ItemActionDailyStat
+from .serializers import (
+    ArchivedItemLogEntrySerializer,
+    ArchivedItemLogRequestSerializer,
+    ArchivedUserLogEntrySerializer,
+    ArchivedUserLogRequestSerializer,
+    ItemActionStatSerializer,
+)
+
+
+class ItemActionStatFilter(filters.FilterSet):
+    start_date = filters.DateFilter(field_name="date", lookup_expr="gte")
+    end_date = filters.DateFilter(field_name="date", lookup_expr="lte")
+    action = filters.MultipleChoiceFilter(
+        choices=ProductItemLogEntry.ActionChoices.choices
+    )
+    category = filters.ModelMultipleChoiceFilter(
+        queryset=Category.objects.all(), method="category_filter"
+    )
+    storage = filters.ModelMultipleChoiceFilter(queryset=Storage.objects.all())
+
+    class Meta:
+        model = ItemActionDailyStat
+        fields = ["start_date", "end_date", "action", "category", "storage"]
+
+    def category_filter(self, queryset, name, value):
+        """Stats of the categories and their subcategories"""
+        if not value:
+            return queryset
+        categories = Category.objects.get_queryset_descendants(
+            Category.objects.filter(id__in=[category.id for category in value]),
+            include_self=True,
+        )
+        return queryset.filter(category__in=categories)
+
+
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[
+            OpenApiParameter("period", OpenApiTypes.STR, enum=["day", "month"]),
+        ],
+    )
+)
+class ItemActionStatListView(generics.ListAPIView):
+    """Amounts of ProductItems per action, Category and Storage, per month or with
+    period=day per day. Answered from the ItemActionDailyStat rollup."""
+
+    serializer_class = ItemActionStatSerializer
+    queryset = ItemActionDailyStat.objects.all()
+    authentication_classes = [
+        SessionAuthentication,
+        BasicAuthentication,
+        JWTAuthentication,
+        CustomJWTAuthentication,
+    ]
+    permission_classes = [IsAuthenticated, HasGroupPermission]
+    required_groups = {
+        "GET": ["admin_group"],
+    }
+    filter_backends = [filters.DjangoFilterBackend]
+    filterset_class = ItemActionStatFilter
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("period") == "day":
+            period = F("date")
+        else:
+            period = TruncMonth("date")
+        stats = (
+            self.filter_queryset(self.get_queryset())
+            .values("action", "category", "storage", period=period)
+            .annotate(count=Sum("count"))
+            .order_by("period", "action", "category", "storage")
+        )
+        serializer = self.get_serializer(stats, many=True)
+        return Response(serializer.data)
+
+
+class ArchivedLogView(generics.GenericAPIView):
+    """Streams archived entries of log as JSON lines, oldest first, filtered by the
+    query parameters. Read from the archive files written by archive_logs."""
+
+    log = None
+    authentication_classes = [
+        SessionAuthentication,
+        BasicAuthentication,
+        JWTAuthentication,
+        CustomJWTAuthentication,
+    ]
+    permission_classes = [IsAuthenticated, HasGroupPermission]
+    required_groups = {
+        "GET": ["admin_group"],
+    }
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        filters = dict(serializer.validated_data)
+        entries = read_archive(
+            self.log,
+            filters.pop("start_date", None),
+            filters.pop("end_date", None),
+            **filters,
+        )
+        return StreamingHttpResponse(
+            (json.dumps(entry) + "\n" for entry in entries),
+            content_type="application/x-ndjson",
+        )
+
+
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[ArchivedItemLogRequestSerializer],
+        responses={
+            (200, "application/x-ndjson"): ArchivedItemLogEntrySerializer(many=True)
+        },
+    )
+)
+class ArchivedItemLogView(ArchivedLogView):
+    """Streams archived ProductItemLogEntries"""
+
+    log = PRODUCT_ITEM_LOG
+    queryset = ProductItemLogEntry.objects.none()
+    serializer_class = ArchivedItemLogRequestSerializer
+
+
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[ArchivedUserLogRequestSerializer],
+        responses={
+            (200, "application/x-ndjson"): ArchivedUserLogEntrySerializer(many=True)
+        },
+    )
+)
+class ArchivedUserLogView(ArchivedLogView):
+    """Streams archived UserLogEntries"""
+
+    log = USER_LOG
+    queryset = UserLogEntry.objects.none()
+    serializer_class = ArchivedUserLogRequestSerializer
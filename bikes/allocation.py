@@ -0,0 +1,103 @@
+"""Allocating free BikeStock and BikeTrailers to new rentals.
+
+A bike or trailer is free for a rental if it's available and none of its
+BikeRentalAssignments has a reserved_period overlapping the reserved_period of the
+new rental. The free ones are found with one overlap query per requested bike model,
+served by the GiST index of the exclusion constraints, without reading the rental
+history of the fleet. The found rows are locked with SELECT ... FOR UPDATE SKIP
+LOCKED, so a bike being allocated to a concurrent rental is skipped and the next free
+one taken instead.
+
+The exclusion constraints are what finally keeps two rentals from getting the same
+bike: a rental committed after the free bikes were looked up makes saving the
+assignments fail. retry_on_conflict then allocates again, the bikes of the committed
+rental are no longer free.
+"""
+
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.db import IntegrityError, transaction
+
+from .models import BikePackage, BikeRentalAssignment, BikeStock, BikeTrailer
+
+PACKAGE_PREFIX = "package-"
+MAX_ATTEMPTS = 3
+ASSIGNMENT_CONSTRAINTS = {
+    constraint.name
+    for constraint in BikeRentalAssignment._meta.constraints
+    if isinstance(constraint, ExclusionConstraint)
+}
+
+
+def free_bike_stock(bike, period, amount, for_package=False, exclude_ids=()):
+    """Locks and returns ids of up to amount BikeStock of bike model free for period.
+    Packages take bikes reserved for packages first, other rentals don't get them."""
+    stock = (
+        BikeStock.objects.filter(bike=bike, state=BikeStock.StateChoices.AVAILABLE)
+        .exclude(id__in=exclude_ids)
+        .exclude(assignments__reserved_period__overlap=period)
+    )
+    if for_package:
+        stock = stock.order_by("-package_only", "id")
+    else:
+        stock = stock.filter(package_only=False).order_by("id")
+    return list(
+        stock.select_for_update(skip_locked=True, of=("self",)).values_list(
+            "id", flat=True
+        )[:amount]
+    )
+
+
+def allocate_bikes(requested, period):
+    """Locks and returns ids of free BikeStock for period, requested being
+    {bike model id or "package-<package id>": amount}. Returns None if there aren't
+    enough free bikes for all of them."""
+    bike_ids = []
+    for key, amount in requested.items():
+        if key.startswith(PACKAGE_PREFIX):
+            package = BikePackage.objects.get(id=key.removeprefix(PACKAGE_PREFIX))
+            wanted = [
+                (bike_amount["bike"], amount * bike_amount["amount"], True)
+                for bike_amount in package.bikes.values("bike", "amount")
+            ]
+        else:
+            wanted = [(key, amount, False)]
+        for bike, bike_amount, for_package in wanted:
+            free_ids = free_bike_stock(
+                bike, period, bike_amount, for_package, exclude_ids=bike_ids
+            )
+            if len(free_ids) < bike_amount:
+                return None
+            bike_ids += free_ids
+    return bike_ids
+
+
+def allocate_trailer(trailer_type, period):
+    """Locks and returns id of a free BikeTrailer of trailer_type for period, None if
+    there isn't one"""
+    return (
+        BikeTrailer.objects.filter(trailer_type=trailer_type)
+        .exclude(assignments__reserved_period__overlap=period)
+        .select_for_update(skip_locked=True, of=("self",))
+        .order_by("id")
+        .values_list("id", flat=True)
+        .first()
+    )
+
+
+def is_assignment_conflict(error):
+    """Whether IntegrityError error was raised by overlapping BikeRentalAssignments"""
+    diag = getattr(error.__cause__, "diag", None)
+    return diag is not None and diag.constraint_name in ASSIGNMENT_CONSTRAINTS
+
+
+def retry_on_conflict(function, attempts=MAX_ATTEMPTS):
+    """Calls function, allocating and saving a rental, in a savepoint and calls it
+    again if it conflicted with a concurrent rental, at most attempts times. Returns
+    what function returns, the IntegrityError of the last conflict is raised."""
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic():
+                return function()
+        except IntegrityError as error:
+            if attempt == attempts or not is_assignment_conflict(error):
+                raise
@@ -0,0 +1,212 @@
+"""Availability of bikes and trailers per day.
+
+A rented bike or trailer is unavailable during the reserved_period of the rental,
+from its first day until the warehouse workers have had MAINTENANCE_DAYS business
+days to maintain it after the rental has ended. The rentals reserved for today or
+later are loaded as intervals with one query on BikeRentalAssignment, served by the
+GiST indexes of its exclusion constraints on the asset and reserved_period, and the
+amount of unavailable bikes per day is counted with a sweep over the starts and ends
+of the intervals. The work depends on the number of rentals, not on their length or
+on the size of the stock.
+
+The calendar of each bike model and trailer model, its available stock and
+unavailable amounts per day, is cached in its own namespace, see
+tavarat_kiertoon.cache. The signals in bikes.models invalidate only the calendars of
+the models whose stock or rentals changed, so after a booking the next request
+recomputes one or two calendars instead of all of them. The calendars of packages
+are derived from the calendars of their bikes.
+"""
+
+import datetime
+from collections import defaultdict
+
+from django.db.models import Count, Q
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
+
+from tavarat_kiertoon.cache import get_or_compute_many, versioned_keys
+
+from .models import (
+    Bike,
+    BikeRentalAssignment,
+    BikeStock,
+    BikeTrailerModel,
+    calendar_namespace,
+    day_start,
+)
+
+DATE_FORMAT = "%d.%m.%Y"
+# months of calendar one request can get, rentals are booked up to half a year ahead
+CALENDAR_MONTHS = 6
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def occupancy(intervals):
+    """Amount of intervals covering each day, intervals being inclusive (first, last)
+    day pairs. Days not covered by any interval are left out."""
+    changes = defaultdict(int)
+    for first, last in intervals:
+        changes[first] += 1
+        changes[last + ONE_DAY] -= 1
+    counts = {}
+    covering = 0
+    days = sorted(changes)
+    for day, next_change in zip(days, days[1:]):
+        covering += changes[day]
+        while covering and day < next_change:
+            counts[day] = covering
+            day += ONE_DAY
+    return counts
+
+
+def unavailable_days(rentals, today):
+    """Amount of unavailable assets per day from today on, as key -> {day: amount},
+    rentals being (key, reserved_period) of each rented asset"""
+    intervals = defaultdict(list)
+    for key, period in rentals:
+        first = timezone.localdate(period.lower)
+        last = timezone.localdate(period.upper) - ONE_DAY
+        if last >= today:
+            intervals[key].append((max(first, today), last))
+    return {key: occupancy(key_intervals) for key, key_intervals in intervals.items()}
+
+
+def format_days(counts, first):
+    """counts of days from first on with the days formatted as DATE_FORMAT"""
+    return {
+        day.strftime(DATE_FORMAT): count
+        for day, count in counts.items()
+        if day >= first
+    }
+
+
+def unavailability(rentals, today):
+    """unavailable_days with the days formatted as DATE_FORMAT"""
+    return {
+        key: format_days(counts, today)
+        for key, counts in unavailable_days(rentals, today).items()
+    }
+
+
+def from_day(day):
+    """Period from the beginning of day on"""
+    return DateTimeTZRange(day_start(day), None)
+
+
+def bike_calendar_entries(bike_ids, today):
+    """Calendars of bike models, as bike model id -> {"stock": available stock,
+    "package_stock": available stock reserved for packages, "unavailable": {day:
+    amount of unavailable stock}, "package_only_unavailable": {day: amount of
+    unavailable stock reserved for packages}} from today on"""
+    available = Q(stock__state=BikeStock.StateChoices.AVAILABLE)
+    calendars = {
+        bike_id: {
+            "stock": stock,
+            "package_stock": package_stock,
+            "unavailable": {},
+            "package_only_unavailable": {},
+        }
+        for bike_id, stock, package_stock in Bike.objects.filter(id__in=bike_ids)
+        .annotate(
+            available_stock=Count(
+                "stock", filter=available & Q(stock__package_only=False)
+            ),
+            package_stock=Count(
+                "stock", filter=available & Q(stock__package_only=True)
+            ),
+        )
+        .values_list("id", "available_stock", "package_stock")
+    }
+    rentals = BikeRentalAssignment.objects.filter(
+        bike_stock__bike__in=bike_ids, reserved_period__overlap=from_day(today)
+    ).values_list("bike_stock__bike", "bike_stock__package_only", "reserved_period")
+    unavailable = unavailable_days(
+        (
+            ((bike_id, package_only), period)
+            for bike_id, package_only, period in rentals
+        ),
+        today,
+    )
+    for (bike_id, package_only), counts in unavailable.items():
+        key = "package_only_unavailable" if package_only else "unavailable"
+        calendars[bike_id][key] = counts
+    return calendars
+
+
+def trailer_calendar_entries(trailer_type_ids, today):
+    """Calendars of trailer models, as trailer model id -> {"stock": amount of
+    trailers, "unavailable": {day: amount of unavailable trailers}} from today on"""
+    calendars = {
+        trailer_type["id"]: {"stock": trailer_type["stock"], "unavailable": {}}
+        for trailer_type in BikeTrailerModel.objects.filter(id__in=trailer_type_ids)
+        .annotate(stock=Count("trailer"))
+        .values("id", "stock")
+    }
+    rentals = BikeRentalAssignment.objects.filter(
+        bike_trailer__trailer_type__in=trailer_type_ids,
+        reserved_period__overlap=from_day(today),
+    ).values_list("bike_trailer__trailer_type", "reserved_period")
+    for trailer_type_id, counts in unavailable_days(rentals, today).items():
+        calendars[trailer_type_id]["unavailable"] = counts
+    return calendars
+
+
+def cached_calendars(model, pks, compute):
+    """Calendars of instances pks of model, computed with compute(pks, today) for the
+    ones that aren't cached. A cached calendar stays valid on the following days, its
+    days before today are just ignored."""
+    keys = versioned_keys([calendar_namespace(model, pk) for pk in pks], "calendar")
+    pks_of_keys = {keys[calendar_namespace(model, pk)]: pk for pk in pks}
+
+    def compute_missing(missing):
+        calendars = compute([pks_of_keys[key] for key in missing], timezone.localdate())
+        # every key needs a value, a deleted instance gets an empty calendar
+        return {key: calendars.get(pks_of_keys[key]) or {} for key in missing}
+
+    values = get_or_compute_many(list(pks_of_keys), compute_missing)
+    return {pk: values[key] for key, pk in pks_of_keys.items() if values[key]}
+
+
+def bike_calendars(bike_ids):
+    return cached_calendars(Bike, bike_ids, bike_calendar_entries)
+
+
+def trailer_calendars(trailer_type_ids):
+    return cached_calendars(
+        BikeTrailerModel, trailer_type_ids, trailer_calendar_entries
+    )
+
+
+def window(first, last):
+    """Days from first to last, both included"""
+    return [first + ONE_DAY * number for number in range((last - first).days + 1)]
+
+
+def free_stock(calendar, days):
+    """Amount of bikes or trailers free for rentals on each of days, calendar being the
+    calendar of their model"""
+    return {
+        day: max(calendar["stock"] - calendar["unavailable"].get(day, 0), 0)
+        for day in days
+    }
+
+
+def free_packages(bike_amounts, calendars, days):
+    """Amount of packages free on each of days, bike_amounts being (bike model id,
+    amount) of the bikes in the package. Packages take both the stock reserved for
+    packages and the other stock."""
+    free = {}
+    for day in days:
+        amounts = [
+            (
+                calendars[bike_id]["stock"]
+                + calendars[bike_id]["package_stock"]
+                - calendars[bike_id]["unavailable"].get(day, 0)
+                - calendars[bike_id]["package_only_unavailable"].get(day, 0)
+            )
+            // amount
+            for bike_id, amount in bike_amounts
+            if amount > 0
+        ]
+        free[day] = max(min(amounts, default=0), 0)
+    return free
@@ -0,0 +1,28 @@
+# Generated by Django 4.1.4 on 2026-10-17 11:20
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+import django.db.models.functions.text
+import products.search
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bikes", "0012_alter_biketrailer_trailer_type"),
+        ("products", "0022_product_name_trgm_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bike",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    products.search.ImmutableUnaccent(
+                        django.db.models.functions.text.Lower("name")
+                    ),
+                    name="gin_trgm_ops",
+                ),
+                name="bike_name_trgm_idx",
+            ),
+        ),
+    ]
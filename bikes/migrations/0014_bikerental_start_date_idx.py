@@ -0,0 +1,18 @@
+# Generated by Django 4.1.4 on 2026-10-17 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bikes", "0013_bike_name_trgm_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bikerental",
+            index=models.Index(
+                fields=["start_date", "id"], name="bikerental_start_date_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.1.4 on 2026-10-17 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bikes", "0014_bikerental_start_date_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bikerental",
+            index=models.Index(fields=["end_date"], name="bikerental_end_date_idx"),
+        ),
+    ]
@@ -0,0 +1,43 @@
+import datetime
+
+import django.contrib.postgres.fields.ranges
+from django.db import migrations
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
+
+from tavarat_kiertoon.business_days import add_business_days
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def set_reserved_periods(apps, schema_editor):
+    """Rentals reserve their bikes from their first day to two business days after
+    they have ended"""
+    BikeRental = apps.get_model("bikes", "BikeRental")
+    rentals = list(BikeRental.objects.only("start_date", "end_date"))
+    for rental in rentals:
+        last = add_business_days(timezone.localdate(rental.end_date), 2)
+        rental.reserved_period = DateTimeTZRange(
+            day_start(timezone.localdate(rental.start_date)),
+            day_start(last + datetime.timedelta(days=1)),
+        )
+    BikeRental.objects.bulk_update(rentals, ["reserved_period"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bikes", "0015_bikerental_end_date_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bikerental",
+            name="reserved_period",
+            field=django.contrib.postgres.fields.ranges.DateTimeRangeField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(set_reserved_periods, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bikes", "0016_bikerental_reserved_period"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="bikerental",
+            name="reserved_period",
+            field=django.contrib.postgres.fields.ranges.DateTimeRangeField(
+                editable=False
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="bikerental",
+            name="bikerental_end_date_idx",
+        ),
+        migrations.AddIndex(
+            model_name="bikerental",
+            index=django.contrib.postgres.indexes.GistIndex(
+                fields=["reserved_period"], name="bikerental_reserved_gist"
+            ),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 4.1.4 on 2026-10-17 12:23
+
+import django.contrib.postgres.constraints
+from django.contrib.postgres.operations import BtreeGistExtension
+import django.contrib.postgres.fields.ranges
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bikes", "0017_bikerental_reserved_gist"),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.CreateModel(
+            name="BikeRentalAssignment",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "reserved_period",
+                    django.contrib.postgres.fields.ranges.DateTimeRangeField(),
+                ),
+                (
+                    "bike_stock",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="assignments",
+                        to="bikes.bikestock",
+                    ),
+                ),
+                (
+                    "bike_trailer",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="assignments",
+                        to="bikes.biketrailer",
+                    ),
+                ),
+                (
+                    "rental",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="assignments",
+                        to="bikes.bikerental",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="bikerentalassignment",
+            constraint=models.CheckConstraint(
+                check=models.Q(
+                    models.Q(
+                        ("bike_stock__isnull", False), ("bike_trailer__isnull", True)
+                    ),
+                    models.Q(
+                        ("bike_stock__isnull", True), ("bike_trailer__isnull", False)
+                    ),
+                    _connector="OR",
+                ),
+                name="bikerentalassignment_one_asset",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="bikerentalassignment",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                condition=models.Q(("bike_stock__isnull", False)),
+                expressions=[("bike_stock", "="), ("reserved_period", "&&")],
+                name="exclude_overlapping_bike_rentals",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="bikerentalassignment",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                condition=models.Q(("bike_trailer__isnull", False)),
+                expressions=[("bike_trailer", "="), ("reserved_period", "&&")],
+                name="exclude_overlapping_trailer_rentals",
+            ),
+        ),
+    ]
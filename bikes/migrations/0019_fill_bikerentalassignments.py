@@ -0,0 +1,31 @@
+# Generated by Django 4.1.4 on 2026-10-17 12:30
+
+from django.db import migrations
+
+# Rentals are assigned in the order they were made, an older rental keeps a bike or
+# trailer that was double booked before the constraints existed.
+FILL_ASSIGNMENTS = """
+INSERT INTO bikes_bikerentalassignment (rental_id, bike_stock_id, reserved_period)
+SELECT rental.id, rental_stock.bikestock_id, rental.reserved_period
+FROM bikes_bikerental_bike_stock rental_stock
+JOIN bikes_bikerental rental ON rental.id = rental_stock.bikerental_id
+ORDER BY rental.id
+ON CONFLICT DO NOTHING;
+
+INSERT INTO bikes_bikerentalassignment (rental_id, bike_trailer_id, reserved_period)
+SELECT id, bike_trailer_id, reserved_period
+FROM bikes_bikerental
+WHERE bike_trailer_id IS NOT NULL
+ORDER BY id
+ON CONFLICT DO NOTHING;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bikes", "0018_bikerentalassignment"),
+    ]
+
+    operations = [
+        migrations.RunSQL(FILL_ASSIGNMENTS, "DELETE FROM bikes_bikerentalassignment;"),
+    ]
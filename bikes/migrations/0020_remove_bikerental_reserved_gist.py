@@ -0,0 +1,17 @@
+# Generated by Django 4.1.4 on 2026-10-17 17:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bikes", "0019_fill_bikerentalassignments"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="bikerental",
+            name="bikerental_reserved_gist",
+        ),
+    ]
@@ -1,10 +1,32 @@
 """The bike rental model."""
 
+import datetime
+
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
 
 from products.models import Color, Picture
+from products.search import unaccented
+from tavarat_kiertoon.business_days import add_business_days
+from tavarat_kiertoon.cache import bump_cache_version, track_model_cache
 from users.models import CustomUser
 
+# business days the warehouse workers get to maintain bikes after a rental has ended
+MAINTENANCE_DAYS = 2
+CALENDAR_CACHE = "bike_calendar"
+
 
 class BikeType(models.Model):
     """Model for all the types of bike, f.e. City or Electric."""
@@ -50,6 +72,14 @@ class Bike(models.Model):
     def __str__(self) -> str:
         return f"Bike: {self.name}({self.id})"
 
+    class Meta:
+        indexes = [
+            GinIndex(
+                OpClass(unaccented("name"), name="gin_trgm_ops"),
+                name="bike_name_trgm_idx",
+            ),
+        ]
+
 
 class BikeStock(models.Model):
     """Model for the bike stock, which is each individual bike."""
@@ -97,8 +127,42 @@ class BikeTrailer(models.Model):
     )
 
 
+def maintenance_end(day):
+    """Last day of the maintenance of a bike returned on day"""
+    return add_business_days(day, MAINTENANCE_DAYS)
+
+
+def local_day(value):
+    return value.date() if timezone.is_naive(value) else timezone.localdate(value)
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def reserved_period(start_date, end_date):
+    """Period a rental from start_date to end_date reserves its bikes and trailer for,
+    from the beginning of its first day to the end of the maintenance after it"""
+    last = maintenance_end(local_day(end_date))
+    return DateTimeTZRange(
+        day_start(local_day(start_date)), day_start(last + datetime.timedelta(days=1))
+    )
+
+
+def calendar_namespace(model, pk):
+    """Cache namespace of the availability calendar of Bike or BikeTrailerModel pk"""
+    return f"{CALENDAR_CACHE}:{model._meta.model_name}:{pk}"
+
+
+def invalidate_calendars(model, pks):
+    for pk in pks:
+        if pk is not None:
+            bump_cache_version(calendar_namespace(model, pk))
+
+
 class BikeRental(models.Model):
-    """Model for the bike rentals, same as orders."""
+    """Model for the bike rentals, same as orders.
+    reserved_period is kept up to date from the dates on save."""
 
     class StateChoices(models.TextChoices):
         """Choices for the state of the rental."""
@@ -123,10 +187,189 @@ class BikeRental(models.Model):
     contact_name = models.CharField(max_length=255)
     contact_phone_number = models.CharField(max_length=255)
     extra_info = models.CharField(max_length=255, default="", blank=True)
+    reserved_period = DateTimeRangeField(editable=False)
 
     def __str__(self) -> str:
         return f"Bike rental: {self.user}({self.id})"
 
+    def save(self, *args, **kwargs):
+        # the dates are still strings if they were given as strings to the constructor
+        self.reserved_period = reserved_period(
+            self._meta.get_field("start_date").to_python(self.start_date),
+            self._meta.get_field("end_date").to_python(self.end_date),
+        )
+        super().save(*args, **kwargs)
+
+    def update_assignments(self):
+        """Replaces the BikeRentalAssignments of the rental with ones of its current
+        bikes and trailer for its reserved_period, if they have changed. Invalidates
+        the availability calendars of the bike and trailer models whose assignments
+        changed."""
+        # (bike model, bike stock, trailer model, trailer, period) of each assignment
+        old = set(
+            self.assignments.values_list(
+                "bike_stock__bike",
+                "bike_stock",
+                "bike_trailer__trailer_type",
+                "bike_trailer",
+                "reserved_period",
+            )
+        )
+        new = {
+            (bike_id, stock_id, None, None, self.reserved_period)
+            for stock_id, bike_id in self.bike_stock.values_list("id", "bike")
+        }
+        if self.bike_trailer_id is not None:
+            new.add(
+                (
+                    None,
+                    None,
+                    self.bike_trailer.trailer_type_id,
+                    self.bike_trailer_id,
+                    self.reserved_period,
+                )
+            )
+        if old == new:
+            return
+        self.assignments.all().delete()
+        BikeRentalAssignment.objects.bulk_create(
+            BikeRentalAssignment(
+                rental=self,
+                bike_stock_id=stock_id,
+                bike_trailer_id=trailer_id,
+                reserved_period=period,
+            )
+            for _, stock_id, _, trailer_id, period in new
+        )
+        changed = old ^ new
+        invalidate_calendars(Bike, {assignment[0] for assignment in changed})
+        invalidate_calendars(
+            BikeTrailerModel, {assignment[2] for assignment in changed}
+        )
+
+    def remove_assignments(self):
+        """Deletes the BikeRentalAssignments of the rental and invalidates the
+        availability calendars of their bike and trailer models"""
+        assigned = self.assignments.values_list(
+            "bike_stock__bike", "bike_trailer__trailer_type"
+        )
+        invalidate_calendars(Bike, {bike_id for bike_id, _ in assigned})
+        invalidate_calendars(
+            BikeTrailerModel, {trailer_id for _, trailer_id in assigned}
+        )
+        self.assignments.all().delete()
+
+    class Meta:
+        indexes = [
+            # keyset pagination of the rental list, see tavarat_kiertoon.pagination
+            models.Index(fields=["start_date", "id"], name="bikerental_start_date_idx"),
+        ]
+
+
+class BikeRentalAssignment(models.Model):
+    """Model for one bike or trailer reserved to a rental for its reserved_period.
+    The exclusion constraints keep the database from ever reserving the same bike or
+    trailer to overlapping rentals, even when they are booked at the same time."""
+
+    rental = models.ForeignKey(
+        BikeRental, related_name="assignments", on_delete=models.CASCADE
+    )
+    bike_stock = models.ForeignKey(
+        BikeStock, related_name="assignments", on_delete=models.CASCADE, null=True
+    )
+    bike_trailer = models.ForeignKey(
+        BikeTrailer, related_name="assignments", on_delete=models.CASCADE, null=True
+    )
+    reserved_period = DateTimeRangeField()
+
+    def __str__(self) -> str:
+        asset = self.bike_stock or self.bike_trailer
+        return f"Bike rental assignment: {asset} to {self.rental_id}({self.id})"
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(bike_stock__isnull=False, bike_trailer__isnull=True)
+                | models.Q(bike_stock__isnull=True, bike_trailer__isnull=False),
+                name="bikerentalassignment_one_asset",
+            ),
+            ExclusionConstraint(
+                name="exclude_overlapping_bike_rentals",
+                expressions=[
+                    ("bike_stock", RangeOperators.EQUAL),
+                    ("reserved_period", RangeOperators.OVERLAPS),
+                ],
+                condition=models.Q(bike_stock__isnull=False),
+            ),
+            ExclusionConstraint(
+                name="exclude_overlapping_trailer_rentals",
+                expressions=[
+                    ("bike_trailer", RangeOperators.EQUAL),
+                    ("reserved_period", RangeOperators.OVERLAPS),
+                ],
+                condition=models.Q(bike_trailer__isnull=False),
+            ),
+        ]
+
+
+track_model_cache(BikeRental)
+
+
+@receiver(post_save, sender=BikeRental)
+def update_rental_assignments(sender, instance, **kwargs):
+    instance.update_assignments()
+
+
+@receiver(pre_delete, sender=BikeRental)
+def remove_rental_assignments(sender, instance, **kwargs):
+    instance.remove_assignments()
+
+
+@receiver(m2m_changed, sender=BikeRental.bike_stock.through)
+def update_bike_assignments(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        instance.update_assignments()
+    elif action == "post_clear":
+        instance.remove_assignments()
+    else:
+        for rental in BikeRental.objects.filter(id__in=pk_set):
+            rental.update_assignments()
+
+
+@receiver(pre_save, sender=BikeStock)
+def invalidate_stock_calendars(sender, instance, **kwargs):
+    """Invalidates the availability calendars of the bike models whose available stock
+    changes"""
+    old = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list("bike", "state", "package_only")
+        .first()
+    )
+    if old != (instance.bike_id, instance.state, instance.package_only):
+        invalidate_calendars(Bike, {instance.bike_id, old and old[0]})
+
+
+@receiver(pre_save, sender=BikeTrailer)
+def invalidate_trailer_calendars(sender, instance, **kwargs):
+    old_type = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list("trailer_type", flat=True)
+        .first()
+    )
+    if instance.pk is None or old_type != instance.trailer_type_id:
+        invalidate_calendars(BikeTrailerModel, {instance.trailer_type_id, old_type})
+
+
+@receiver(post_delete, sender=BikeStock)
+@receiver(post_delete, sender=BikeTrailer)
+def invalidate_deleted_calendars(sender, instance, **kwargs):
+    if sender is BikeStock:
+        invalidate_calendars(Bike, [instance.bike_id])
+    else:
+        invalidate_calendars(BikeTrailerModel, [instance.trailer_type_id])
+
 
 class BikePackage(models.Model):
     """Model for the bike packages, which has the bikes that are part of this package."""
@@ -7,6 +7,7 @@ from products.serializers import (
 )
 from users.serializers import UserBikeRentalSerializer
 
+from .availability import CALENDAR_MONTHS
 from .models import (
     Bike,
     BikeAmount,
@@ -24,7 +25,7 @@ from .models import (
 class BikeRentalSerializer(serializers.ModelSerializer):
     class Meta:
         model = BikeRental
-        fields = "__all__"
+        exclude = ["reserved_period"]
 
 
 class BikeRentalSchemaPostSerializer(serializers.ModelSerializer):
@@ -33,13 +34,13 @@ class BikeRentalSchemaPostSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = BikeRental
-        exclude = ["state", "user"]
+        exclude = ["state", "user", "reserved_period"]
 
 
 class BikeRentalSchemaResponseSerializer(serializers.ModelSerializer):
     class Meta:
         model = BikeRental
-        fields = "__all__"
+        exclude = ["reserved_period"]
         extra_kwargs = {
             "id": {"required": True},
             "start_date": {"required": True},
@@ -102,6 +103,33 @@ class BikeSerializer(serializers.ModelSerializer):
         return len(available_stock)
 
 
+class MainBikeSerializer(serializers.ModelSerializer):
+    type = serializers.StringRelatedField(source="type.name")
+    brand = serializers.StringRelatedField(source="brand.name")
+    size = serializers.StringRelatedField(source="size.name")
+    # bike models have no color since only their stock has, always None like in the
+    # packages of MainBikeList
+    color = serializers.StringRelatedField(source="color.name", default=None)
+    max_available = serializers.IntegerField(read_only=True)
+    package_only_count = serializers.IntegerField(read_only=True)
+    picture = serializers.StringRelatedField(source="picture.picture_address")
+
+    class Meta:
+        model = Bike
+        fields = [
+            "id",
+            "name",
+            "max_available",
+            "package_only_count",
+            "description",
+            "type",
+            "brand",
+            "size",
+            "color",
+            "picture",
+        ]
+
+
 class BikeAmountSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(required=False)
     picture = serializers.StringRelatedField(source="bike.picture.picture_address")
@@ -360,6 +388,24 @@ class MainBikeListSchemaSerializer(serializers.Serializer):
     packages = MainBikeSchemaPackageSerializer(many=True)
 
 
+class BikeCalendarRequestSerializer(serializers.Serializer):
+    month = serializers.DateField(input_formats=["%Y-%m"], required=False)
+    months = serializers.IntegerField(min_value=1, max_value=CALENDAR_MONTHS, default=1)
+
+
+class BikeCalendarSchemaAvailableSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    available = serializers.DictField(child=serializers.IntegerField())
+
+
+class BikeCalendarSchemaResponseSerializer(serializers.Serializer):
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    bikes = BikeCalendarSchemaAvailableSerializer(many=True)
+    packages = BikeCalendarSchemaAvailableSerializer(many=True)
+    trailers = BikeCalendarSchemaAvailableSerializer(many=True)
+
+
 class BikeAmountListSerializer(serializers.ModelSerializer):
     class Meta:
         model = BikeAmount
@@ -384,17 +430,6 @@ class BikePackageCreateResponseSerializer(serializers.ModelSerializer):
         ]
 
 
-class BikeAvailabilityListSerializer(serializers.ModelSerializer):
-    rental = BikeRentalSerializer(many=True)
-
-    class Meta:
-        model = BikeStock
-        fields = [
-            "id",
-            "rental",
-        ]
-
-
 class BikeTrailerModelSerializer(serializers.ModelSerializer):
     class Meta:
         model = BikeTrailerModel
@@ -407,20 +442,8 @@ class BikeTrailerSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class BikeTrailerAvailabilityListSerializer(serializers.ModelSerializer):
-    trailer_rental = BikeRentalSerializer(many=True)
-
-    class Meta:
-        model = BikeTrailer
-        fields = [
-            "id",
-            "trailer_rental",
-        ]
-
-
 class BikeTrailerMainSerializer(serializers.ModelSerializer):
-    max_available = serializers.ReadOnlyField(source="trailer.count")
-    trailer = BikeTrailerAvailabilityListSerializer(many=True)
+    max_available = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = BikeTrailerModel
@@ -429,7 +452,6 @@ class BikeTrailerMainSerializer(serializers.ModelSerializer):
             "name",
             "description",
             "max_available",
-            "trailer",
         ]
 
 
@@ -440,4 +462,4 @@ class BikeRentalDepthSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = BikeRental
-        fields = "__all__"
+        exclude = ["reserved_period"]
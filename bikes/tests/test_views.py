@@ -3,22 +3,37 @@ import shutil
 import urllib.request
 
 from django.contrib.auth.models import Group
+from django.core.cache import cache
 from django.core.files.base import ContentFile
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase, override_settings
 from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
+from bikes.allocation import MAX_ATTEMPTS, retry_on_conflict
+from bikes.availability import CALENDAR_MONTHS, DATE_FORMAT, unavailability
 from bikes.models import (
     Bike,
     BikeAmount,
     BikeBrand,
     BikePackage,
     BikeRental,
+    BikeRentalAssignment,
     BikeSize,
     BikeStock,
+    BikeTrailer,
+    BikeTrailerModel,
     BikeType,
+    calendar_namespace,
+    reserved_period,
 )
 from products.models import Color, Picture
+from tavarat_kiertoon.business_days import (
+    add_business_days,
+    business_days_between,
+    is_business_day,
+)
 from users.models import CustomUser
 
 TEST_DIR = "testmedia/"
@@ -343,6 +358,23 @@ class TestBikes(TestCase):
         self.assertEqual(response.status_code, 201)
         self.assertEqual(BikeStock.objects.all().count(), 10)
 
+    def test_search_bikeobjects(self):
+        url = "/bikes/stock/?search=bettr"
+        self.login_test_user()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(response.json()),
+            BikeStock.objects.filter(bike=self.test_bikemodel2).count(),
+        )
+
+        url = "/bikes/stock/?search=better bike"
+        response = self.client.get(url)
+        self.assertEqual(
+            len(response.json()),
+            BikeStock.objects.filter(bike=self.test_bikemodel2).count(),
+        )
+
     def test_update_bikeobject(self):
         url = f"/bikes/stock/{self.test_bikeobject22.id}/"
         self.login_test_user()
@@ -377,6 +409,118 @@ class TestBikes(TestCase):
         self.assertEqual(BikeRental.objects.all().count(), 4)
         self.assertEqual(len(response.data["bike_stock"]), 3)
 
+    def test_post_bikerental_allocation(self):
+        url = "/bikes/rental/"
+        self.login_test_user2()
+        trailer_model = BikeTrailerModel.objects.create(
+            name="Peräkärry", description="iso kärry"
+        )
+        trailer = BikeTrailer.objects.create(
+            register_number="ABC-123", trailer_type=trailer_model
+        )
+        start_date = timezone.now() + datetime.timedelta(days=30)
+        data = {
+            "bike_stock": {f"{self.test_bikemodel.id}": 2},
+            "bike_trailer": trailer_model.id,
+            "start_date": start_date,
+            "end_date": start_date + datetime.timedelta(days=2),
+            "delivery_address": "bikestreet 123",
+            "contact_name": "Bikeman",
+            "contact_phone_number": "123456789",
+        }
+        response = self.client.post(url, data, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            sorted(response.data["bike_stock"]),
+            [self.test_bikeobject11.id, self.test_bikeobject12.id],
+        )
+        self.assertEqual(response.data["bike_trailer"], trailer.id)
+
+        # an overlapping rental gets the remaining bikes, the trailer is taken
+        data["start_date"] = start_date + datetime.timedelta(days=1)
+        data["bike_stock"] = {f"{self.test_bikemodel.id}": 1}
+        response = self.client.post(url, data, content_type="application/json")
+        self.assertEqual(response.data["bike_stock"], [self.test_bikeobject13.id])
+        self.assertIsNone(response.data["bike_trailer"])
+
+        response = self.client.post(url, data, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(BikeRental.objects.count(), 5)
+
+        # the bikes are free again after the maintenance
+        data["start_date"] = start_date + datetime.timedelta(days=10)
+        data["end_date"] = start_date + datetime.timedelta(days=11)
+        data["bike_stock"] = {f"{self.test_bikemodel.id}": 3}
+        response = self.client.post(url, data, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["bike_trailer"], trailer.id)
+
+    def test_rental_overlap_constraints(self):
+        overlapping = BikeRental.objects.create(
+            user=self.test_user1,
+            start_date=timezone.now() + datetime.timedelta(days=1),
+            end_date=timezone.now() + datetime.timedelta(days=3),
+            delivery_address="anywhere",
+            contact_name="bikeperson",
+            contact_phone_number="123456789",
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            overlapping.bike_stock.set([self.test_bikeobject1.id])
+        self.assertEqual(self.test_bikeobject1.assignments.count(), 1)
+
+        # moving a rental onto the dates of another one with the same bike fails
+        url = f"/bikes/rental/{self.test_bikerental3.id}/"
+        self.login_test_user()
+        data = {
+            "start_date": self.test_bikerental.start_date,
+            "end_date": self.test_bikerental.end_date,
+            "bike_stock": [self.test_bikeobject1.id],
+        }
+        response = self.client.patch(url, data, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            sorted(
+                self.test_bikerental3.assignments.values_list("bike_stock", flat=True)
+            ),
+            [self.test_bikeobject21.id, self.test_bikeobject22.id],
+        )
+        data["bike_stock"] = [self.test_bikeobject21.id]
+        response = self.client.patch(url, data, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(self.test_bikerental3.assignments.values_list("reserved_period")),
+            [(reserved_period(data["start_date"], data["end_date"]),)],
+        )
+
+    def test_retry_on_conflict(self):
+        attempts = []
+
+        def book():
+            attempts.append(len(attempts))
+            if len(attempts) == 1:
+                # a concurrent rental got the bike first
+                BikeRentalAssignment.objects.create(
+                    rental=self.test_bikerental2,
+                    bike_stock=self.test_bikeobject1,
+                    reserved_period=self.test_bikerental.reserved_period,
+                )
+            return len(attempts)
+
+        self.assertEqual(retry_on_conflict(book), 2)
+
+        def always_conflicting():
+            attempts.append(len(attempts))
+            BikeRentalAssignment.objects.create(
+                rental=self.test_bikerental2,
+                bike_stock=self.test_bikeobject1,
+                reserved_period=self.test_bikerental.reserved_period,
+            )
+
+        attempts.clear()
+        with self.assertRaises(IntegrityError):
+            retry_on_conflict(always_conflicting)
+        self.assertEqual(len(attempts), MAX_ATTEMPTS)
+
     def test_post_bikerental_bad_request(self):
         url = "/bikes/rental/"
         self.login_test_user2()
@@ -432,6 +576,177 @@ class TestBikes(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(BikePackage.objects.all().count(), 2)
 
+    def test_get_main_bike_list(self):
+        cache.clear()
+        url = "/bikes/"
+        self.login_test_user2()
+        trailer_model = BikeTrailerModel.objects.create(
+            name="Peräkärry", description="iso kärry"
+        )
+        trailer = BikeTrailer.objects.create(
+            register_number="ABC-123", trailer_type=trailer_model
+        )
+        BikeTrailer.objects.create(
+            register_number="ABC-124", trailer_type=trailer_model
+        )
+        self.test_bikerental.bike_trailer = trailer
+        self.test_bikerental.save()
+        today = timezone.localdate().strftime(DATE_FORMAT)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        bikes = {bike["id"]: bike for bike in response.data["bikes"]}
+        bike = bikes[self.test_bikemodel.id]
+        self.assertEqual(bike["max_available"], 7)
+        self.assertEqual(bike["package_only_count"], 4)
+        self.assertIsNone(bike["color"])
+        self.assertEqual(bike["unavailable"][today], 2)
+        self.assertEqual(bike["package_only_unavailable"][today], 2)
+        # the rental of the second bike has ended and been maintained long ago
+        self.assertEqual(bikes[self.test_bikemodel2.id]["unavailable"], {})
+        trailers = response.data["trailers"]
+        self.assertEqual(len(trailers), 1)
+        self.assertEqual(trailers[0]["id"], trailer_model.id)
+        self.assertEqual(trailers[0]["max_available"], 2)
+        self.assertEqual(trailers[0]["unavailable"][today], 1)
+
+        packages = {package["id"]: package for package in response.data["packages"]}
+        package = packages[self.test_bikepackage1.id]
+        self.assertEqual(package["type"], "Paketti")
+        self.assertEqual(package["max_available"], 3)
+        self.assertEqual(package["size"], bike["size"])
+        self.assertEqual(package["picture"], bike["picture"])
+        self.assertEqual(packages[self.test_bikepackage2.id]["max_available"], 0)
+
+        # packages are expanded without queries per package or bike
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        package = BikePackage.objects.create(name="duo", description="two bikes")
+        BikeAmount.objects.create(amount=1, bike=self.test_bikemodel, package=package)
+        BikeAmount.objects.create(amount=1, bike=self.test_bikemodel2, package=package)
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+        package = response.data["packages"][-1]
+        self.assertEqual(package["size"], f"{bike['size']} & {bike['size']}")
+        self.assertEqual(package["max_available"], 2)
+
+    def test_get_bike_calendar(self):
+        cache.clear()
+        url = "/bikes/calendar/"
+        self.login_test_user2()
+        start_date = timezone.now() + datetime.timedelta(days=30)
+        day = timezone.localdate(start_date).strftime(DATE_FORMAT)
+        month = f"{timezone.localdate(start_date):%Y-%m}"
+
+        def available(kind, pk):
+            response = self.client.get(url, {"month": month})
+            self.assertEqual(response.status_code, 200)
+            return {item["id"]: item["available"] for item in response.data[kind]}[pk][
+                day
+            ]
+
+        self.assertEqual(available("bikes", self.test_bikemodel.id), 3)
+        self.assertEqual(available("packages", self.test_bikepackage1.id), 3)
+        self.assertEqual(available("packages", self.test_bikepackage2.id), 0)
+        self.assertEqual(available("bikes", self.test_bikemodel2.id), 1)
+
+        # a rental invalidates only the calendar of the bike model it rents
+        version = cache.get(
+            f"{calendar_namespace(Bike, self.test_bikemodel2.id)}:version"
+        )
+        data = {
+            "bike_stock": {f"{self.test_bikemodel.id}": 2},
+            "start_date": start_date,
+            "end_date": start_date + datetime.timedelta(days=2),
+            "delivery_address": "bikestreet 123",
+            "contact_name": "Bikeman",
+            "contact_phone_number": "123456789",
+        }
+        response = self.client.post(
+            "/bikes/rental/", data, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(available("bikes", self.test_bikemodel.id), 1)
+        self.assertEqual(available("packages", self.test_bikepackage1.id), 2)
+        self.assertEqual(
+            cache.get(f"{calendar_namespace(Bike, self.test_bikemodel2.id)}:version"),
+            version,
+        )
+
+        self.test_bikeobject13.state = BikeStock.StateChoices.MAINTENANCE
+        self.test_bikeobject13.save()
+        self.assertEqual(available("bikes", self.test_bikemodel.id), 0)
+
+        response = self.client.get(url, {"month": month, "months": 2})
+        first = max(timezone.localdate(start_date).replace(day=1), timezone.localdate())
+        self.assertEqual(response.data["start_date"], first)
+        self.assertEqual(
+            len(response.data["bikes"][0]["available"]),
+            (response.data["end_date"] - first).days + 1,
+        )
+        # the window ends on the last day of the month after month
+        end_date = response.data["end_date"]
+        self.assertEqual((end_date + datetime.timedelta(days=1)).day, 1)
+        self.assertEqual(end_date.month, int(month[5:]) % 12 + 1)
+        response = self.client.get(url, {"month": "2024-13"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(url, {"months": CALENDAR_MONTHS + 1})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unavailability(self):
+        def at(day):
+            return timezone.make_aware(datetime.datetime(2023, 12, day, 10))
+
+        def days(first, last, count=1):
+            return {
+                datetime.date(2023, 12, day).strftime(DATE_FORMAT): count
+                for day in range(first, last + 1)
+            }
+
+        # returned on friday before christmas, maintained on wednesday and thursday
+        rentals = [
+            ("bike", reserved_period(at(20), at(22))),
+            ("trailer", reserved_period(at(27), at(27))),
+        ]
+        self.assertEqual(
+            unavailability(rentals, datetime.date(2023, 12, 1)),
+            {"bike": days(20, 28), "trailer": days(27, 29)},
+        )
+        rentals.append(("bike", reserved_period(at(27), at(27))))
+        self.assertEqual(
+            unavailability(rentals, datetime.date(2023, 12, 21))["bike"],
+            days(21, 26) | days(27, 28, 2) | days(29, 29),
+        )
+        self.assertEqual(unavailability(rentals, datetime.date(2024, 1, 1)), {})
+
+    def test_business_days(self):
+        self.assertFalse(is_business_day(datetime.date(2023, 12, 6)))
+        self.assertTrue(is_business_day(datetime.date(2023, 12, 7)))
+        self.assertEqual(
+            add_business_days(datetime.date(2023, 12, 22), 2),
+            datetime.date(2023, 12, 28),
+        )
+        self.assertEqual(
+            add_business_days(datetime.date(2023, 12, 29), 1),
+            datetime.date(2024, 1, 2),
+        )
+        self.assertEqual(
+            add_business_days(datetime.date(2023, 12, 1), 260),
+            datetime.date(2024, 12, 13),
+        )
+        self.assertEqual(
+            business_days_between(
+                datetime.date(2023, 12, 22), datetime.date(2024, 1, 2)
+            ),
+            5,
+        )
+        self.assertEqual(
+            business_days_between(
+                datetime.date(2023, 1, 1), datetime.date(2024, 12, 31)
+            ),
+            251 + 252,
+        )
+
     """following test commented out for now because using test directory for pictures makes getting the picture addresses problematic"""
     # def test_get_availability_info(self):
     #     url = "/bikes/"
@@ -6,6 +6,7 @@ from . import views
 app_name = "bikes"
 urlpatterns = [
     path("", views.MainBikeList.as_view()),
+    path("calendar/", views.BikeCalendarView.as_view()),
     path("stock/", views.BikeStockListView.as_view()),
     path("stock/<int:pk>/", views.BikeStockDetailView.as_view()),
     path("rental/", views.RentalListView.as_view()),
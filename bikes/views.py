@@ -1,18 +1,14 @@
 """The bike rental views."""
 
 import datetime
-from functools import reduce
-from operator import and_, or_
-import math
 
-import holidays
 from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Prefetch, Q
 from django.utils import timezone
 from django_filters import rest_framework as filters
 from drf_spectacular.utils import extend_schema, extend_schema_view
-from django.db.models import Q
 from django.conf import settings
-from django.core.mail import send_mail
 
 from io import BytesIO
 from PIL import Image, ImageOps
@@ -20,12 +16,27 @@ from PIL import Image, ImageOps
 # from rest_framework.permissions import IsAdminUser
 from rest_framework import generics, status
 from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from bikes.allocation import (
+    allocate_bikes,
+    allocate_trailer,
+    is_assignment_conflict,
+    retry_on_conflict,
+)
+from bikes.availability import (
+    ONE_DAY,
+    bike_calendars,
+    format_days,
+    free_packages,
+    free_stock,
+    trailer_calendars,
+    window,
+)
 from bikes.models import (
     Bike,
     BikeAmount,
@@ -37,11 +48,13 @@ from bikes.models import (
     BikeTrailer,
     BikeTrailerModel,
     BikeType,
+    reserved_period,
 )
 from bikes.serializers import (
     BikeAmountListSerializer,
-    BikeAvailabilityListSerializer,
     BikeBrandSerializer,
+    BikeCalendarRequestSerializer,
+    BikeCalendarSchemaResponseSerializer,
     BikeModelCreateSerializer,
     BikeModelSchemaResponseSerializer,
     BikeModelSerializer,
@@ -52,20 +65,22 @@ from bikes.serializers import (
     BikeRentalSchemaPostSerializer,
     BikeRentalSchemaResponseSerializer,
     BikeRentalSerializer,
-    BikeSerializer,
     BikeSizeSerializer,
     BikeStockCreateSerializer,
     BikeStockDetailSerializer,
     BikeStockListSerializer,
     BikeStockSchemaCreateUpdateSerializer,
-    BikeTrailerAvailabilityListSerializer,
     BikeTrailerMainSerializer,
     BikeTrailerModelSerializer,
     BikeTrailerSerializer,
     BikeTypeSerializer,
     MainBikeListSchemaSerializer,
+    MainBikeSerializer,
     PictureCreateSerializer,
 )
+from emails.outbox import queue_mail
+from products.search import SearchRankOrderingFilter, trigram_search
+from tavarat_kiertoon.pagination import OptionalCursorPagination
 from users.permissions import HasGroupPermission
 from users.views import CustomJWTAuthentication
 
@@ -90,27 +105,9 @@ class BikeStockFilter(filters.FilterSet):
         fields = ["search"]
 
     def search_filter(self, queryset, value, *args, **kwargs):
-        word_list = args[0].split(" ")
-
-        def filter_function(operator):
-            """Function that takes operator like 'and_' or 'or_' and returns reduced queryset
-            of bikes that have word of wordlist contained in name
-            """
-            qs = queryset.filter(
-                reduce(
-                    operator,
-                    (Q(bike__name__icontains=word) for word in word_list),
-                )
-            )
-            qs._hints["filter"] = operator.__name__.strip("_")
-            return qs
-
-        """Creates queryset with and_ and if its empty it creates new queryset with or_"""
-        and_queryset = filter_function(and_)
-        if and_queryset.count():
-            return and_queryset
-        or_queryset = filter_function(or_)
-        return or_queryset
+        """Bikes that have all words of search in name, or any of the words if none has
+        them all. Misspelled words match too, see products.search.trigram_search"""
+        return trigram_search(queryset, args[0], ["bike__name"])
 
 
 @extend_schema_view(
@@ -218,7 +215,7 @@ class BikeStockListView(generics.ListCreateAPIView):
     queryset = BikeStock.objects.all()
     serializer_class = BikeStockListSerializer
     # permission_classes = [isAdminUser]
-    filter_backends = [filters.DjangoFilterBackend, OrderingFilter]
+    filter_backends = [filters.DjangoFilterBackend, SearchRankOrderingFilter]
     ordering_fields = ["id", "number", "bike__type"]
     ordering = ["-id"]
     authentication_classes = [
@@ -277,6 +274,27 @@ class BikeStockDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
 
+def expand_package(package, bikes):
+    """Adds the fields of the bikes of MainBikeList to package, a serialized
+    BikePackage, from bikes, the serialized bike models by id. The package is
+    available as many times as its scarcest bike."""
+    package.update(type="Paketti", unavailable={}, brand=None, color=None)
+    package_bikes = [
+        (bikes[bike_amount["bike"]], bike_amount["amount"])
+        for bike_amount in package["bikes"]
+    ]
+    if package_bikes:
+        package["size"] = " & ".join(bike["size"] for bike, _ in package_bikes)
+        package["picture"] = "&".join(f"{bike['picture']}" for bike, _ in package_bikes)
+    package["max_available"] = min(
+        (
+            bike["max_available"] // amount if amount else 0
+            for bike, amount in package_bikes
+        ),
+        default=None,
+    )
+
+
 class MainBikeList(generics.ListAPIView):
     serializer_class = MainBikeListSchemaSerializer
     queryset = Bike.objects.none()
@@ -295,153 +313,50 @@ class MainBikeList(generics.ListAPIView):
     }
 
     def list(self, request, *args, **kwargs):
-        today = datetime.date.today()
+        today = timezone.localdate()
         available_from = today + datetime.timedelta(days=7)
         available_to = today + datetime.timedelta(days=183)
-        fin_holidays = holidays.FI()
 
-        bike_serializer = BikeSerializer(Bike.objects.all(), many=True)
+        bike_serializer = MainBikeSerializer(
+            Bike.objects.select_related("type", "brand", "size", "picture")
+            .annotate(
+                max_available=Count("stock", filter=Q(stock__state="AVAILABLE")),
+                package_only_count=Count("stock", filter=Q(stock__package_only=True)),
+            )
+            .order_by("id"),
+            many=True,
+        )
         bike_package_serializer = BikePackageSerializer(
-            BikePackage.objects.all(), many=True
+            BikePackage.objects.prefetch_related(
+                Prefetch("bikes", BikeAmount.objects.select_related("bike__picture"))
+            ).order_by("id"),
+            many=True,
         )
         trailer_serializer = BikeTrailerMainSerializer(
-            BikeTrailerModel.objects.all(), many=True
+            BikeTrailerModel.objects.annotate(max_available=Count("trailer")).order_by(
+                "id"
+            ),
+            many=True,
         )
-        for index, bike in enumerate(bike_serializer.data):
-            package_only_count = 0
-            unavailable = {}
-            package_only_unavailable = {}
-            for bike in bike["stock"]:
-                if bike["package_only"] is True:
-                    package_only_count += 1
-                    for rental in bike["rental"]:
-                        start_date = datetime.datetime.fromisoformat(
-                            rental["start_date"]
-                        )
-                        end_date = datetime.datetime.fromisoformat(rental["end_date"])
-                        # We want to give the warehouse workers two business days to maintain the bikes, after the rental has ended
-                        end_date += datetime.timedelta(days=1)
-                        while end_date.weekday() >= 5 or end_date in fin_holidays:
-                            end_date += datetime.timedelta(days=1)
-                        second_day = end_date + datetime.timedelta(days=1)
-                        if second_day.weekday() >= 5 or second_day in fin_holidays:
-                            while (
-                                second_day.weekday() >= 5 or second_day in fin_holidays
-                            ):
-                                end_date += datetime.timedelta(days=1)
-                                second_day += datetime.timedelta(days=1)
-                            end_date += datetime.timedelta(days=1)
-                        else:
-                            end_date += datetime.timedelta(days=1)
-                        date = start_date
-                        while date <= end_date:
-                            date_str = date.strftime("%d.%m.%Y")
-                            if date_str in package_only_unavailable:
-                                package_only_unavailable[date_str] = (
-                                    1 + package_only_unavailable[date_str]
-                                )
-                            else:
-                                package_only_unavailable[date_str] = 1
-                            date += datetime.timedelta(days=1)
-                else:
-                    for rental in bike["rental"]:
-                        start_date = datetime.datetime.fromisoformat(
-                            rental["start_date"]
-                        )
-                        end_date = datetime.datetime.fromisoformat(rental["end_date"])
-                        # We want to give the warehouse workers two business days to maintain the bikes, after the rental has ended
-                        end_date += datetime.timedelta(days=1)
-                        while end_date.weekday() >= 5 or end_date in fin_holidays:
-                            end_date += datetime.timedelta(days=1)
-                        second_day = end_date + datetime.timedelta(days=1)
-                        if second_day.weekday() >= 5 or second_day in fin_holidays:
-                            while (
-                                second_day.weekday() >= 5 or second_day in fin_holidays
-                            ):
-                                end_date += datetime.timedelta(days=1)
-                                second_day += datetime.timedelta(days=1)
-                            end_date += datetime.timedelta(days=1)
-                        else:
-                            end_date += datetime.timedelta(days=1)
-                        date = start_date
-                        while date <= end_date:
-                            date_str = date.strftime("%d.%m.%Y")
-                            if date_str in unavailable:
-                                unavailable[date_str] = 1 + unavailable[date_str]
-                            else:
-                                unavailable[date_str] = 1
-                            date += datetime.timedelta(days=1)
-            bike_serializer.data[index]["unavailable"] = unavailable
-            bike_serializer.data[index]["package_only_count"] = package_only_count
-            bike_serializer.data[index][
-                "package_only_unavailable"
-            ] = package_only_unavailable
-            del bike_serializer.data[index]["stock"]
-
-        for index, package in enumerate(bike_package_serializer.data):
-            serializer_package = bike_package_serializer.data[index]
-            serializer_package["type"] = "Paketti"
-            serializer_package["unavailable"] = {}
-            serializer_package["brand"] = None
-            serializer_package["color"] = None
-            max_available = None
-            for bike in package["bikes"]:
-                bike_object = Bike.objects.get(id=bike["bike"])
-                if "size" in serializer_package:
-                    serializer_package["size"] = (
-                        f"{serializer_package['size']} & {bike_object.size.name}"
-                    )
-                else:
-                    serializer_package["size"] = bike_object.size.name
-                bike_object_serializer = BikeSerializer(bike_object)
-                if "picture" in serializer_package:
-                    serializer_package["picture"] = (
-                        f"{serializer_package['picture']}&{bike_object.picture.picture_address}"
-                    )
-                else:
-                    serializer_package["picture"] = (
-                        f"{bike_object.picture.picture_address}"
-                    )
-                if bike["amount"] == 0:
-                    bike_max_available = bike["amount"]
-                else:
-                    bike_max_available = math.floor(
-                        bike_object_serializer.data["max_available"] / bike["amount"]
-                    )
-                if max_available is None:
-                    max_available = bike_max_available
-                else:
-                    max_available = min(max_available, bike_max_available)
-            serializer_package["max_available"] = max_available
-
-        for index, trailer in enumerate(trailer_serializer.data):
-            unavailable = {}
-            for trailer in trailer["trailer"]:
-                for rental in trailer["trailer_rental"]:
-                    start_date = datetime.datetime.fromisoformat(rental["start_date"])
-                    end_date = datetime.datetime.fromisoformat(rental["end_date"])
-                    # We want to give the warehouse workers two business days to maintain the trailers, after the rental has ended
-                    end_date += datetime.timedelta(days=1)
-                    while end_date.weekday() >= 5 or end_date in fin_holidays:
-                        end_date += datetime.timedelta(days=1)
-                    second_day = end_date + datetime.timedelta(days=1)
-                    if second_day.weekday() >= 5 or second_day in fin_holidays:
-                        while second_day.weekday() >= 5 or second_day in fin_holidays:
-                            end_date += datetime.timedelta(days=1)
-                            second_day += datetime.timedelta(days=1)
-                        end_date += datetime.timedelta(days=1)
-                    else:
-                        end_date += datetime.timedelta(days=1)
-                    date = start_date
-                    while date <= end_date:
-                        date_str = date.strftime("%d.%m.%Y")
-                        if date_str in unavailable:
-                            unavailable[date_str] = 1 + unavailable[date_str]
-                        else:
-                            unavailable[date_str] = 1
-                        date += datetime.timedelta(days=1)
-            trailer_serializer.data[index]["unavailable"] = unavailable
-            del trailer_serializer.data[index]["trailer"]
+        calendars = bike_calendars([bike["id"] for bike in bike_serializer.data])
+        for bike in bike_serializer.data:
+            calendar = calendars[bike["id"]]
+            bike["unavailable"] = format_days(calendar["unavailable"], today)
+            bike["package_only_unavailable"] = format_days(
+                calendar["package_only_unavailable"], today
+            )
+
+        bikes = {bike["id"]: bike for bike in bike_serializer.data}
+        for package in bike_package_serializer.data:
+            expand_package(package, bikes)
+
+        calendars = trailer_calendars(
+            [trailer["id"] for trailer in trailer_serializer.data]
+        )
+        for trailer in trailer_serializer.data:
+            trailer["unavailable"] = format_days(
+                calendars[trailer["id"]]["unavailable"], today
+            )
 
         return Response(
             {
@@ -456,9 +371,89 @@ class MainBikeList(generics.ListAPIView):
         )
 
 
-class BikeRentalPagination(PageNumberPagination):
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[BikeCalendarRequestSerializer],
+        responses=BikeCalendarSchemaResponseSerializer,
+    )
+)
+class BikeCalendarView(generics.GenericAPIView):
+    """Amount of bikes, packages and trailers free for rentals on each day of the
+    months from month on, from the cached calendars of bike and trailer models"""
+
+    serializer_class = BikeCalendarRequestSerializer
+    queryset = Bike.objects.none()
+
+    authentication_classes = [
+        SessionAuthentication,
+        BasicAuthentication,
+        JWTAuthentication,
+        CustomJWTAuthentication,
+    ]
+
+    permission_classes = [IsAuthenticated, HasGroupPermission]
+    required_groups = {
+        "GET": ["bicycle_group", "user_group"],
+    }
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        today = timezone.localdate()
+        month = serializer.validated_data.get("month", today).replace(day=1)
+        # the day before the first day of the month after the window
+        years, index = divmod(month.month - 1 + serializer.validated_data["months"], 12)
+        last = datetime.date(month.year + years, index + 1, 1) - ONE_DAY
+        first = max(month, today)
+        days = window(first, last)
+
+        bikes = bike_calendars(Bike.objects.order_by("id").values_list("id", flat=True))
+        package_bikes = {
+            package_id: []
+            for package_id in BikePackage.objects.order_by("id").values_list(
+                "id", flat=True
+            )
+        }
+        for package_id, bike_id, amount in BikeAmount.objects.values_list(
+            "package", "bike", "amount"
+        ):
+            package_bikes[package_id].append((bike_id, amount))
+        trailers = trailer_calendars(
+            BikeTrailerModel.objects.order_by("id").values_list("id", flat=True)
+        )
+        return Response(
+            {
+                "start_date": first,
+                "end_date": last,
+                "bikes": [
+                    {
+                        "id": bike_id,
+                        "available": format_days(free_stock(calendar, days), first),
+                    }
+                    for bike_id, calendar in bikes.items()
+                ],
+                "packages": [
+                    {
+                        "id": package_id,
+                        "available": format_days(
+                            free_packages(bike_amounts, bikes, days), first
+                        ),
+                    }
+                    for package_id, bike_amounts in package_bikes.items()
+                ],
+                "trailers": [
+                    {
+                        "id": trailer_id,
+                        "available": format_days(free_stock(calendar, days), first),
+                    }
+                    for trailer_id, calendar in trailers.items()
+                ],
+            }
+        )
+
+
+class BikeRentalPagination(OptionalCursorPagination):
     page_size = 50
-    page_size_query_param = "page_size"
 
 
 class BikeRentalFilter(filters.FilterSet):
@@ -499,189 +494,80 @@ class RentalListView(generics.ListCreateAPIView):
     queryset = BikeRental.objects.all()
     serializer_class = BikeRentalSerializer
 
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
-        fin_holidays = holidays.FI()
         postserializer = BikeRentalSchemaPostSerializer(data=request.data)
-        if postserializer.is_valid():
-            request_start_date = datetime.datetime.fromisoformat(
-                request.data["start_date"]
-            )
-            request_end_date = datetime.datetime.fromisoformat(request.data["end_date"])
-
-        else:
+        if not postserializer.is_valid():
             return Response(postserializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-        bikerentalserializer = BikeAvailabilityListSerializer(
-            BikeStock.objects.all(), many=True
-        )
-        trailer_rental_serializer = BikeTrailerAvailabilityListSerializer(
-            BikeTrailer.objects.all(), many=True
+        period = reserved_period(
+            postserializer.validated_data["start_date"],
+            postserializer.validated_data["end_date"],
         )
 
-        for bike in bikerentalserializer.data:
-            bike["rental_dates"] = []
-            for rental in bike["rental"]:
-                start_date = datetime.datetime.fromisoformat(rental["start_date"])
-                end_date = datetime.datetime.fromisoformat(rental["end_date"])
-                end_date += datetime.timedelta(days=1)
-                while end_date.weekday() >= 5 or end_date in fin_holidays:
-                    end_date += datetime.timedelta(days=1)
-                second_day = end_date + datetime.timedelta(days=1)
-                if second_day.weekday() >= 5 or second_day in fin_holidays:
-                    while second_day.weekday() >= 5 or second_day in fin_holidays:
-                        end_date += datetime.timedelta(days=1)
-                        second_day += datetime.timedelta(days=1)
-                    end_date += datetime.timedelta(days=1)
-                else:
-                    end_date += datetime.timedelta(days=1)
-                date = start_date
-                while date <= end_date:
-                    date_str = date.strftime("%d.%m.%Y")
-                    if date_str not in bike["rental_dates"]:
-                        bike["rental_dates"].append(date_str)
-                    date += datetime.timedelta(days=1)
-            del bike["rental"]
-        unavailable_dates = {}
-        for bikedata in bikerentalserializer.data:
-            unavailable_dates[bikedata["id"]] = bikedata["rental_dates"]
-
-        for trailer in trailer_rental_serializer.data:
-            trailer["rental_dates"] = []
-            for rental in trailer["trailer_rental"]:
-                start_date = datetime.datetime.fromisoformat(rental["start_date"])
-                end_date = datetime.datetime.fromisoformat(rental["end_date"])
-                end_date += datetime.timedelta(days=1)
-                while end_date.weekday() >= 5 or end_date in fin_holidays:
-                    end_date += datetime.timedelta(days=1)
-                second_day = end_date + datetime.timedelta(days=1)
-                if second_day.weekday() >= 5 or second_day in fin_holidays:
-                    while second_day.weekday() >= 5 or second_day in fin_holidays:
-                        end_date += datetime.timedelta(days=1)
-                        second_day += datetime.timedelta(days=1)
-                    end_date += datetime.timedelta(days=1)
-                else:
-                    end_date += datetime.timedelta(days=1)
-                date = start_date
-                while date <= end_date:
-                    date_str = date.strftime("%d.%m.%Y")
-                    if date_str not in trailer["rental_dates"]:
-                        trailer["rental_dates"].append(date_str)
-                    date += datetime.timedelta(days=1)
-            del trailer["trailer_rental"]
-        trailer_unavailable_dates = {}
-        for trailerdata in trailer_rental_serializer.data:
-            trailer_unavailable_dates[trailerdata["id"]] = trailerdata["rental_dates"]
-
+        requested_bikes = request.data["bike_stock"]
+        requested_trailer = request.data.get("bike_trailer")
         instance = request.data
-        bikes_list = []
-        for rental_item in request.data["bike_stock"]:
-            if rental_item.startswith("package"):
-                package = BikePackage.objects.get(
-                    id=rental_item.split("-", 1)[1]
-                ).bikes.values("bike", "amount")
-                packageamount = request.data["bike_stock"][rental_item]
-                for packageitem in package:
-                    amount = packageamount * packageitem["amount"]
-                    available_bikes = (
-                        BikeStock.objects.filter(
-                            bike=packageitem["bike"], state="AVAILABLE"
-                        )
-                        .order_by("-package_only", "id")
-                        .exclude(id__in=bikes_list)
-                    )
-                    for bike_id in available_bikes:
-                        check_date = request_start_date
-                        if bike_id.id in unavailable_dates.keys():
-                            while check_date <= request_end_date:
-                                if (
-                                    check_date.strftime("%d.%m.%Y")
-                                    in unavailable_dates[bike_id.id]
-                                ):
-                                    available_bikes = available_bikes.exclude(
-                                        id=bike_id.id
-                                    )
-                                check_date += datetime.timedelta(days=1)
-                    for bike in range(amount):
-                        bikes_list.append(available_bikes[bike].id)
-
-            else:
-                available_bikes = BikeStock.objects.filter(
-                    bike=rental_item, package_only=False, state="AVAILABLE"
-                )
-                for bike_id in available_bikes:
-                    check_date = request_start_date
-                    if bike_id.id in unavailable_dates.keys():
-                        while check_date <= request_end_date:
-                            if (
-                                check_date.strftime("%d.%m.%Y")
-                                in unavailable_dates[bike_id.id]
-                            ):
-                                available_bikes = available_bikes.exclude(id=bike_id.id)
-                            check_date += datetime.timedelta(days=1)
-                amount = request.data["bike_stock"][rental_item]
-                for bike in range(amount):
-                    bikes_list.append(available_bikes[bike].id)
-        instance["bike_stock"] = bikes_list
         instance["user"] = self.request.user.id
 
-        if "bike_trailer" in request.data:
-            trailers = BikeTrailer.objects.filter(
-                trailer_type=request.data["bike_trailer"]
-            )
-            for trailer in trailers:
-                check_date = request_start_date
-                if trailer.id in trailer_unavailable_dates.keys():
-                    while check_date <= request_end_date:
-                        if (
-                            check_date.strftime("%d.%m.%Y")
-                            in trailer_unavailable_dates[trailer.id]
-                        ):
-                            trailers = trailers.exclude(id=trailer.id)
-                        check_date += datetime.timedelta(days=1)
-
-            if trailers.exists():
-                instance["bike_trailer"] = trailers[0].id
-            else:
-                instance["bike_trailer"] = None
-
-        serializer = BikeRentalSerializer(data=instance)
-        if serializer.is_valid():
+        def book():
+            """Allocates the bikes and saves the rental, None if there aren't enough
+            free bikes"""
+            bikes_list = allocate_bikes(requested_bikes, period)
+            if bikes_list is None:
+                return None
+            instance["bike_stock"] = bikes_list
+            if "bike_trailer" in instance:
+                instance["bike_trailer"] = allocate_trailer(requested_trailer, period)
+            serializer = BikeRentalSerializer(data=instance)
+            serializer.is_valid(raise_exception=True)
             serializer.save()
-            message = ["Hei\n", "Kiitos tilauksesta. Tilauksen sisältö:\n"]
-            for pyora in BikeStock.objects.filter(
-                pk__in=serializer.data["bike_stock"]
-            ).distinct("bike__name"):
-                count = BikeStock.objects.filter(
-                    pk__in=serializer.data["bike_stock"], bike__name=pyora.bike.name
-                ).count()
-                message.append(f"{count}X {pyora.bike.name}")
-
-            print(serializer.data["start_date"])
-            print(serializer.data["end_date"])
-            # datetime string to datetime and then to correct date format string
-            start_date = datetime.datetime.fromisoformat(
-                serializer.data["start_date"]
-            ).strftime("%d.%m.%Y %H:%M")
-            end_date = datetime.datetime.fromisoformat(
-                serializer.data["end_date"]
-            ).strftime("%d.%m.%Y %H:%M")
-            message.append(
-                f"\ntilasit yhteensä {len(serializer.data['bike_stock'])} pyörää\n"
+            return serializer
+
+        try:
+            serializer = retry_on_conflict(book)
+        except IntegrityError:
+            return Response(
+                "The bikes were booked by another rental at the same time",
+                status=status.HTTP_409_CONFLICT,
             )
-            if serializer.data["bike_trailer"]:
-                message.append(
-                    f"Peräkärry: {BikeTrailer.objects.get(pk=serializer.data['bike_trailer']).register_number}"
-                )
-            message.append(f"Tilauksesi kesto: {start_date} - {end_date}")
-
-            send_mail(
-                "Tilauksen vahvistus",
-                "\n".join(message),
-                settings.EMAIL_HOST_USER,
-                [request.user.email],
+        if serializer is None:
+            return Response(
+                "Not enough bikes available", status=status.HTTP_400_BAD_REQUEST
             )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        message = ["Hei\n", "Kiitos tilauksesta. Tilauksen sisältö:\n"]
+        for pyora in BikeStock.objects.filter(
+            pk__in=serializer.data["bike_stock"]
+        ).distinct("bike__name"):
+            count = BikeStock.objects.filter(
+                pk__in=serializer.data["bike_stock"], bike__name=pyora.bike.name
+            ).count()
+            message.append(f"{count}X {pyora.bike.name}")
+
+        print(serializer.data["start_date"])
+        print(serializer.data["end_date"])
+        # datetime string to datetime and then to correct date format string
+        start_date = datetime.datetime.fromisoformat(
+            serializer.data["start_date"]
+        ).strftime("%d.%m.%Y %H:%M")
+        end_date = datetime.datetime.fromisoformat(
+            serializer.data["end_date"]
+        ).strftime("%d.%m.%Y %H:%M")
+        message.append(
+            f"\ntilasit yhteensä {len(serializer.data['bike_stock'])} pyörää\n"
+        )
+        if serializer.data["bike_trailer"]:
+            message.append(
+                f"Peräkärry: {BikeTrailer.objects.get(pk=serializer.data['bike_trailer']).register_number}"
+            )
+        message.append(f"Tilauksesi kesto: {start_date} - {end_date}")
+
+        queue_mail(
+            "Tilauksen vahvistus",
+            "\n".join(message),
+            settings.EMAIL_HOST_USER,
+            [request.user.email],
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 @extend_schema_view(
@@ -715,6 +601,17 @@ class RentalDetailView(generics.RetrieveUpdateDestroyAPIView):
         serializer = BikeRentalDepthSerializer(instance)
         return Response(serializer.data)
 
+    def perform_update(self, serializer):
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError as error:
+            if not is_assignment_conflict(error):
+                raise
+            raise ValidationError(
+                "The bikes or the trailer are already reserved for these dates"
+            )
+
 
 class BikeAmountListView(generics.ListAPIView):
     queryset = BikeAmount.objects.all()
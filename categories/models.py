@@ -1,7 +1,14 @@
 """module for contact_forms models"""
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from mptt.models import MPTTModel, TreeForeignKey
 
+from tavarat_kiertoon.cache import bump_cache_version
+
+# cache namespace of the category tree and product counts, see categories.tree
+CATEGORY_CACHE = "categories"
+
 
 # Create your models here.
 class Category(MPTTModel):
@@ -20,3 +27,9 @@ class Category(MPTTModel):
 
     class Meta:
         verbose_name_plural = "Categories"
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, **kwargs):
+    bump_cache_version(CATEGORY_CACHE)
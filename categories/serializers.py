@@ -1,19 +1,19 @@
 from rest_framework import serializers
 
-from products.models import Product, ProductItem
 from products.serializers import ProductSerializer
 
 from .models import Category
+from .tree import category_tree
 
 
 class CategorySerializer(serializers.ModelSerializer):
     product_count = serializers.SerializerMethodField()
 
     def get_product_count(self, obj) -> int:
-        categories = obj.get_descendants(include_self=True)
-        available_amount = Product.objects.filter(category__in=categories, productitem__in=ProductItem.objects.filter(available=True)).distinct().count()
-        return available_amount
-        
+        # counts of the whole tree are looked up once per response, see categories.tree
+        if "product_counts" not in self.context:
+            self.context["product_counts"] = category_tree()["product_counts"]
+        return self.context["product_counts"].get(obj.id, 0)
 
     class Meta:
         model = Category
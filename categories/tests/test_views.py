@@ -4,6 +4,7 @@ from django.test import TestCase
 from django.urls import reverse
 
 from categories.models import Category
+from products.models import Product, ProductItem
 from users.models import CustomUser
 from users.serializers import UsersLoginRefreshResponseSerializer
 
@@ -101,3 +102,55 @@ class TestCategories(TestCase):
                 f"Parent Category: {self.test_category0.parent.name}({self.test_category0.parent.id})"
             ),
         )
+
+    def test_category_tree_and_product_counts(self):
+        cup = Category.objects.create(name="cup", parent=self.test_category0)
+        tea = Category.objects.create(name="tea")
+        product = Product.objects.create(name="mug", category=self.test_category1)
+        ProductItem.objects.create(product=product)
+        ProductItem.objects.create(product=product)
+        unavailable = Product.objects.create(name="broken mug", category=cup)
+        ProductItem.objects.create(product=unavailable, available=False)
+
+        with self.assertNumQueries(2):
+            response = self.client.get("/categories/tree/")
+        self.assertEqual(
+            response.json(),
+            {
+                str(self.test_category.id): [self.test_category1.id, cup.id],
+                str(self.test_category0.id): [self.test_category1.id, cup.id],
+                str(self.test_category1.id): [self.test_category1.id],
+                str(cup.id): [cup.id],
+                str(tea.id): [],
+            },
+        )
+
+        # tree and counts are cached, listing the categories needs only one query
+        with self.assertNumQueries(1):
+            response = self.client.get("/categories/")
+        product_counts = {
+            category["id"]: category["product_count"] for category in response.json()
+        }
+        self.assertEqual(
+            product_counts,
+            {
+                self.test_category.id: 1,
+                self.test_category0.id: 1,
+                self.test_category1.id: 1,
+                cup.id: 0,
+                tea.id: 0,
+            },
+        )
+
+        # counts are recomputed when item status or category of a product changes
+        ProductItem.objects.create(product=unavailable)
+        product.category = tea
+        product.save()
+        response = self.client.get("/categories/")
+        product_counts = {
+            category["id"]: category["product_count"] for category in response.json()
+        }
+        self.assertEqual(product_counts[self.test_category.id], 1)
+        self.assertEqual(product_counts[cup.id], 1)
+        self.assertEqual(product_counts[self.test_category1.id], 0)
+        self.assertEqual(product_counts[tea.id], 1)
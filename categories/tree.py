@@ -0,0 +1,55 @@
+"""Whole category tree and available product counts computed in one pass.
+
+Categories are read once ordered by their MPTT tree_id and lft, so every category
+comes after its ancestors and the ancestors of the current category are the ones
+whose lft/rght range contains it. Products are counted per category with one
+aggregate query and the counts are added up to the ancestors while walking the tree.
+The result is cached until categories or product availability change.
+"""
+
+from django.db.models import Count
+
+from products.models import Product
+from tavarat_kiertoon.cache import versioned_cache
+
+from .models import CATEGORY_CACHE, Category
+
+LEAF_LEVEL = 2
+
+
+def build_category_tree():
+    """Returns dict with "tree": category id -> ids of level 2 categories under it
+    (itself included) and "product_counts": category id -> amount of available
+    Products in it and its descendants"""
+    direct_counts = dict(
+        Product.objects.available()
+        .exclude(category=None)
+        .order_by()
+        .values("category")
+        .annotate(product_count=Count("id"))
+        .values_list("category", "product_count")
+    )
+    tree = {}
+    product_counts = {}
+    ancestors = []
+    for category in Category.objects.order_by("tree_id", "lft").values(
+        "id", "tree_id", "lft", "rght", "level"
+    ):
+        while ancestors and (
+            ancestors[-1]["tree_id"] != category["tree_id"]
+            or ancestors[-1]["rght"] < category["lft"]
+        ):
+            ancestors.pop()
+        ancestors.append(category)
+        tree[category["id"]] = []
+        product_counts[category["id"]] = 0
+        count = direct_counts.get(category["id"], 0)
+        for ancestor in ancestors:
+            product_counts[ancestor["id"]] += count
+            if category["level"] == LEAF_LEVEL:
+                tree[ancestor["id"]].append(category["id"])
+    return {"tree": tree, "product_counts": product_counts}
+
+
+def category_tree():
+    return versioned_cache(CATEGORY_CACHE, "tree", build_category_tree)
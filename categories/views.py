@@ -15,6 +15,7 @@ from .serializers import (
     CategorySerializer,
     CategoryTreeSerializer,
 )
+from .tree import category_tree
 
 
 # Create your views here.
@@ -108,8 +109,4 @@ class CategoryTreeView(APIView):
         ],
     )
     def get(self, request, *args, **kwargs):
-        category_tree = {
-            c.id: [c.id for c in c.get_descendants(include_self=True).filter(level=2)]
-            for c in self.queryset.all()
-        }
-        return Response(category_tree)
+        return Response(category_tree()["tree"])
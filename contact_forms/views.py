@@ -1,5 +1,5 @@
 from django.conf import settings
-from django.core.mail import send_mail
+from django.db import transaction
 from django_filters import rest_framework as filters
 from drf_spectacular.utils import extend_schema, extend_schema_view
 from rest_framework import status
@@ -11,6 +11,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from emails.outbox import queue_mail
 from users.authenticate import CustomJWTAuthentication
 from users.permissions import HasGroupPermission
 
@@ -48,6 +49,7 @@ class ContactFormListView(ListCreateAPIView):
     filterset_class = ContactFormFilter
     pagination_class = ContactFormListPagination
 
+    @transaction.atomic
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -65,7 +67,7 @@ class ContactFormListView(ListCreateAPIView):
         )
 
         print(serializer.data)
-        send_mail(subject, message, settings.EMAIL_HOST_USER, [settings.DEFAULT_EMAIL])
+        queue_mail(subject, message, settings.EMAIL_HOST_USER, [settings.DEFAULT_EMAIL])
         headers = self.get_success_headers(serializer.data)
         return Response(
             serializer.data, status=status.HTTP_201_CREATED, headers=headers
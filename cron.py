@@ -1,24 +1,24 @@
-import datetime
+from django.core.management import call_command
 
-from django.utils import timezone
-
-from orders.models import ShoppingCart
-from products.models import ProductItemLogEntry
+from emails import outbox
+from users import watch
 
 
 def clear_shopping_carts():
-    queryset = ShoppingCart.objects.exclude(product_items=None).filter(
-        date__lte=timezone.now() - datetime.timedelta(hours=2)
-    )
-    for cart in queryset:
-        log_entry = ProductItemLogEntry.objects.create(
-            action=ProductItemLogEntry.ActionChoices.CART_TIMEOUT
-        )
-        for product_item in cart.product_items.all():
-            product_item.log_entries.add(log_entry)
-            product_item.available = True
-            product_item.status = "Available"
-            product_item.save()
-        cart.product_items.clear()
-        cart.save()
-    return
+    call_command("release_expired_reservations")
+
+
+def send_queued_mail():
+    outbox.send_queued_mail()
+
+
+def send_search_watch_digests():
+    watch.send_search_watch_digests()
+
+
+def rollup_analytics():
+    call_command("rollup_analytics")
+
+
+def archive_logs():
+    call_command("archive_logs")
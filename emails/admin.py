@@ -0,0 +1,7 @@
+from django.contrib import admin
+
+from .models import QueuedEmail
+
+# Register your models here.
+
+admin.site.register(QueuedEmail)
@@ -0,0 +1,33 @@
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from emails.outbox import BATCH_SIZE, send_queued_mail
+
+
+class Command(BaseCommand):
+    help = "Sends the queued emails that are due, see emails.outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Amount of emails sent over one connection",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running and check the queue every --interval seconds",
+        )
+        parser.add_argument("--interval", type=float, default=5)
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        while True:
+            sent = send_queued_mail(options["batch_size"])
+            if sent or not options["loop"]:
+                self.stdout.write(f"Sent {sent} emails.")
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,49 @@
+# Generated by Django 4.1.4 on 2026-10-17 11:43
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="QueuedEmail",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("subject", models.TextField()),
+                ("message", models.TextField()),
+                ("from_email", models.CharField(max_length=255)),
+                ("recipients", models.JSONField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("QUEUED", "Queued"),
+                            ("SENT", "Sent"),
+                            ("FAILED", "Failed"),
+                        ],
+                        default="QUEUED",
+                        max_length=255,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("send_after", models.DateTimeField(default=django.utils.timezone.now)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True, default="")),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="queuedemail",
+            index=models.Index(
+                condition=models.Q(("status", "QUEUED")),
+                fields=["send_after", "id"],
+                name="queuedemail_due_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+# Create your models here.
+class QueuedEmail(models.Model):
+    """Email waiting in the outbox, sent by the send_queued_mail command.
+    Views only queue emails with emails.outbox.queue_mail."""
+
+    class StatusChoices(models.TextChoices):
+        QUEUED = "QUEUED"
+        SENT = "SENT"
+        FAILED = "FAILED"
+
+    id = models.BigAutoField(primary_key=True)
+    subject = models.TextField()
+    message = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField()
+    status = models.CharField(
+        max_length=255, choices=StatusChoices.choices, default="QUEUED"
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    send_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(default="", blank=True)
+
+    def __str__(self) -> str:
+        return f"Email: {self.subject} to {', '.join(self.recipients)} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["send_after", "id"],
+                name="queuedemail_due_idx",
+                condition=Q(status="QUEUED"),
+            ),
+        ]
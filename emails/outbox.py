@@ -0,0 +1,112 @@
+"""Database backed outbox for the emails sent by the site.
+
+Views call queue_mail instead of send_mail, so a slow or unreachable SMTP server
+doesn't stall requests. The email row is written in the same transaction as the rest
+of the request, so it's sent only if the request commits. The send_queued_mail
+command (run by cron every minute, or as a long running worker with --loop) sends
+the queued emails in batches over one connection per batch. Failed emails are
+retried with exponential backoff until MAX_ATTEMPTS. An email that can't be sent at
+all, e.g. with an invalid header, fails alone without stopping the rest of the batch.
+"""
+
+from datetime import timedelta
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import QueuedEmail
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 6
+RETRY_DELAY = timedelta(minutes=1)
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """Queues email to be sent by send_queued_mail, arguments are the same as in
+    django.core.mail.send_mail. Line breaks in subject, which can come from user
+    input, are replaced with spaces as headers can't contain them."""
+    return QueuedEmail.objects.create(
+        subject=" ".join(subject.splitlines()),
+        message=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipient_list),
+    )
+
+
+def retry_delay(attempts):
+    """Waiting time before the next attempt, doubled after every failed attempt"""
+    return RETRY_DELAY * 2 ** (attempts - 1)
+
+
+def mark_failed(queued_email, error, now):
+    queued_email.attempts += 1
+    queued_email.last_error = str(error)
+    if queued_email.attempts >= MAX_ATTEMPTS:
+        queued_email.status = QueuedEmail.StatusChoices.FAILED
+    else:
+        queued_email.send_after = now + retry_delay(queued_email.attempts)
+
+
+def send_batch(batch):
+    """Sends batch of QueuedEmails over one connection. Returns amount of sent emails,
+    and False as second value if the connection couldn't be opened at all."""
+    now = timezone.now()
+    connection = get_connection()
+    try:
+        connection.open()
+    except (SMTPException, OSError) as error:
+        for queued_email in batch:
+            mark_failed(queued_email, error, now)
+        return 0, False
+
+    sent = 0
+    try:
+        for queued_email in batch:
+            email = EmailMessage(
+                queued_email.subject,
+                queued_email.message,
+                queued_email.from_email,
+                queued_email.recipients,
+                connection=connection,
+            )
+            try:
+                email.send()
+            except Exception as error:
+                mark_failed(queued_email, error, now)
+            else:
+                queued_email.status = QueuedEmail.StatusChoices.SENT
+                queued_email.sent_at = now
+                sent += 1
+    finally:
+        connection.close()
+    return sent, True
+
+
+def send_queued_mail(batch_size=BATCH_SIZE):
+    """Sends all queued emails that are due. Rows of a batch are locked while it's
+    sent and locked rows are skipped, so several workers can run at the same time.
+    Returns amount of sent emails."""
+    sent = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                QueuedEmail.objects.select_for_update(skip_locked=True)
+                .filter(
+                    status=QueuedEmail.StatusChoices.QUEUED,
+                    send_after__lte=timezone.now(),
+                )
+                .order_by("send_after", "id")[:batch_size]
+            )
+            if not batch:
+                return sent
+            batch_sent, connected = send_batch(batch)
+            QueuedEmail.objects.bulk_update(
+                batch,
+                ["status", "attempts", "send_after", "sent_at", "last_error"],
+            )
+        sent += batch_sent
+        if not connected:
+            return sent
@@ -0,0 +1,121 @@
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from emails.models import QueuedEmail
+from emails.outbox import MAX_ATTEMPTS, queue_mail, send_queued_mail
+
+
+class RejectingEmailBackend(EmailBackend):
+    """Rejects emails to addresses starting with "reject" """
+
+    opened = 0
+
+    def open(self):
+        RejectingEmailBackend.opened += 1
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.to[0].startswith("reject"):
+                raise SMTPException("rejected")
+        return super().send_messages(messages)
+
+
+class UnreachableEmailBackend(EmailBackend):
+    def open(self):
+        raise OSError("connection refused")
+
+
+class TestQueuedEmail(TestCase):
+    def test_queue_and_send(self):
+        email = queue_mail("subject", "message", "from@turku.fi", ["to@turku.fi"])
+        self.assertEqual(email.status, QueuedEmail.StatusChoices.QUEUED)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(send_queued_mail(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "subject")
+        self.assertEqual(mail.outbox[0].to, ["to@turku.fi"])
+        email.refresh_from_db()
+        self.assertEqual(email.status, QueuedEmail.StatusChoices.SENT)
+        self.assertIsNotNone(email.sent_at)
+
+        # sent emails are not sent again
+        self.assertEqual(send_queued_mail(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_BACKEND="emails.tests.test_models.RejectingEmailBackend")
+    def test_batches_share_connection_and_failures_are_retried(self):
+        RejectingEmailBackend.opened = 0
+        for number in range(5):
+            queue_mail("subject", "message", None, [f"to{number}@turku.fi"])
+        rejected = queue_mail("subject", "message", None, ["reject@turku.fi"])
+
+        self.assertEqual(send_queued_mail(batch_size=3), 5)
+        self.assertEqual(RejectingEmailBackend.opened, 2)
+        self.assertEqual(len(mail.outbox), 5)
+        rejected.refresh_from_db()
+        self.assertEqual(rejected.status, QueuedEmail.StatusChoices.QUEUED)
+        self.assertEqual(rejected.attempts, 1)
+        self.assertEqual(rejected.last_error, "rejected")
+        self.assertGreater(rejected.send_after, timezone.now())
+
+        # not retried before send_after, gives up after MAX_ATTEMPTS
+        self.assertEqual(send_queued_mail(), 0)
+        self.assertEqual(rejected.attempts, 1)
+        previous_delay = timedelta(0)
+        for attempt in range(2, MAX_ATTEMPTS + 1):
+            QueuedEmail.objects.filter(id=rejected.id).update(send_after=timezone.now())
+            send_queued_mail()
+            rejected.refresh_from_db()
+            self.assertEqual(rejected.attempts, attempt)
+            delay = rejected.send_after - timezone.now()
+            if attempt < MAX_ATTEMPTS:
+                self.assertGreater(delay, previous_delay)
+                previous_delay = delay
+        self.assertEqual(rejected.status, QueuedEmail.StatusChoices.FAILED)
+
+    def test_invalid_email_does_not_block_the_outbox(self):
+        email = queue_mail("bad\nsubject", "message", None, ["to@turku.fi"])
+        self.assertEqual(email.subject, "bad subject")
+
+        invalid = QueuedEmail.objects.create(
+            subject="bad\nsubject",
+            message="message",
+            from_email="from@turku.fi",
+            recipients=["to@turku.fi"],
+        )
+        valid = queue_mail("subject", "message", None, ["to@turku.fi"])
+        self.assertEqual(send_queued_mail(), 2)
+        self.assertEqual(len(mail.outbox), 2)
+        invalid.refresh_from_db()
+        self.assertEqual(invalid.status, QueuedEmail.StatusChoices.QUEUED)
+        self.assertEqual(invalid.attempts, 1)
+        valid.refresh_from_db()
+        self.assertEqual(valid.status, QueuedEmail.StatusChoices.SENT)
+
+    @override_settings(EMAIL_BACKEND="emails.tests.test_models.UnreachableEmailBackend")
+    def test_unreachable_server(self):
+        email = queue_mail("subject", "message", None, ["to@turku.fi"])
+        self.assertEqual(send_queued_mail(), 0)
+        email.refresh_from_db()
+        self.assertEqual(email.status, QueuedEmail.StatusChoices.QUEUED)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.last_error, "connection refused")
+
+    def test_send_queued_mail_command(self):
+        queue_mail("subject", "message", None, ["to@turku.fi"])
+        out = StringIO()
+        call_command("send_queued_mail", stdout=out)
+        self.assertIn("Sent 1 emails.", out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_self_string(self):
+        email = queue_mail("subject", "message", None, ["to@turku.fi"])
+        self.assertEqual(str(email), "Email: subject to to@turku.fi (QUEUED)")
@@ -1,8 +1,9 @@
 from django.contrib import admin
 
-from .models import Order, OrderEmailRecipient, ShoppingCart
+from .models import Order, OrderEmailRecipient, OrderMonthlyStat, ShoppingCart
 
 # Register your models here.
 admin.site.register(Order)
 admin.site.register(ShoppingCart)
 admin.site.register(OrderEmailRecipient)
+admin.site.register(OrderMonthlyStat)
@@ -0,0 +1,187 @@
+"""Reserving ProductItems to ShoppingCarts and Orders.
+
+Items are reserved and released as sets with a constant number of queries. Reserving
+locks the available items it takes with SELECT ... FOR UPDATE SKIP LOCKED, so two carts
+never get the same item: an item already being taken by another cart is skipped and
+the next available one is taken instead. The reserved items are then moved to the cart
+with one UPDATE and one bulk insert of cart links.
+
+Every reservation expires CART_RESERVATION_MINUTES after the cart was last changed.
+release_expired_items, run every minute by the release_expired_reservations command,
+releases the expired ones in batches.
+
+Ordering moves the items of a cart to an Order, and editing an Order adds and removes
+the difference between its items and the requested ones, also with a constant number
+of queries.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from products.bulk import log_items, select_items
+from products.models import ProductAvailability, ProductItem, ProductItemLogEntry
+
+from .models import Order, ShoppingCartItem, reservation_expiry
+
+SWEEP_BATCH_SIZE = 500
+
+OrderItem = Order.product_items.through
+
+
+def reserve_items(cart, product, amount, user):
+    """Moves up to amount available items of product to cart.
+    Returns amount of reserved items, less than amount if there aren't enough."""
+    if amount <= 0:
+        return 0
+    with transaction.atomic():
+        item_ids, _ = select_items(
+            ProductItem.objects.filter(
+                product=product,
+                available=True,
+                status=ProductItem.ItemStatusChoices.AVAILABLE.value,
+            ).exclude(shoppingcart=cart),
+            amount,
+            skip_locked=True,
+        )
+        ProductItem.objects.filter(id__in=item_ids).update(
+            available=False, status=ProductItem.ItemStatusChoices.IN_CART.value
+        )
+        ShoppingCartItem.objects.bulk_create(
+            [
+                ShoppingCartItem(shoppingcart_id=cart.id, productitem_id=item_id)
+                for item_id in item_ids
+            ]
+        )
+        log_items(item_ids, ProductItemLogEntry.ActionChoices.CART_ADD, user)
+        ProductAvailability.refresh([product.id])
+    return len(item_ids)
+
+
+def release_items(
+    cart,
+    user,
+    product=None,
+    amount=None,
+    action=ProductItemLogEntry.ActionChoices.CART_REMOVE,
+):
+    """Moves up to amount items of product (items of all products if None) from cart
+    back to available. Returns amount of released items."""
+    product_items = cart.product_items.all()
+    if product is not None:
+        product_items = product_items.filter(product=product)
+    with transaction.atomic():
+        item_ids, product_ids = select_items(product_items, amount)
+        ProductItem.objects.filter(id__in=item_ids).update(
+            available=True, status=ProductItem.ItemStatusChoices.AVAILABLE.value
+        )
+        ShoppingCartItem.objects.filter(
+            shoppingcart_id=cart.id, productitem_id__in=item_ids
+        ).delete()
+        log_items(item_ids, action, user)
+        ProductAvailability.refresh(product_ids)
+    return len(item_ids)
+
+
+def set_cart_amount(cart, product, amount, user):
+    """Reserves or releases items of product so that cart has amount of them, or as
+    many as there are available. Returns amount of product's items in cart after."""
+    with transaction.atomic():
+        in_cart = cart.product_items.filter(product=product).count()
+        if amount > in_cart:
+            in_cart += reserve_items(cart, product, amount - in_cart, user)
+        elif amount < in_cart:
+            in_cart -= release_items(cart, user, product, in_cart - amount)
+        ShoppingCartItem.objects.filter(shoppingcart_id=cart.id).update(
+            expires_at=reservation_expiry()
+        )
+        cart.save()
+    return in_cart
+
+
+def order_items(cart, order, user):
+    """Moves all items of cart to order, marking them Unavailable.
+    Returns ids of the ordered items."""
+    with transaction.atomic():
+        item_ids, product_ids = select_items(cart.product_items.all())
+        ProductItem.objects.filter(id__in=item_ids).update(
+            available=False, status=ProductItem.ItemStatusChoices.UNAVAILABLE.value
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order_id=order.id, productitem_id=item_id)
+                for item_id in item_ids
+            ],
+            ignore_conflicts=True,
+        )
+        ShoppingCartItem.objects.filter(shoppingcart_id=cart.id).delete()
+        log_items(item_ids, ProductItemLogEntry.ActionChoices.ORDER, user)
+        ProductAvailability.refresh(product_ids)
+    return item_ids
+
+
+def set_order_items(order, item_ids, user):
+    """Makes item_ids the items of order. Removed items become available again, of the
+    added items only available ones are added. Returns ids of added and removed items.
+    """
+    item_ids = set(item_ids)
+    with transaction.atomic():
+        removed_ids, removed_product_ids = select_items(
+            order.product_items.exclude(id__in=item_ids)
+        )
+        ProductItem.objects.filter(id__in=removed_ids).update(
+            available=True, status=ProductItem.ItemStatusChoices.AVAILABLE.value
+        )
+        OrderItem.objects.filter(
+            order_id=order.id, productitem_id__in=removed_ids
+        ).delete()
+        log_items(removed_ids, ProductItemLogEntry.ActionChoices.ORDER_REMOVE, user)
+
+        added_ids, added_product_ids = select_items(
+            ProductItem.objects.filter(id__in=item_ids, available=True).exclude(
+                order=order
+            )
+        )
+        ProductItem.objects.filter(id__in=added_ids).update(
+            available=False, status=ProductItem.ItemStatusChoices.UNAVAILABLE.value
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order_id=order.id, productitem_id=item_id)
+                for item_id in added_ids
+            ]
+        )
+        log_items(added_ids, ProductItemLogEntry.ActionChoices.ORDER_ADD, user)
+        ProductAvailability.refresh(removed_product_ids | added_product_ids)
+    return added_ids, removed_ids
+
+
+def release_expired_items(batch_size=SWEEP_BATCH_SIZE):
+    """Releases items whose reservation has expired, batch_size items per transaction.
+    Reservations and items locked by requests changing the carts are skipped and left
+    for the next run. Returns amount of released items."""
+    released = 0
+    while True:
+        with transaction.atomic():
+            reservations = list(
+                ShoppingCartItem.objects.select_for_update(
+                    skip_locked=True, of=("self", "productitem")
+                )
+                .select_related("productitem")
+                .only("productitem__product")
+                .filter(expires_at__lte=timezone.now())
+                .order_by("expires_at")[:batch_size]
+            )
+            item_ids = [reservation.productitem_id for reservation in reservations]
+            ProductItem.objects.filter(id__in=item_ids).update(
+                available=True, status=ProductItem.ItemStatusChoices.AVAILABLE.value
+            )
+            ShoppingCartItem.objects.filter(
+                id__in=[reservation.id for reservation in reservations]
+            ).delete()
+            log_items(item_ids, ProductItemLogEntry.ActionChoices.CART_TIMEOUT, None)
+            ProductAvailability.refresh(
+                {reservation.productitem.product_id for reservation in reservations}
+            )
+        released += len(reservations)
+        if len(reservations) < batch_size:
+            return released
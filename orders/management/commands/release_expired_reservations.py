@@ -0,0 +1,25 @@
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from orders.cart import SWEEP_BATCH_SIZE, release_expired_items
+
+
+class Command(BaseCommand):
+    help = "Releases ProductItems whose ShoppingCart reservation has expired"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=SWEEP_BATCH_SIZE,
+            help="Amount of items released per transaction",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        start = time.monotonic()
+        released = release_expired_items(options["batch_size"])
+        self.stdout.write(
+            f"Released {released} expired items in {time.monotonic() - start:.2f}s."
+        )
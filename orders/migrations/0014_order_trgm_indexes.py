@@ -0,0 +1,40 @@
+# Generated by Django 4.1.4 on 2026-10-17 11:20
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+import django.db.models.functions.text
+import products.search
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0013_alter_order_delivery_required"),
+        ("products", "0022_product_name_trgm_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    products.search.ImmutableUnaccent(
+                        django.db.models.functions.text.Lower("recipient")
+                    ),
+                    name="gin_trgm_ops",
+                ),
+                name="order_recipient_trgm_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    products.search.ImmutableUnaccent(
+                        django.db.models.functions.text.Lower("delivery_address")
+                    ),
+                    name="gin_trgm_ops",
+                ),
+                name="order_address_trgm_idx",
+            ),
+        ),
+    ]
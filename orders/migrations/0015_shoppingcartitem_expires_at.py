@@ -0,0 +1,62 @@
+# Generated by Django 4.1.4 on 2026-10-17 11:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+import orders.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0024_productitem_modified_idx"),
+        ("orders", "0014_order_trgm_indexes"),
+    ]
+
+    operations = [
+        # the existing table of ShoppingCart.product_items becomes ShoppingCartItem
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="ShoppingCartItem",
+                    fields=[
+                        ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                        (
+                            "productitem",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="products.productitem",
+                            ),
+                        ),
+                        (
+                            "shoppingcart",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="orders.shoppingcart",
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "orders_shoppingcart_product_items",
+                        "unique_together": {("shoppingcart", "productitem")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="shoppingcart",
+                    name="product_items",
+                    field=models.ManyToManyField(
+                        through="orders.ShoppingCartItem", to="products.productitem"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="shoppingcartitem",
+            name="expires_at",
+            field=models.DateTimeField(default=orders.models.reservation_expiry),
+        ),
+        migrations.AddIndex(
+            model_name="shoppingcartitem",
+            index=models.Index(
+                fields=["expires_at"], name="shoppingcartitem_expires_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.1.4 on 2026-10-17 11:59
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+
+
+def count_existing_orders(apps, schema_editor):
+    """Builds the rollup for the Orders created before it existed"""
+    Order = apps.get_model("orders", "Order")
+    OrderMonthlyStat = apps.get_model("orders", "OrderMonthlyStat")
+    months = (
+        Order.objects.annotate(month=TruncMonth("creation_date"))
+        .values("month")
+        .annotate(count=Count("id"))
+        .values_list("month", "count")
+    )
+    OrderMonthlyStat.objects.bulk_create(
+        [
+            OrderMonthlyStat(year=month.year, month=month.month, count=count)
+            for month, count in months
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0015_shoppingcartitem_expires_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderMonthlyStat",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("year", models.PositiveIntegerField()),
+                ("month", models.PositiveSmallIntegerField()),
+                ("count", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="ordermonthlystat",
+            constraint=models.UniqueConstraint(
+                fields=("year", "month"), name="unique_ordermonthlystat"
+            ),
+        ),
+        migrations.RunPython(count_existing_orders, migrations.RunPython.noop),
+    ]
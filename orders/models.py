@@ -1,21 +1,54 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
 
 from products.models import ProductItem
+from products.search import unaccented
+from tavarat_kiertoon.cache import track_model_cache
 from users.models import CustomUser
 
 
+def reservation_expiry():
+    return timezone.now() + timedelta(minutes=settings.CART_RESERVATION_MINUTES)
+
+
 # Create your models here.
 class ShoppingCart(models.Model):
     id = models.BigAutoField(primary_key=True)
     user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True)
-    product_items = models.ManyToManyField(ProductItem)  # product_items?
+    product_items = models.ManyToManyField(
+        ProductItem, through="ShoppingCartItem"
+    )  # product_items?
     date = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
         return f"{self.user}'s ShoppingCart({self.id})"
 
 
+class ShoppingCartItem(models.Model):
+    """Reservation of a ProductItem to a ShoppingCart, released by the
+    release_expired_reservations command after expires_at"""
+
+    id = models.BigAutoField(primary_key=True)
+    shoppingcart = models.ForeignKey(ShoppingCart, on_delete=models.CASCADE)
+    productitem = models.ForeignKey(ProductItem, on_delete=models.CASCADE)
+    expires_at = models.DateTimeField(default=reservation_expiry)
+
+    class Meta:
+        db_table = "orders_shoppingcart_product_items"
+        unique_together = [["shoppingcart", "productitem"]]
+        indexes = [
+            models.Index(fields=["expires_at"], name="shoppingcartitem_expires_idx")
+        ]
+
+
 class Order(models.Model):
     """class modeling Order table in database"""
 
@@ -43,6 +76,60 @@ class Order(models.Model):
     def __str__(self) -> str:
         return f"{self.user}'s Order({self.id})"
 
+    class Meta:
+        indexes = [
+            GinIndex(
+                OpClass(unaccented("recipient"), name="gin_trgm_ops"),
+                name="order_recipient_trgm_idx",
+            ),
+            GinIndex(
+                OpClass(unaccented("delivery_address"), name="gin_trgm_ops"),
+                name="order_address_trgm_idx",
+            ),
+        ]
+
+
+class OrderMonthlyStat(models.Model):
+    """Amount of Orders created per month, in the current time zone. Incremented and
+    decremented when Orders are created and deleted."""
+
+    id = models.BigAutoField(primary_key=True)
+    year = models.PositiveIntegerField()
+    month = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"Orders {self.year}/{self.month}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["year", "month"], name="unique_ordermonthlystat"
+            )
+        ]
+
+    @classmethod
+    def add(cls, date, amount):
+        """Adds amount, negative to subtract, to the count of the month of date.
+        The row is locked by the UPDATE, so concurrent changes don't get lost."""
+        date = timezone.localtime(date)
+        stat, _ = cls.objects.get_or_create(year=date.year, month=date.month)
+        cls.objects.filter(id=stat.id).update(count=F("count") + amount)
+
+
+@receiver(post_save, sender=Order)
+def count_created_order(sender, instance, created, **kwargs):
+    if created:
+        OrderMonthlyStat.add(instance.creation_date, 1)
+
+
+@receiver(post_delete, sender=Order)
+def uncount_deleted_order(sender, instance, **kwargs):
+    OrderMonthlyStat.add(instance.creation_date, -1)
+
+
+track_model_cache(Order)
+
 
 class OrderEmailRecipient(models.Model):
     """Table representing all persons who will recieve email when order is made"""
@@ -1,6 +1,7 @@
 import json
 from rest_framework import serializers
 
+from products.models import ProductItem
 from products.serializers import ProductItemResponseSerializer, ProductItemSerializer
 from users.custom_functions import validate_email_domain
 from users.serializers import UserFullResponseSchemaSerializer, UserFullSerializer
@@ -10,6 +11,11 @@ import datetime
 
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
+    # writable although product_items has a through model
+    product_items = serializers.PrimaryKeyRelatedField(
+        many=True, queryset=ProductItem.objects.all()
+    )
+
     class Meta:
         model = ShoppingCart
         fields = "__all__"
@@ -17,6 +23,8 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
 
 
 class ShoppingCartResponseSerializer(serializers.ModelSerializer):
+    product_items = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
     class Meta:
         model = ShoppingCart
         fields = "__all__"
@@ -41,6 +49,11 @@ class ShoppingCartDetailResponseSerializer(ShoppingCartResponseSerializer):
     product_items = ProductItemResponseSerializer(many=True, read_only=True)
 
 
+class ShoppingCartAmountResponseSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    amount = serializers.IntegerField()
+
+
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
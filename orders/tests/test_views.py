@@ -1,13 +1,21 @@
 import datetime
+from io import StringIO
 
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from categories.models import Category
 from cron import clear_shopping_carts
-from orders.models import Order, OrderEmailRecipient, ShoppingCart
-from products.models import Color, Product, ProductItem, Storage
+from orders.cart import set_cart_amount, set_order_items
+from orders.models import Order, OrderEmailRecipient, ShoppingCart, ShoppingCartItem
+from pauseshop.models import Pause
+from products.bulk import create_product_items
+from products.models import Color, Product, ProductItem, ProductItemLogEntry, Storage
 from users.models import CustomUser
 
 
@@ -188,19 +196,17 @@ class TestOrders(TestCase):
         cls.test_shoppingcart3.product_items.add(
             ProductItem.objects.filter(product=cls.test_product3).first()
         )
-        ShoppingCart.objects.filter(pk=cls.test_shoppingcart3.pk).update(
-            date=timezone.now() - datetime.timedelta(hours=1)
+        ShoppingCartItem.objects.filter(shoppingcart=cls.test_shoppingcart3).update(
+            expires_at=timezone.now() + datetime.timedelta(hours=1)
         )
-        cls.test_shoppingcart3.refresh_from_db()
 
         cls.test_shoppingcart4 = ShoppingCart.objects.create(user=cls.test_user4)
         cls.test_shoppingcart4.product_items.add(
             ProductItem.objects.filter(product=cls.test_product3).last()
         )
-        ShoppingCart.objects.filter(pk=cls.test_shoppingcart4.pk).update(
-            date=timezone.now() - datetime.timedelta(hours=3)
+        ShoppingCartItem.objects.filter(shoppingcart=cls.test_shoppingcart4).update(
+            expires_at=timezone.now() - datetime.timedelta(hours=1)
         )
-        cls.test_shoppingcart4.refresh_from_db()
 
         cls.test_shoppingcart5 = ShoppingCart.objects.create(user=cls.test_user5)
 
@@ -224,6 +230,10 @@ class TestOrders(TestCase):
             cls.test_group_bicycle.user_set.add(cls.test_user2)
             cls.test_group_bicycle.user_set.add(cls.test_user1)
 
+    def setUp(self):
+        # pause calendar cached by other tests would outlive their rolled back data
+        cache.clear()
+
     def login_test_user(self):
         url = "/users/login/"
         data = {
@@ -314,6 +324,42 @@ class TestOrders(TestCase):
         self.assertNotEqual(list(self.test_shoppingcart3.product_items.values()), [])
         self.assertEqual(list(self.test_shoppingcart4.product_items.values()), [])
 
+    def test_release_expired_reservations(self):
+        ShoppingCartItem.objects.update(
+            expires_at=timezone.now() - datetime.timedelta(minutes=1)
+        )
+        reserved = list(ShoppingCartItem.objects.values_list("productitem", flat=True))
+        ProductItem.objects.filter(id__in=reserved).update(
+            available=False, status="In cart"
+        )
+        out = StringIO()
+        call_command("release_expired_reservations", batch_size=3, stdout=out)
+        self.assertIn(f"Released {len(reserved)} expired items in", out.getvalue())
+        self.assertFalse(ShoppingCartItem.objects.exists())
+        self.assertEqual(
+            ProductItem.objects.filter(
+                id__in=reserved, available=True, status="Available"
+            ).count(),
+            len(reserved),
+        )
+        self.assertEqual(
+            ProductItem.objects.filter(
+                id__in=reserved,
+                log_entries__action=ProductItemLogEntry.ActionChoices.CART_TIMEOUT,
+            ).count(),
+            len(reserved),
+        )
+
+    def test_shopping_cart_change_extends_reservations(self):
+        ShoppingCartItem.objects.filter(shoppingcart=self.test_shoppingcart).update(
+            expires_at=timezone.now() - datetime.timedelta(minutes=1)
+        )
+        self.client.login(username="kahvimake@turku.fi", password="asd123")
+        data = {"product": self.test_product1.id, "amount": 2}
+        self.client.put("/shopping_cart/", data, content_type="application/json")
+        clear_shopping_carts()
+        self.assertEqual(self.test_shoppingcart.product_items.count(), 9)
+
     def test_empty_shopping_cart(self):
         url = "/shopping_cart/"
         self.client.login(username="kahvimake@turku.fi", password="asd123")
@@ -360,12 +406,82 @@ class TestOrders(TestCase):
             0,
         )
 
+    def test_shopping_cart_reservations(self):
+        url = "/shopping_cart/"
+        product = Product.objects.create(
+            category=self.test_category1, name="kahvikuppi", price=0, weight=1
+        )
+        create_product_items(product, 5, self.test_user2, storage=self.test_storage1)
+
+        # queries don't depend on the amount of reserved items
+        self.client.login(username="cartman3@turku.fi", password="eric3")
+        data = {"product": product.id, "amount": 1}
+        with CaptureQueriesContext(connection) as one_item:
+            response = self.client.put(url, data, content_type="application/json")
+        self.assertEqual(response.json(), {"product": product.id, "amount": 1})
+        data["amount"] = 3
+        with CaptureQueriesContext(connection) as two_items:
+            response = self.client.put(url, data, content_type="application/json")
+        self.assertEqual(response.json(), {"product": product.id, "amount": 3})
+        self.assertEqual(len(one_item), len(two_items))
+        self.assertEqual(
+            product.productitem_set.filter(
+                status="In cart", available=False, shoppingcart=self.test_shoppingcart5
+            ).count(),
+            3,
+        )
+        self.assertEqual(
+            product.productitem_set.filter(
+                log_entries__action=ProductItemLogEntry.ActionChoices.CART_ADD
+            ).count(),
+            3,
+        )
+
+        # items reserved to another cart are not taken
+        self.client.login(username="kahvimake@turku.fi", password="asd123")
+        data["amount"] = 5
+        response = self.client.put(url, data, content_type="application/json")
+        self.assertEqual(response.json(), {"product": product.id, "amount": 2})
+
+        self.client.login(username="cartman3@turku.fi", password="eric3")
+        data["amount"] = 1
+        response = self.client.put(url, data, content_type="application/json")
+        self.assertEqual(response.json(), {"product": product.id, "amount": 1})
+        self.assertEqual(
+            product.productitem_set.filter(status="Available", available=True).count(),
+            2,
+        )
+        self.assertEqual(product.availability.available, 2)
+
     def test_get_orders(self):
         self.login_test_user()
         url = "/orders/?status=Waiting"
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
 
+    def test_search_orders(self):
+        self.login_test_user()
+        Order.objects.filter(pk=self.test_order.pk).update(
+            recipient="Matti Meikäläinen", delivery_address="Työpöytäkatu 5"
+        )
+        url = "/orders/?search=meikalainen"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 1)
+        self.assertEqual(response.json()["results"][0]["id"], self.test_order.id)
+
+        url = "/orders/?delivery_address=tyopoytakatu"
+        response = self.client.get(url)
+        self.assertEqual(response.json()["count"], 1)
+
+        url = "/orders/?recipient=meikälinen"
+        response = self.client.get(url)
+        self.assertEqual(response.json()["count"], 1)
+
+        url = "/orders/?recipient=tyopoytakatu"
+        response = self.client.get(url)
+        self.assertEqual(response.json()["count"], 0)
+
     def test_post_order(self):
         url = "/orders/"
         # self.client.login(username="kahvimake@turku.fi", password="asd123")
@@ -399,6 +515,49 @@ class TestOrders(TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(Order.objects.all().count(), 3)
 
+    def test_post_order_bulk(self):
+        url = "/orders/"
+        product = Product.objects.create(
+            category=self.test_category1, name="kahvikuppi", price=0, weight=1
+        )
+        create_product_items(product, 10, self.test_user2, storage=self.test_storage1)
+        self.login_test_user5()
+        data = {
+            "user": self.test_user5.id,
+            "delivery_address": "kuja123",
+            "recipient": "Cart Man",
+            "recipient_phone_number": "2020202020",
+        }
+
+        # queries don't depend on the amount of ordered items
+        queries = []
+        for amount in (1, 8):
+            set_cart_amount(self.test_shoppingcart5, product, amount, self.test_user5)
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(url, data, content_type="application/json")
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(len(response.json()["product_items"]), amount)
+            queries.append(context.captured_queries)
+        # the first order read the pause calendar to the cache
+        self.assertEqual(len(queries[0]), len(queries[1]) + 1)
+        self.assertFalse(any("pauseshop_pause" in query["sql"] for query in queries[1]))
+        self.assertFalse(self.test_shoppingcart5.product_items.exists())
+        self.assertEqual(
+            product.productitem_set.filter(
+                status="Unavailable",
+                available=False,
+                log_entries__action=ProductItemLogEntry.ActionChoices.ORDER,
+            ).count(),
+            9,
+        )
+        self.assertEqual(product.availability.available, 1)
+
+        set_cart_amount(self.test_shoppingcart5, product, 1, self.test_user5)
+        today = timezone.localdate()
+        Pause.objects.create(start_date=today, end_date=today)
+        response = self.client.post(url, data, content_type="application/json")
+        self.assertEqual(response.status_code, 418)
+
     def test_post_order_no_products(self):
         url = "/orders/"
         self.login_test_user5()
@@ -499,6 +658,77 @@ class TestOrders(TestCase):
         response = self.client.put(url, data, content_type="application/json")
         self.assertEqual(response.status_code, 400)
 
+    def test_update_order_items(self):
+        url = f"/orders/{self.test_order2.id}/"
+        product = Product.objects.create(
+            category=self.test_category1, name="kahvikuppi", price=0, weight=1
+        )
+        item_ids = [
+            product_item.id
+            for product_item in create_product_items(
+                product, 20, self.test_user2, storage=self.test_storage1
+            )
+        ]
+        ProductItem.objects.filter(id=item_ids[-1]).update(available=False)
+        set_order_items(self.test_order2, item_ids[:2], self.test_user1)
+        self.client.login(username="kahvimake@turku.fi", password="asd123")
+        data = {
+            "status": "Waiting",
+            "delivery_address": "string",
+            "recipient": "string",
+            "recipient_phone_number": "11212121",
+        }
+
+        # queries don't depend on the amount of added or removed items
+        queries = []
+        for requested in (item_ids[1:3], item_ids[3:]):
+            data["product_items"] = requested
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.put(url, data, content_type="application/json")
+            self.assertEqual(response.status_code, 202)
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])
+
+        # unavailable items are not added
+        self.assertEqual(
+            sorted(item["id"] for item in response.json()["product_items"]),
+            item_ids[3:-1],
+        )
+        self.assertEqual(
+            product.productitem_set.filter(
+                status="Unavailable", available=False
+            ).count(),
+            16,
+        )
+        self.assertTrue(
+            ProductItem.objects.filter(
+                id=item_ids[1],
+                available=True,
+                status="Available",
+                log_entries__action=ProductItemLogEntry.ActionChoices.ORDER_REMOVE,
+            ).exists()
+        )
+        self.assertEqual(product.availability.available, 3)
+
+    def test_get_order_stats(self):
+        url = "/orders/stat/"
+        self.client.login(username="kahvimake@turku.fi", password="asd123")
+        today = timezone.localdate()
+        response = self.client.get(url)
+        self.assertEqual(
+            response.json(), {str(today.year): {str(today.month): 2, "total": 2}}
+        )
+
+        order = Order.objects.create(user=self.test_user1)
+        response = self.client.get(url)
+        self.assertEqual(response.json()[str(today.year)][str(today.month)], 3)
+        order.delete()
+        self.test_order2.delete()
+        response = self.client.get(url)
+        self.assertEqual(
+            response.json()[str(today.year)], {str(today.month): 1, "total": 1}
+        )
+
     def test_delete_order(self):
         self.login_test_user()
         url = f"/orders/{self.test_order.id}/"
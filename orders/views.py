@@ -1,13 +1,13 @@
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.mail import send_mail
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.utils import timezone
 from django_filters import rest_framework as filters
 from drf_spectacular.utils import extend_schema, extend_schema_view
 from rest_framework import status
 from rest_framework.authentication import BasicAuthentication, SessionAuthentication
 from rest_framework.filters import OrderingFilter
-from datetime import datetime
 from django.db.models import Sum, Count
 from rest_framework.generics import (
     ListAPIView,
@@ -15,18 +15,21 @@ from rest_framework.generics import (
     RetrieveUpdateAPIView,
     RetrieveUpdateDestroyAPIView,
 )
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
-from products.models import Product, ProductItem, ProductItemLogEntry
+from emails.outbox import queue_mail
+from products.models import Product, ProductItem
+from products.search import SearchRankOrderingFilter, trigram_search
+from tavarat_kiertoon.pagination import OptionalCursorPagination
 from users.permissions import HasGroupPermission
 from users.views import CustomJWTAuthentication
 
 from rest_framework.views import APIView
 
-from .models import Order, OrderEmailRecipient, ShoppingCart
+from .cart import order_items, release_items, set_cart_amount, set_order_items
+from .models import Order, OrderEmailRecipient, OrderMonthlyStat, ShoppingCart
 from .serializers import (
     OrderDetailRequestSerializer,
     OrderDetailResponseSerializer,
@@ -35,6 +38,7 @@ from .serializers import (
     OrderRequestSerializer,
     OrderResponseSerializer,
     OrderSerializer,
+    ShoppingCartAmountResponseSerializer,
     ShoppingCartDetailRequestSerializer,
     ShoppingCartDetailResponseSerializer,
     ShoppingCartDetailSerializer,
@@ -42,7 +46,7 @@ from .serializers import (
     ShoppingCartSerializer,
     OrderStatSerializer,
 )
-from pauseshop.models import Pause
+from pauseshop.models import is_paused
 
 # Create your views here.
 
@@ -82,7 +86,7 @@ class ShoppingCartListView(ListCreateAPIView):
     get=extend_schema(responses=ShoppingCartDetailResponseSerializer),
     put=extend_schema(
         request=ShoppingCartDetailRequestSerializer,
-        responses=ShoppingCartDetailResponseSerializer,
+        responses=ShoppingCartAmountResponseSerializer,
     ),
     patch=extend_schema(exclude=True),
 )
@@ -119,78 +123,48 @@ class ShoppingCartDetailView(RetrieveUpdateAPIView):
             return Response("Shopping cart for this user does not exist")
         # if amount is -1, clear users ShoppingCart
         if request.data["amount"] == -1:
-            log_entry = ProductItemLogEntry.objects.create(
-                action=ProductItemLogEntry.ActionChoices.CART_REMOVE, user=request.user
-            )
-            for product_item in instance.product_items.all():
-                product_item.log_entries.add(log_entry)
-                product_item.available = True
-                product_item.status = "Available"
-                product_item.save()
-            instance.product_items.clear()
-            instance.save()
-            # updatedinstance = ShoppingCart.objects.get(user=request.user)
-            # detailserializer = ShoppingCartDetailSerializer(updatedinstance)
+            with transaction.atomic():
+                release_items(instance, request.user)
+                instance.save()
             return Response(status=status.HTTP_202_ACCEPTED)
 
         changeable_product = Product.objects.get(id=request.data["product"])
-        itemset = ProductItem.objects.filter(product=changeable_product, available=True)
-        available_itemset = itemset.exclude(id__in=instance.product_items.values("id"))
-        removable_itemset = instance.product_items.filter(product=changeable_product)
-        amount = request.data["amount"]
-
-        # comparing amount to number of product_items already in shoppingcart, proceeding accordingly
-        if len(removable_itemset) < amount:
-            log_entry = ProductItemLogEntry.objects.create(
-                action=ProductItemLogEntry.ActionChoices.CART_ADD, user=request.user
-            )
-            amount -= len(removable_itemset)
-            if len(available_itemset) < amount:
-                amount = len(available_itemset)
-            for i in range(amount):
-                instance.product_items.add(available_itemset[i])
-                available_itemset[i].log_entries.add(log_entry)
-                available_itemset[i].available = False
-                available_itemset[i].status = "In cart"
-                available_itemset[i].save()
-            instance.save()
-
-        else:
-            log_entry = ProductItemLogEntry.objects.create(
-                action=ProductItemLogEntry.ActionChoices.CART_REMOVE, user=request.user
-            )
-            amount -= len(removable_itemset)
-            amount *= -1
-            for i in range(amount):
-                instance.product_items.remove(removable_itemset[i])
-                removable_itemset[i].log_entries.add(log_entry)
-                removable_itemset[i].available = True
-                removable_itemset[i].status = "Available"
-                removable_itemset[i].save()
-            instance.save()
-
-        # updatedinstance = ShoppingCart.objects.get(user=request.user)
-        # detailserializer = ShoppingCartDetailSerializer(updatedinstance)
-        return Response(status=status.HTTP_202_ACCEPTED)
-
-
-class OrderListPagination(PageNumberPagination):
+        amount = set_cart_amount(
+            instance, changeable_product, request.data["amount"], request.user
+        )
+        return Response(
+            {"product": changeable_product.id, "amount": amount},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+# items of an Order with the relations ProductItemSerializer renders
+ORDER_ITEMS_PREFETCH = Prefetch(
+    "product_items",
+    queryset=ProductItem.objects.select_related("storage").prefetch_related(
+        Prefetch("product", queryset=Product.objects.for_catalog())
+    ),
+)
+
+
+class OrderListPagination(OptionalCursorPagination):
     page_size = 50
-    page_size_query_param = "page_size"
 
 
 class OrderFilter(filters.FilterSet):
     id = filters.CharFilter(lookup_expr="iexact")
-    recipient = filters.CharFilter(lookup_expr="icontains")
+    search = filters.CharFilter(method="search_filter", label="Search")
+    recipient = filters.CharFilter(method="search_filter")
     recipient_phone_number = filters.CharFilter(lookup_expr="icontains")
     order_info = filters.CharFilter(lookup_expr="icontains")
-    delivery_address = filters.CharFilter(lookup_expr="icontains")
+    delivery_address = filters.CharFilter(method="search_filter")
     status = filters.MultipleChoiceFilter(choices=Order.StatusChoices.choices)
 
     class Meta:
         model = Order
         fields = [
             "id",
+            "search",
             "recipient",
             "recipient_phone_number",
             "order_info",
@@ -198,6 +172,13 @@ class OrderFilter(filters.FilterSet):
             "delivery_address",
         ]
 
+    def search_filter(self, queryset, name, value):
+        """Typo tolerant search on recipient and delivery_address using trigram indexes,
+        search parameter looks from both. See products.search.trigram_search"""
+        if name == "search":
+            return trigram_search(queryset, value, ["recipient", "delivery_address"])
+        return trigram_search(queryset, value, [name])
+
 
 class UserOrderFilter(filters.FilterSet):
     status = filters.MultipleChoiceFilter(choices=Order.StatusChoices.choices)
@@ -217,7 +198,7 @@ class OrderListView(ListCreateAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     pagination_class = OrderListPagination
-    filter_backends = [filters.DjangoFilterBackend, OrderingFilter]
+    filter_backends = [filters.DjangoFilterBackend, SearchRankOrderingFilter]
     ordering_fields = ["id"]
     ordering = ["-id"]
     filterset_class = OrderFilter
@@ -234,32 +215,19 @@ class OrderListView(ListCreateAPIView):
         "POST": ["user_group"],
     }
 
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
         user = request.user
         shopping_cart = ShoppingCart.objects.get(user=user.id)
         pickup_date = request.data.get("pickup_date")
         serializer = OrderSerializer(data=request.data)
-        pause_test = Pause.objects.filter(
-            start_date__lte=datetime.now().date(), end_date__gte=datetime.now().date()
-        )
-        print(pause_test)
-        if pause_test.count() > 0:
+        if is_paused(timezone.localdate()):
             return Response("System is on hiatus", status=status.HTTP_418_IM_A_TEAPOT)
-        if shopping_cart.product_items.count() < 1:
+        if not shopping_cart.product_items.exists():
             return Response("Order has no products", status=status.HTTP_400_BAD_REQUEST)
         if serializer.is_valid():
-            serializer.save()
-            order = Order.objects.get(id=serializer.data["id"])
-            order.user = user
-            log_entry = ProductItemLogEntry.objects.create(
-                action=ProductItemLogEntry.ActionChoices.ORDER, user=user
-            )
-            for product_item in shopping_cart.product_items.all():
-                order.product_items.add(product_item)
-                product_item.log_entries.add(log_entry)
-                product_item.status = "Unavailable"
-                product_item.save()
-            shopping_cart.product_items.clear()
+            order = serializer.save(user=user)
+            order_items(shopping_cart, order, user)
             # Email for user who submitted order
             subject = f"Tavarat Kiertoon tilaus {order.id}"
             if request.data.get("delivery_required") == "true":
@@ -276,7 +244,7 @@ class OrderListView(ListCreateAPIView):
                     f"Tilausnumeronne on {order.id}.\n\n"
                     "Terveisin Tavarat kiertoon väki!"
                 )
-            send_mail(subject, message, settings.EMAIL_HOST_USER, [user.email])
+            queue_mail(subject, message, settings.EMAIL_HOST_USER, [user.email])
 
             # Email for all OrderEmailRecipients notifying about new order
             message = (
@@ -288,7 +256,7 @@ class OrderListView(ListCreateAPIView):
                 recipient.email for recipient in OrderEmailRecipient.objects.all()
             ]
             recipients.append(settings.DEFAULT_EMAIL)
-            send_mail(subject, message, settings.EMAIL_HOST_USER, recipients)
+            queue_mail(subject, message, settings.EMAIL_HOST_USER, recipients)
             serializer = OrderSerializer(order)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -302,7 +270,7 @@ class OrderListView(ListCreateAPIView):
     patch=extend_schema(exclude=True),
 )
 class OrderDetailView(RetrieveUpdateDestroyAPIView):
-    queryset = Order.objects.all()
+    queryset = Order.objects.prefetch_related(ORDER_ITEMS_PREFETCH)
     serializer_class = OrderDetailSerializer
     authentication_classes = [
         SessionAuthentication,
@@ -319,6 +287,7 @@ class OrderDetailView(RetrieveUpdateDestroyAPIView):
         "DELETE": ["admin_group", "user_group"],
     }
 
+    @transaction.atomic
     def put(self, request, *args, **kwargs):
         partial = kwargs.pop("partial", False)
         instance = self.get_object()
@@ -327,40 +296,10 @@ class OrderDetailView(RetrieveUpdateDestroyAPIView):
         serializer.is_valid(raise_exception=True)
         serializer.save()
 
-        remove = 0
-        add = 0
-        for product_item in instance.product_items.values("id"):
-            if product_item["id"] not in request.data["product_items"]:
-                if remove == 0:
-                    remove = 1
-                    log_remove = ProductItemLogEntry.objects.create(
-                        action=ProductItemLogEntry.ActionChoices.ORDER_REMOVE, user=user
-                    )
-                product_item_object = ProductItem.objects.get(id=product_item["id"])
-                product_item_object.available = True
-                product_item_object.status = "Available"
-                product_item_object.save()
-                instance.product_items.remove(product_item["id"])
-                product_item_object.log_entries.add(log_remove)
-        for product_item in request.data["product_items"]:
-            if product_item not in instance.product_items.values_list("id", flat=True):
-                product_item_object = ProductItem.objects.get(id=product_item)
-                if product_item_object.available == True:
-                    if add == 0:
-                        add = 1
-                        log_add = ProductItemLogEntry.objects.create(
-                            action=ProductItemLogEntry.ActionChoices.ORDER_ADD,
-                            user=user,
-                        )
-                    product_item_object.available = False
-                    product_item_object.status = "Unavailable"
-                    product_item_object.save()
-                    instance.product_items.add(product_item)
-                    product_item_object.log_entries.add(log_add)
-        if getattr(instance, "_prefetched_objects_cache", None):
-            # If 'prefetch_related' has been applied to a queryset, we need to
-            # forcibly invalidate the prefetch cache on the instance.
-            instance._prefetched_objects_cache = {}
+        set_order_items(instance, request.data["product_items"], user)
+        # the items changed, prefetch them again for the response
+        instance._prefetched_objects_cache = {}
+        prefetch_related_objects([instance], ORDER_ITEMS_PREFETCH)
         return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
     def destroy(self, request, *args, **kwargs):
@@ -369,15 +308,9 @@ class OrderDetailView(RetrieveUpdateDestroyAPIView):
             return Response(
                 "Cant delete finished orders", status=status.HTTP_403_FORBIDDEN
             )
-        log_entry = ProductItemLogEntry.objects.create(
-            action=ProductItemLogEntry.ActionChoices.ORDER_REMOVE, user=request.user
-        )
-        for product_item in order.product_items.all():
-            product_item.available = True
-            product_item.status = "Available"
-            product_item.log_entries.add(log_entry)
-            product_item.save()
-        order.delete()
+        with transaction.atomic():
+            set_order_items(order, [], request.user)
+            order.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -464,23 +397,11 @@ class OrderStatListView(APIView):
     }
 
     def get(self, request, *args, **kwargs):
-        date_list = Order.objects.distinct("creation_date__year").dates(
-            "creation_date", "year"
-        )
         order_list = {}
-        for years in date_list:
-            orders2 = Order.objects.filter(creation_date__year=years.year).distinct(
-                "creation_date__month"
-            )
-            order_list[years.year] = {}
-            for order in orders2:
-                order_list[years.year][order.creation_date.month] = (
-                    Order.objects.filter(creation_date__year=order.creation_date.year)
-                    .filter(creation_date__month=order.creation_date.month)
-                    .count()
-                )
-                order_list[years.year]["total"] = Order.objects.filter(
-                    creation_date__year=order.creation_date.year
-                ).count()
-        # return Order.objects.distinct("creation_date__year", "creation_date__month")
+        for stat in OrderMonthlyStat.objects.filter(count__gt=0).order_by(
+            "year", "month"
+        ):
+            order_list.setdefault(stat.year, {})[stat.month] = stat.count
+        for months in order_list.values():
+            months["total"] = sum(months.values())
         return Response(order_list)
@@ -1,8 +1,34 @@
 from django.db import models
 
+from tavarat_kiertoon.cache import (
+    model_cache_namespace,
+    track_model_cache,
+    versioned_cache,
+)
+
 
 # Create your models here.
 class Pause(models.Model):
     id = models.BigAutoField(primary_key=True)
     start_date = models.DateField()
     end_date = models.DateField()
+
+
+track_model_cache(Pause)
+
+
+def pause_calendar():
+    """(start_date, end_date) of every Pause, cached until a Pause is saved or
+    deleted"""
+    return versioned_cache(
+        model_cache_namespace(Pause),
+        "calendar",
+        lambda: list(
+            Pause.objects.order_by("start_date").values_list("start_date", "end_date")
+        ),
+    )
+
+
+def is_paused(date):
+    """Whether the shop is on hiatus on date"""
+    return any(start <= date <= end for start, end in pause_calendar())
@@ -1,6 +1,14 @@
 from django.contrib import admin
 
-from .models import Color, Picture, Product, ProductItem, ProductItemLogEntry, Storage
+from .models import (
+    Color,
+    Picture,
+    Product,
+    ProductAvailability,
+    ProductItem,
+    ProductItemLogEntry,
+    Storage,
+)
 
 # Register your models here.
 admin.site.register(Color)
@@ -9,3 +17,4 @@ admin.site.register(Product)
 admin.site.register(Storage)
 admin.site.register(ProductItem)
 admin.site.register(ProductItemLogEntry)
+admin.site.register(ProductAvailability)
@@ -0,0 +1,80 @@
+"""Set-based operations on ProductItems.
+
+Everything here works on many items with a constant number of queries, no matter how
+many items are touched. Every item gets its own ProductItemLogEntry, all of them
+written with one bulk insert.
+Bulk writes don't send signals, so ProductAvailability is refreshed explicitly.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ProductAvailability, ProductItem, ProductItemLogEntry
+
+
+def log_items(item_ids, action, user):
+    """Creates a log entry with action and user for each of item_ids"""
+    return ProductItemLogEntry.objects.bulk_create(
+        [
+            ProductItemLogEntry(product_item_id=item_id, action=action, user=user)
+            for item_id in item_ids
+        ]
+    )
+
+
+def create_product_items(product, amount, user, **item_fields):
+    """Creates amount of identical ProductItems for product with a CREATE log entry.
+    item_fields are passed to every ProductItem, e.g. storage, barcode and shelf_id."""
+    item_fields.setdefault("modified_date", timezone.now())
+    with transaction.atomic():
+        product_items = ProductItem.objects.bulk_create(
+            [ProductItem(product=product, **item_fields) for _ in range(amount)]
+        )
+        log_items(
+            [product_item.id for product_item in product_items],
+            ProductItemLogEntry.ActionChoices.CREATE,
+            user,
+        )
+        ProductAvailability.refresh([product.id])
+    return product_items
+
+
+def select_items(product_items, amount=None, skip_locked=False):
+    """Locks product_items, at most amount of them. With skip_locked, items locked by
+    other transactions are skipped instead of waited for.
+    Returns their ids and ids of their Products"""
+    rows = list(
+        product_items.select_for_update(skip_locked=skip_locked, of=("self",))
+        .order_by("id")
+        .values_list("id", "product")[:amount]
+    )
+    return [item_id for item_id, _ in rows], {product_id for _, product_id in rows}
+
+
+def transition_product_items(product_items, status, user, amount=None):
+    """Moves product_items (at most amount of them) to status with a single UPDATE.
+    Items becoming available come back to circulation and get a fresh modified_date,
+    other transitions are logged as modifications. Returns ids of the moved items."""
+    available = status == ProductItem.ItemStatusChoices.AVAILABLE.value
+    fields = {"status": status, "available": available}
+    if available:
+        fields["modified_date"] = timezone.now()
+        action = ProductItemLogEntry.ActionChoices.CIRCULATION
+    else:
+        action = ProductItemLogEntry.ActionChoices.MODIFY
+    with transaction.atomic():
+        item_ids, product_ids = select_items(product_items, amount)
+        ProductItem.objects.filter(id__in=item_ids).update(**fields)
+        log_items(item_ids, action, user)
+        ProductAvailability.refresh(product_ids)
+    return item_ids
+
+
+def retire_product_items(product_items, amount=None):
+    """Deletes product_items (at most amount of them) with one set based delete.
+    Returns ids of the deleted items."""
+    with transaction.atomic():
+        item_ids, product_ids = select_items(product_items, amount)
+        ProductItem.objects.filter(id__in=item_ids).delete()
+        ProductAvailability.refresh(product_ids)
+    return item_ids
@@ -0,0 +1,60 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from products.models import Product, ProductAvailability
+
+COUNTER_FIELDS = ["available", "in_cart", "unavailable", "total"]
+
+
+class Command(BaseCommand):
+    help = "Rebuilds ProductAvailability counters from ProductItems, or verifies them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report Products with wrong counters, exits with error if any",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        if options["verify"]:
+            wrong = wrong_availabilities()
+            for product_id, stored, counted in wrong:
+                self.stdout.write(
+                    f"Product {product_id}: stored {stored}, counted {counted}"
+                )
+            if wrong:
+                raise CommandError(f"{len(wrong)} products have wrong availability")
+            self.stdout.write("All availability counters are correct.")
+            return
+
+        self.stdout.write("Rebuilding availability counters...")
+        with transaction.atomic():
+            product_ids = list(Product.objects.values_list("id", flat=True))
+            ProductAvailability.refresh(product_ids)
+        self.stdout.write(f"Done. Rebuilt counters of {len(product_ids)} products.")
+
+
+def counter_values(availability):
+    return tuple(getattr(availability, field) for field in COUNTER_FIELDS)
+
+
+def wrong_availabilities():
+    """Compares stored counters to counted ones.
+    Returns list of (product id, stored counters, counted counters)"""
+    counted = ProductAvailability.counts()
+    stored = {
+        availability.product_id: availability
+        for availability in ProductAvailability.objects.all()
+    }
+    wrong = []
+    for product_id in Product.objects.values_list("id", flat=True).order_by("id"):
+        stored_values = counter_values(stored.get(product_id, ProductAvailability()))
+        counted_values = counter_values(counted.get(product_id, ProductAvailability()))
+        if product_id not in stored and any(counted_values):
+            stored_values = None
+        if stored_values != counted_values:
+            wrong.append((product_id, stored_values, counted_values))
+    return wrong
@@ -708,10 +708,7 @@ def create_products_and_product_items(mode):
     colors = Color.objects.all()
     storages = Storage.objects.all()
     pictures = Picture.objects.all()
-    log_entry = ProductItemLogEntry.objects.create(
-        action=ProductItemLogEntry.ActionChoices.CREATE,
-        user=CustomUser.objects.get(username="super"),
-    )
+    seed_user = CustomUser.objects.get(username="super")
     barcode = 1234
 
     if mode == "giga":
@@ -734,7 +731,11 @@ def create_products_and_product_items(mode):
                         storage=storage,
                         barcode=str(barcode),
                     )
-                    product_item.log_entries.add(log_entry)
+                    ProductItemLogEntry.objects.create(
+                        action=ProductItemLogEntry.ActionChoices.CREATE,
+                        user=seed_user,
+                        product_item=product_item,
+                    )
     else:
         for product in products:
             storage = random.choice(storages)
@@ -758,7 +759,11 @@ def create_products_and_product_items(mode):
                     storage=storage,
                     barcode=str(barcode),
                 )
-                product_item.log_entries.add(log_entry)
+                ProductItemLogEntry.objects.create(
+                    action=ProductItemLogEntry.ActionChoices.CREATE,
+                    user=seed_user,
+                    product_item=product_item,
+                )
     queryset = Product.objects.all()
     pictures = Picture.objects.all()
     for query in queryset:
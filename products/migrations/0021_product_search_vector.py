@@ -0,0 +1,67 @@
+# Generated by Django 4.1.4 on 2026-10-17 11:17
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import UnaccentExtension
+from django.db import migrations
+
+CREATE_SEARCH_CONFIGURATION = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'finnish_unaccent') THEN
+        CREATE TEXT SEARCH CONFIGURATION finnish_unaccent (COPY = finnish);
+        ALTER TEXT SEARCH CONFIGURATION finnish_unaccent
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, finnish_stem;
+    END IF;
+END
+$$;
+"""
+
+DROP_SEARCH_CONFIGURATION = "DROP TEXT SEARCH CONFIGURATION IF EXISTS finnish_unaccent;"
+
+CREATE_SEARCH_VECTOR_TRIGGER = """
+CREATE FUNCTION products_product_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('finnish_unaccent', coalesce(NEW.name, '')), 'A')
+        || setweight(to_tsvector('finnish_unaccent', coalesce(NEW.free_description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER products_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON products_product
+    FOR EACH ROW EXECUTE FUNCTION products_product_search_vector_update();
+
+UPDATE products_product SET name = name;
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER IF EXISTS products_product_search_vector_trigger ON products_product;
+DROP FUNCTION IF EXISTS products_product_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0020_alter_productitem_shelf_id"),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        migrations.RunSQL(CREATE_SEARCH_CONFIGURATION, DROP_SEARCH_CONFIGURATION),
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="product_search_vector_idx"
+            ),
+        ),
+        migrations.RunSQL(CREATE_SEARCH_VECTOR_TRIGGER, DROP_SEARCH_VECTOR_TRIGGER),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.1.4 on 2026-10-17 11:20
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+import django.db.models.functions.text
+import products.search
+
+
+# unaccent() is only STABLE, expression indexes need an IMMUTABLE function
+CREATE_IMMUTABLE_UNACCENT = """
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS $$
+    SELECT public.unaccent('public.unaccent', $1)
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+"""
+
+DROP_IMMUTABLE_UNACCENT = "DROP FUNCTION IF EXISTS f_unaccent(text);"
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0021_product_search_vector"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunSQL(CREATE_IMMUTABLE_UNACCENT, DROP_IMMUTABLE_UNACCENT),
+        migrations.AddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    products.search.ImmutableUnaccent(
+                        django.db.models.functions.text.Lower("name")
+                    ),
+                    name="gin_trgm_ops",
+                ),
+                name="product_name_trgm_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.1.4 on 2026-10-17 11:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+POPULATE_AVAILABILITY = """
+INSERT INTO products_productavailability (product_id, available, in_cart, unavailable, total)
+SELECT
+    product_id,
+    COUNT(*) FILTER (WHERE available),
+    COUNT(*) FILTER (WHERE status = 'In cart'),
+    COUNT(*) FILTER (WHERE status = 'Unavailable'),
+    COUNT(*)
+FROM products_productitem
+WHERE product_id IS NOT NULL
+GROUP BY product_id;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0022_product_name_trgm_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductAvailability",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="availability",
+                        serialize=False,
+                        to="products.product",
+                    ),
+                ),
+                ("available", models.PositiveIntegerField(db_index=True, default=0)),
+                ("in_cart", models.PositiveIntegerField(default=0)),
+                ("unavailable", models.PositiveIntegerField(default=0)),
+                ("total", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name_plural": "Product availabilities",
+            },
+        ),
+        migrations.RunSQL(POPULATE_AVAILABILITY, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.1.4 on 2026-10-17 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0023_productavailability"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="productitem",
+            index=models.Index(
+                fields=["modified_date", "id"], name="productitem_modified_idx"
+            ),
+        ),
+    ]
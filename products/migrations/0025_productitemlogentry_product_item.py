@@ -0,0 +1,23 @@
+# Generated by Django 4.1.4 on 2026-10-17 12:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0024_productitem_modified_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productitemlogentry",
+            name="product_item",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="products.productitem",
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.1.4 on 2026-10-17 12:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0025_productitemlogentry_product_item"),
+    ]
+
+    operations = [
+        # one entry per linked item in date order, replacing the shared entries
+        migrations.RunSQL(
+            [
+                """
+                INSERT INTO products_productitemlogentry
+                    (date, user_id, action, product_item_id)
+                SELECT entry.date, entry.user_id, entry.action, link.productitem_id
+                FROM products_productitem_log_entries link
+                JOIN products_productitemlogentry entry
+                    ON entry.id = link.productitemlogentry_id
+                ORDER BY entry.date, entry.id, link.productitem_id
+                """,
+                # the shared entries were split, entries of deleted items are kept
+                """
+                DELETE FROM products_productitemlogentry
+                WHERE product_item_id IS NULL AND id IN (
+                    SELECT productitemlogentry_id FROM products_productitem_log_entries
+                )
+                """,
+                "DELETE FROM products_productitem_log_entries",
+            ],
+            """
+            INSERT INTO products_productitem_log_entries
+                (productitem_id, productitemlogentry_id)
+            SELECT product_item_id, id FROM products_productitemlogentry
+            WHERE product_item_id IS NOT NULL
+            """,
+        ),
+    ]
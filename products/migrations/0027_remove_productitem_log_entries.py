@@ -0,0 +1,49 @@
+# Generated by Django 4.1.4 on 2026-10-17 12:20
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0026_split_productitemlogentries"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="productitem",
+            name="log_entries",
+        ),
+        migrations.AlterField(
+            model_name="productitemlogentry",
+            name="product_item",
+            field=models.ForeignKey(
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="log_entries",
+                to="products.productitem",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productitemlogentry",
+            index=models.Index(
+                fields=["product_item", "date"], name="productitemlogentry_item_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productitemlogentry",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                fields=["date"], name="productitemlogentry_date_brin"
+            ),
+        ),
+        # entries of deleted items can't reference them once the constraint is back
+        migrations.RunSQL(
+            migrations.RunSQL.noop,
+            """
+            UPDATE products_productitemlogentry SET product_item_id = NULL
+            WHERE product_item_id NOT IN (SELECT id FROM products_productitem)
+            """,
+        ),
+    ]
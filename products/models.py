@@ -2,12 +2,23 @@ from os.path import basename, isfile
 from os import remove
 
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.contrib.postgres.indexes import BrinIndex, GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import Count, Q
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from categories.models import Category
+from categories.models import CATEGORY_CACHE, Category
+from tavarat_kiertoon.cache import (
+    bump_cache_version,
+    bump_model_cache_version,
+    track_model_cache,
+)
+
+from .search import unaccented
 
 CustomUser = get_user_model()
 
@@ -54,6 +65,31 @@ class Storage(models.Model):
         return f"Storage: {self.name}({self.id})"
 
 
+class ProductQuerySet(models.QuerySet):
+    """QuerySet for Products used by the catalog views"""
+
+    def with_item_counts(self):
+        """Annotates available_item_count and item_count on every Product.
+        Counts are read from ProductAvailability so they cost one join, not a count
+        over ProductItems, and stay correct even when the queryset is distinct."""
+        return self.annotate(
+            available_item_count=Coalesce("availability__available", 0),
+            item_count=Coalesce("availability__total", 0),
+        )
+
+    def available(self):
+        """Products that have at least one available ProductItem"""
+        return self.filter(availability__available__gt=0)
+
+    def for_catalog(self):
+        """Item counts and the relations ProductSerializer renders for every row"""
+        return (
+            self.with_item_counts()
+            .select_related("category")
+            .prefetch_related("pictures", "colors")
+        )
+
+
 class Product(models.Model):
     """class representing Product with shared attributes"""
 
@@ -66,6 +102,10 @@ class Product(models.Model):
     measurements = models.CharField(max_length=50, default="", blank=True)
     colors = models.ManyToManyField(Color, blank=True)
     weight = models.FloatField(default=0.0)
+    # kept up to date by a database trigger from name and free_description, see products.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
 
     def __str__(self) -> str:
         return f"Product: {self.name}({self.id})"
@@ -78,10 +118,20 @@ class Product(models.Model):
     def color_name(self):
         return self.colors.name
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            GinIndex(
+                OpClass(unaccented("name"), name="gin_trgm_ops"),
+                name="product_name_trgm_idx",
+            ),
+        ]
+
 
 class ProductItemLogEntry(models.Model):
-    """Model representing one log entry connected to ProductItem
-    saving what happened to ProductItem, when it happened and who did it."""
+    """Model representing one log entry of a ProductItem
+    saving what happened to ProductItem, when it happened and who did it.
+    Entries are only appended, one row per item, see products.bulk.log_items."""
 
     class ActionChoices(models.Choices):
         CREATE = "Created"  # Done
@@ -101,6 +151,24 @@ class ProductItemLogEntry(models.Model):
     action = models.CharField(
         max_length=255, choices=ActionChoices.choices, default="Created"
     )
+    # the history outlives the item, entries of retired items keep its id
+    product_item = models.ForeignKey(
+        "ProductItem",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name="log_entries",
+    )
+
+    class Meta:
+        indexes = [
+            # history of an item, see ProductItemLogView
+            models.Index(
+                fields=["product_item", "date"], name="productitemlogentry_item_idx"
+            ),
+            # entries are appended in date order, so a BRIN index stays small
+            BrinIndex(fields=["date"], name="productitemlogentry_date_brin"),
+        ]
 
 
 class ProductItem(models.Model):
@@ -119,7 +187,141 @@ class ProductItem(models.Model):
     storage = models.ForeignKey(Storage, on_delete=models.SET_NULL, null=True)
     shelf_id = models.CharField(max_length=255, default="", null=True, blank=True)
     barcode = models.CharField(max_length=255, default="")
-    log_entries = models.ManyToManyField(ProductItemLogEntry, blank=True)
     status = models.CharField(
         max_length=255, choices=ItemStatusChoices.choices, default="Available"
     )
+
+    # fields ProductAvailability is counted from
+    AVAILABILITY_FIELDS = ("product_id", "status", "available")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the state the item was loaded with, see refresh_product_availability
+        loaded = dict(zip(field_names, values))
+        instance.loaded_availability = {
+            field: loaded[field] for field in cls.AVAILABILITY_FIELDS if field in loaded
+        }
+        return instance
+
+    def availability_state(self):
+        return {field: getattr(self, field) for field in self.AVAILABILITY_FIELDS}
+
+    class Meta:
+        indexes = [
+            # keyset pagination of the storage item list, see tavarat_kiertoon.pagination
+            models.Index(
+                fields=["modified_date", "id"], name="productitem_modified_idx"
+            ),
+        ]
+
+
+class ProductAvailability(models.Model):
+    """Amounts of ProductItems of a Product in each state, so that reads don't have to
+    count ProductItems. Recomputed by refresh() whenever items of the Product change,
+    and can be rebuilt and verified with the availability management command."""
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="availability",
+    )
+    available = models.PositiveIntegerField(default=0, db_index=True)
+    in_cart = models.PositiveIntegerField(default=0)
+    unavailable = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"Availability of {self.product}: {self.available}/{self.total}"
+
+    class Meta:
+        verbose_name_plural = "Product availabilities"
+
+    @staticmethod
+    def counts(product_ids=None):
+        """Counts ProductItems of product_ids (all Products if None) by state,
+        with one aggregate query. Returns dict of product id -> ProductAvailability"""
+        items = ProductItem.objects.exclude(product=None)
+        if product_ids is not None:
+            items = items.filter(product__in=product_ids)
+        rows = (
+            items.order_by()
+            .values("product")
+            .annotate(
+                available_count=Count("id", filter=Q(available=True)),
+                in_cart_count=Count(
+                    "id", filter=Q(status=ProductItem.ItemStatusChoices.IN_CART.value)
+                ),
+                unavailable_count=Count(
+                    "id",
+                    filter=Q(status=ProductItem.ItemStatusChoices.UNAVAILABLE.value),
+                ),
+                total_count=Count("id"),
+            )
+        )
+        return {
+            row["product"]: ProductAvailability(
+                product_id=row["product"],
+                available=row["available_count"],
+                in_cart=row["in_cart_count"],
+                unavailable=row["unavailable_count"],
+                total=row["total_count"],
+            )
+            for row in rows
+        }
+
+    @classmethod
+    def refresh(cls, product_ids):
+        """Recomputes availability of product_ids with one aggregate query and one
+        upsert. Call in the same transaction as the change of the ProductItems."""
+        product_ids = {product_id for product_id in product_ids if product_id}
+        if not product_ids:
+            return
+        with transaction.atomic():
+            # concurrent refreshes of a product wait for each other, so each one counts
+            # after the items changed by the others have been committed
+            list(
+                Product.objects.select_for_update()
+                .filter(id__in=product_ids)
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+            counts = cls.counts(product_ids)
+            cls.objects.bulk_create(
+                [
+                    counts.get(product_id, cls(product_id=product_id))
+                    for product_id in product_ids
+                ],
+                update_conflicts=True,
+                unique_fields=["product"],
+                update_fields=["available", "in_cart", "unavailable", "total"],
+            )
+        bump_cache_version(CATEGORY_CACHE)
+        # items may have changed with bulk writes, which don't send signals
+        bump_model_cache_version(Product, ProductItem, cls)
+
+
+# ProductItems bump their namespace with ProductAvailability.refresh
+track_model_cache(Product)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_category_cache(sender, **kwargs):
+    """Product counts of categories change when a Product changes category"""
+    bump_cache_version(CATEGORY_CACHE)
+
+
+@receiver(post_save, sender=ProductItem)
+def refresh_product_availability(sender, instance, **kwargs):
+    """Refreshes the availability of the product of the item, and of the product it
+    was moved from, when the item is new or its product, status or availability
+    changed. Other edits only invalidate what is cached of ProductItems."""
+    loaded = getattr(instance, "loaded_availability", {})
+    state = instance.availability_state()
+    if loaded == state:
+        bump_model_cache_version(ProductItem)
+    else:
+        ProductAvailability.refresh([instance.product_id, loaded.get("product_id")])
+    instance.loaded_availability = state
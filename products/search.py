@@ -0,0 +1,136 @@
+import re
+from functools import reduce
+from operator import and_, or_
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db.models import Case, CharField, Exists, F, Func, Q, Value, When
+from django.db.models.functions import Lower
+from rest_framework.filters import OrderingFilter
+
+# Text search configuration created in products migration 0021, finnish stemming on
+# unaccented words. Product.search_vector is filled by a trigger using the same config.
+SEARCH_CONFIG = "finnish_unaccent"
+
+
+class ImmutableUnaccent(Func):
+    """f_unaccent() created in products migration 0022. Plain unaccent() is not
+    immutable so it can't be used in the trigram expression indexes."""
+
+    function = "f_unaccent"
+    output_field = CharField()
+
+
+def unaccented(expression):
+    """Lowercased and unaccented expression, same form the trigram indexes are built on"""
+    return ImmutableUnaccent(Lower(expression))
+
+
+def search_words(value):
+    """Splits search string to words, dropping characters that have meaning in tsquery"""
+    return re.findall(r"\w+", value)
+
+
+def prefix_search_query(words, operator):
+    """Builds tsquery where every word matches as a prefix, e.g. 'sohva:* & nahka:*'"""
+    return SearchQuery(
+        f" {operator} ".join(f"{word}:*" for word in words),
+        config=SEARCH_CONFIG,
+        search_type="raw",
+    )
+
+
+def trigram_word_matches(queryset, fields, words):
+    """Aliases unaccented versions of fields to queryset and builds one Q per word
+    matching when any of the fields contains the word or a word similar to it.
+    Returns the aliased queryset, the list of Qs and summed similarity for ranking.
+    """
+    aliases = {f"{field.replace('__', '_')}_unaccented": field for field in fields}
+    queryset = queryset.alias(
+        **{alias: unaccented(field) for alias, field in aliases.items()}
+    )
+    word_matches = []
+    similarity = None
+    for word in words:
+        word_value = unaccented(Value(word))
+        word_match = Q()
+        for alias in aliases:
+            word_match |= Q(**{f"{alias}__contains": word_value}) | Q(
+                **{f"{alias}__trigram_word_similar": word_value}
+            )
+            word_similarity = TrigramWordSimilarity(word_value, alias)
+            similarity = (
+                word_similarity if similarity is None else similarity + word_similarity
+            )
+        word_matches.append(word_match)
+    return queryset, word_matches, similarity
+
+
+def trigram_search(queryset, value, fields):
+    """Typo tolerant search over fields using the pg_trgm indexes, in one query.
+
+    Returns rows where every word matches. If none of the queryset matches all of them,
+    returns rows matching any of the words instead. Rows get annotated with
+    search_operator ("and"/"or") and search_rank like in search_products.
+    """
+    words = search_words(value)
+    if not words:
+        return queryset.none()
+    queryset, word_matches, similarity = trigram_word_matches(queryset, fields, words)
+    and_match = reduce(and_, word_matches)
+    or_match = reduce(or_, word_matches)
+    return queryset.annotate(
+        search_operator=Case(
+            When(Exists(queryset.filter(and_match)), then=Value("and")),
+            default=Value("or"),
+        ),
+        search_rank=similarity,
+    ).filter(and_match | Q(or_match, search_operator="or"))
+
+
+def search_products(queryset, value):
+    """Full text search for Products in one query.
+
+    Returns Products matching all the words. If none of the queryset matches all of
+    them, returns Products matching any of the words instead, and if none matches any,
+    Products with a name similar to any of the words. Every row gets annotated with
+    search_operator ("and"/"or"/"fuzzy") telling which one was used and search_rank for
+    ordering the results.
+    """
+    words = search_words(value)
+    if not words:
+        return queryset.none()
+    and_match = Q(search_vector=prefix_search_query(words, "&"))
+    or_query = prefix_search_query(words, "|")
+    or_match = Q(search_vector=or_query)
+    queryset, word_matches, similarity = trigram_word_matches(queryset, ["name"], words)
+    fuzzy_match = reduce(or_, word_matches)
+
+    # not correlated to the outer query so postgres evaluates them only once
+    return queryset.annotate(
+        search_operator=Case(
+            When(Exists(queryset.filter(and_match)), then=Value("and")),
+            When(Exists(queryset.filter(or_match)), then=Value("or")),
+            default=Value("fuzzy"),
+        ),
+        search_rank=SearchRank(F("search_vector"), or_query) + similarity,
+    ).filter(
+        and_match
+        | Q(or_match, search_operator="or")
+        | Q(fuzzy_match, search_operator="fuzzy")
+    )
+
+
+class SearchRankOrderingFilter(OrderingFilter):
+    """OrderingFilter that orders search results by relevance when no ordering is asked"""
+
+    def get_ordering(self, request, queryset, view):
+        if (
+            self.ordering_param not in request.query_params
+            and "search_rank" in queryset.query.annotations
+        ):
+            return ["-search_rank", *self.get_default_ordering(view)]
+        return super().get_ordering(request, queryset, view)
@@ -1,5 +1,7 @@
+from django.db import transaction
 from rest_framework import serializers
 
+from .bulk import create_product_items
 from .models import Color, Picture, Product, ProductItem, ProductItemLogEntry, Storage
 from categories.models import Category
 
@@ -45,7 +47,24 @@ class ColorSerializer(serializers.ModelSerializer):
         read_only_fields = ["default"]
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductItemCountMixin:
+    """
+    amount and total_amount for Product serializers. Reads the counts annotated by
+    Product.objects.with_item_counts() and only queries when they are missing.
+    """
+
+    def get_amount(self, obj) -> int:
+        if hasattr(obj, "available_item_count"):
+            return obj.available_item_count
+        return ProductItem.objects.filter(product=obj.id, available=True).count()
+
+    def get_total_amount(self, obj) -> int:
+        if hasattr(obj, "item_count"):
+            return obj.item_count
+        return ProductItem.objects.filter(product=obj.id).count()
+
+
+class ProductSerializer(ProductItemCountMixin, serializers.ModelSerializer):
     pictures = PictureSerializer(many=True, read_only=True)
     amount = serializers.SerializerMethodField()
     total_amount = serializers.SerializerMethodField()
@@ -54,23 +73,13 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = "__all__"
-
-    def get_amount(self, obj) -> int:
-        product_amount = ProductItem.objects.filter(
-            product=obj.id, available=True
-        ).count()
-        return product_amount
+        exclude = ["search_vector"]
 
     def get_category_name(self, obj) -> str:
         return obj.category_name
 
-    def get_total_amount(self, obj) -> int:
-        total_product_amount = ProductItem.objects.filter(product=obj.id).count()
-        return total_product_amount
-
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(ProductItemCountMixin, serializers.ModelSerializer):
     product_items = serializers.SerializerMethodField()
     pictures = PictureSerializer(many=True, read_only=True)
     amount = serializers.SerializerMethodField()
@@ -78,17 +87,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = "__all__"
-
-    def get_amount(self, obj) -> int:
-        product_amount = ProductItem.objects.filter(
-            product=obj.id, available=True
-        ).count()
-        return product_amount
-
-    def get_total_amount(self, obj) -> int:
-        total_product_amount = ProductItem.objects.filter(product=obj.id).count()
-        return total_product_amount
+        exclude = ["search_vector"]
 
     def get_product_items(self, obj):
         qs = obj.productitem_set.all()
@@ -99,7 +98,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
 class ProductResponseSerializer(ProductSerializer):
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ["search_vector"]
         extra_kwargs = {
             "price": {"required": True},
             "free_description": {"required": True},
@@ -113,7 +112,7 @@ class ProductResponseSerializer(ProductSerializer):
 class ProductItemCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductItem
-        exclude = ["modified_date", "product", "log_entries"]
+        exclude = ["modified_date", "product"]
         extra_kwargs = {
             "available": {"required": True},
             "barcode": {"required": True},
@@ -130,7 +129,7 @@ class ProductCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        exclude = ["pictures", "colors"]
+        exclude = ["pictures", "colors", "search_vector"]
 
     def create(self, validated_data):
         amount = validated_data.pop("amount")
@@ -144,15 +143,11 @@ class ProductCreateSerializer(serializers.ModelSerializer):
         product_item_serializer = ProductItemCreateSerializer(data=product_item)
         product_item_serializer.is_valid(raise_exception=True)
 
-        product = Product.objects.create(**validated_data)
-        log_entry = ProductItemLogEntry.objects.create(
-            action=ProductItemLogEntry.ActionChoices.CREATE, user=self.context
-        )
-        for _ in range(amount):
-            pi = ProductItem.objects.create(
-                product=product, **product_item_serializer.validated_data
+        with transaction.atomic():
+            product = Product.objects.create(**validated_data)
+            create_product_items(
+                product, amount, self.context, **product_item_serializer.validated_data
             )
-            pi.log_entries.add(log_entry)
         return product
 
 
@@ -166,7 +161,7 @@ class ProductCreateRequestSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ["search_vector"]
         extra_kwargs = {
             "name": {"required": True},
             "amount": {"required": True},
@@ -188,7 +183,7 @@ class ProductUpdateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        exclude = ["pictures"]
+        exclude = ["pictures", "search_vector"]
         extra_kwargs = {
             "name": {"required": True},
             "category": {"required": True},
@@ -198,7 +193,7 @@ class ProductUpdateSerializer(serializers.ModelSerializer):
 class ProductUpdateResponseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ["search_vector"]
         extra_kwargs = {
             "name": {"required": True},
             "category": {"required": True},
@@ -216,6 +211,17 @@ class ProductStorageTransferSerializer(serializers.Serializer):
     product_items = serializers.ListField(child=serializers.IntegerField())
 
 
+class ProductItemBulkStatusSerializer(serializers.Serializer):
+    product_items = serializers.ListField(child=serializers.IntegerField())
+    status = serializers.ChoiceField(
+        choices=[
+            ProductItem.ItemStatusChoices.AVAILABLE.value,
+            ProductItem.ItemStatusChoices.UNAVAILABLE.value,
+            ProductItem.ItemStatusChoices.RETIRED.value,
+        ]
+    )
+
+
 class ShoppingCartAvailableAmountListSerializer(serializers.Serializer):
     id = serializers.IntegerField()
     amount = serializers.IntegerField()
@@ -241,7 +247,6 @@ class ProductItemSerializer(serializers.ModelSerializer):
 
     product = ProductSerializer(read_only=True)
     storage = StorageSerializer(read_only=True)
-    log_entries = ProductItemLogEntrySerializer(read_only=True, many=True)
 
     class Meta:
         model = ProductItem
@@ -254,7 +259,6 @@ class ProductItemStorageSerializer(serializers.ModelSerializer):
     """
 
     storage = StorageSerializer(read_only=True)
-    log_entries = ProductItemLogEntryResponseSerializer(read_only=True, many=True)
 
     class Meta:
         model = ProductItem
@@ -275,7 +279,7 @@ class ProductDetailResponseSerializer(ProductSerializer):
 
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ["search_vector"]
         extra_kwargs = {
             "price": {"required": True},
             "free_description": {"required": True},
@@ -289,7 +293,7 @@ class ProductDetailResponseSerializer(ProductSerializer):
         return obj.productitem_set.all()
 
 
-class ProductStorageSerializer(serializers.ModelSerializer):
+class ProductStorageSerializer(ProductItemCountMixin, serializers.ModelSerializer):
     product_items = serializers.SerializerMethodField()
     category_name = serializers.ReadOnlyField()
     amount = serializers.SerializerMethodField()
@@ -297,23 +301,13 @@ class ProductStorageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ["search_vector"]
 
     def get_product_items(self, obj):
         qs = obj.productitem_set.all()
         serializer = ProductItemStorageSerializer(qs, read_only=True, many=True)
         return serializer.data
 
-    def get_amount(self, obj) -> int:
-        product_amount = ProductItem.objects.filter(
-            product=obj.id, available=True
-        ).count()
-        return product_amount
-
-    def get_total_amount(self, obj) -> int:
-        total_product_amount = ProductItem.objects.filter(product=obj.id).count()
-        return total_product_amount
-
 
 class ProductStorageResponseSerializer(serializers.ModelSerializer):
     product_items = ProductItemStorageSerializer(
@@ -323,7 +317,7 @@ class ProductStorageResponseSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ["search_vector"]
         extra_kwargs = {
             "price": {"required": True},
             "free_description": {"required": True},
@@ -341,7 +335,6 @@ class ProductStorageResponseSerializer(serializers.ModelSerializer):
 class ProductItemResponseSerializer(serializers.ModelSerializer):
     product = ProductResponseSerializer(read_only=True)
     storage = StorageResponseSerializer(read_only=True)
-    log_entries = ProductItemLogEntryResponseSerializer(read_only=True, many=True)
 
     class Meta:
         model = ProductItem
@@ -351,7 +344,6 @@ class ProductItemResponseSerializer(serializers.ModelSerializer):
             "modified_date": {"required": True},
             "shelf_id": {"required": True},
             "barcode": {"required": True},
-            "log_entries": {"required": True},
         }
 
 
@@ -365,7 +357,7 @@ class ProductItemUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductItem
         fields = "__all__"
-        read_only_fields = ["product", "modified_date", "log_entries"]
+        read_only_fields = ["product", "modified_date"]
 
 
 class ProductItemDetailResponseSerializer(serializers.ModelSerializer):
@@ -379,7 +371,6 @@ class ProductItemDetailResponseSerializer(serializers.ModelSerializer):
             "barcode": {"required": True},
             "product": {"required": True},
             "storage": {"required": True},
-            "log_entries": {"required": True},
         }
 
 
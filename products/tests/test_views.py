@@ -1,17 +1,40 @@
 import shutil
 import urllib.request
+from io import StringIO
 from os.path import basename
 
 from django.contrib.auth.models import Group
+from django.core.cache import cache
 from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.test import TestCase, override_settings
 from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
 
-from categories.models import Category
+from categories.models import CATEGORY_CACHE, Category
 from orders.models import ShoppingCart
-from products.models import Color, Picture, Product, ProductItem, Storage
-from products.views import available_products_filter, non_available_products_in_cart
+from products.bulk import log_items, retire_product_items
+from products.models import (
+    Color,
+    Picture,
+    Product,
+    ProductAvailability,
+    ProductItem,
+    ProductItemLogEntry,
+    Storage,
+)
+from products.views import (
+    ProductItemDetailView,
+    ProductItemListPagination,
+    available_products_filter,
+    non_available_products_in_cart,
+)
+from tavarat_kiertoon.cache import cache_version
 from users.models import CustomUser
 
 TEST_DIR = "testmedia/"
@@ -167,6 +190,10 @@ class TestProducts(TestCase):
             cls.test_group_bicycle = Group.objects.create(name="bicycle_group")
             cls.test_group_bicycle.user_set.add(cls.test_user2)
 
+    def setUp(self):
+        # counts cached by other tests would outlive their rolled back data
+        cache.clear()
+
     def login_test_user(self):
         url = "/users/login/"
         data = {
@@ -229,6 +256,52 @@ class TestProducts(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(ProductItem.objects.all().count(), 26)
 
+    def test_get_productitems_cursor(self):
+        self.login_test_user()
+        # half of the items share modified_date, the cursor tie-breaks them by id
+        ProductItem.objects.filter(product=self.test_product1).update(
+            modified_date=timezone.now()
+        )
+        expected_ids = list(
+            ProductItem.objects.order_by("-modified_date", "-id").values_list(
+                "id", flat=True
+            )
+        )
+        url = "/products/items/?cursor=&page_size=7"
+        ids = []
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.json())
+            pages.append(url)
+            ids += [item["id"] for item in response.json()["results"]]
+            url = response.json()["next"]
+        self.assertEqual(ids, expected_ids)
+        self.assertEqual(len(pages), 4)
+
+        # previous link of the last page gives back the third page
+        response = self.client.get(pages[-1])
+        response = self.client.get(response.json()["previous"])
+        self.assertEqual(
+            [item["id"] for item in response.json()["results"]], expected_ids[14:21]
+        )
+        self.assertIsNotNone(response.json()["previous"])
+
+        response = self.client.get("/products/items/?cursor=notacursor")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get("/products/items/?page_size=1000")
+        self.assertEqual(len(response.json()["results"]), 26)
+        self.assertEqual(response.json()["count"], 26)
+
+        # only cursor pages are capped, page number pages aren't limited
+        pagination = ProductItemListPagination()
+        request = Request(APIRequestFactory().get("/", {"page_size": 1000}))
+        self.assertEqual(pagination.get_page_size(request), 1000)
+        self.assertEqual(
+            pagination.get_cursor_page_size(request), pagination.max_cursor_page_size
+        )
+
     def test_get_products_search(self):
         url = f"/products/?search={self.test_product.name}"
         response = self.client.get(url)
@@ -241,15 +314,100 @@ class TestProducts(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()["count"], 3)
 
+    def test_get_products_search_and_or_fallback(self):
+        url = "/products/?search=nahka sohva"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["filter"], "and")
+        self.assertEqual(response.json()["count"], 3)
+
+        url = "/products/?search=nahkasohva pöytä"
+        response = self.client.get(url)
+        self.assertEqual(response.json()["filter"], "or")
+        self.assertEqual(response.json()["count"], 1)
+
+        url = "/products/?search=tuoli pöytä"
+        response = self.client.get(url)
+        self.assertEqual(response.json()["filter"], "or")
+        self.assertEqual(response.json()["count"], 0)
+
+    def test_get_products_search_ranking_and_unaccent(self):
+        url = "/products/?search=nahka"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["id"], self.test_product.id)
+
+        url = "/products/?search=nahka&ordering=id"
+        response = self.client.get(url)
+        self.assertEqual(response.json()["results"][0]["id"], self.test_product.id)
+        self.assertEqual(response.json()["results"][-1]["id"], self.test_product2.id)
+
+        url = "/products/?search=tama"
+        response = self.client.get(url)
+        self.assertEqual(response.json()["count"], 3)
+
+    def test_get_products_search_typo(self):
+        url = "/products/?search=nahkasofva"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["filter"], "fuzzy")
+        self.assertEqual(response.json()["results"][0]["id"], self.test_product.id)
+
     def test_get_products_paginate(self):
         url = "/products/?page=1"
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
 
+    def test_get_products_paginate_count(self):
+        url = "/products/?page_size=2&page=1"
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get(url)
+        self.assertEqual(response.json()["count"], available_products_filter().count())
+        self.assertTrue(any("COUNT(" in query["sql"] for query in first))
+
+        # the exact count is cached for the same filters
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(url)
+        self.assertEqual(response.json()["count"], available_products_filter().count())
+        self.assertFalse(any("COUNT(" in query["sql"] for query in second))
+
+        # big querysets report planner estimate, pages past it are empty instead of 404
+        cache.clear()
+        with override_settings(PAGINATION_COUNT_ESTIMATE_THRESHOLD=1):
+            with CaptureQueriesContext(connection) as estimated:
+                response = self.client.get("/products/?page_size=2&page=1000")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], [])
+        self.assertTrue(any("EXPLAIN" in query["sql"] for query in estimated))
+        self.assertFalse(any("COUNT(" in query["sql"] for query in estimated))
+
+    def test_get_products_item_counts(self):
+        url = "/products/?page_size=1"
+        with CaptureQueriesContext(connection) as single_page:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        url = "/products/?page_size=30"
+        cache.clear()
+        with CaptureQueriesContext(connection) as full_page:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(single_page), len(full_page))
+
+        amounts = {
+            product["id"]: (product["amount"], product["total_amount"])
+            for product in response.json()["results"]
+        }
+        self.assertEqual(amounts[self.test_product.id], (10, 10))
+        self.assertEqual(amounts[self.test_product1.id], (10, 15))
+        self.assertEqual(amounts[self.test_product2.id], (1, 1))
+
     def test_get_product_by_id(self):
         url = f"/products/{self.test_product.id}/"
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["amount"], 10)
+        self.assertEqual(response.json()["total_amount"], 10)
 
     def test_get_category_products(self):
         url = f"/categories/tree/"
@@ -423,6 +581,26 @@ class TestProducts(TestCase):
             item_count + 5,
         )
 
+    def test_add_items_existing_product_bulk(self):
+        self.login_test_user()
+        url = f"/products/{self.test_product1.id}/add/"
+        with CaptureQueriesContext(connection) as few_items:
+            self.client.post(url, {"amount": 1}, content_type="application/json")
+        with CaptureQueriesContext(connection) as many_items:
+            response = self.client.post(
+                url, {"amount": 500}, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(few_items), len(many_items))
+
+        new_items = ProductItem.objects.filter(product=self.test_product1.id).order_by(
+            "-id"
+        )[:500]
+        self.assertTrue(all(item.log_entries.count() == 1 for item in new_items))
+        self.assertEqual(
+            ProductItem.objects.filter(product=self.test_product1.id).count(), 516
+        )
+
     def test_return_items_existing_product(self):
         item_count = ProductItem.objects.filter(
             product=self.test_product1.id, available=True, status="Available"
@@ -439,6 +617,167 @@ class TestProducts(TestCase):
             item_count + 5,
         )
 
+    def test_retire_items_existing_product(self):
+        item_ids = list(
+            ProductItem.objects.filter(product=self.test_product.id).values_list(
+                "id", flat=True
+            )
+        )
+        item_count = len(item_ids)
+        log_items(item_ids, ProductItemLogEntry.ActionChoices.CREATE, self.test_user1)
+        entry_count = ProductItemLogEntry.objects.filter(
+            product_item__in=item_ids
+        ).count()
+        self.login_test_user()
+        url = f"/products/{self.test_product.id}/retire/"
+        data = {"amount": 4}
+        response = self.client.post(url, data, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            ProductItem.objects.filter(product=self.test_product.id).count(),
+            item_count - 4,
+        )
+        # the history of the retired items is kept
+        self.assertEqual(
+            ProductItemLogEntry.objects.filter(product_item__in=item_ids).count(),
+            entry_count,
+        )
+
+    def test_bulk_status_product_items(self):
+        self.login_test_user()
+        url = "/products/items/bulk_status/"
+        item_ids = list(
+            ProductItem.objects.filter(product=self.test_product.id).values_list(
+                "id", flat=True
+            )
+        )
+        data = {"product_items": item_ids, "status": "Unavailable"}
+        response = self.client.put(url, data, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.json()["product_items"]), sorted(item_ids))
+        self.assertFalse(
+            ProductItem.objects.filter(id__in=item_ids, available=True).exists()
+        )
+
+        ProductItem.objects.filter(id=item_ids[0]).update(status="In cart")
+        data = {"product_items": item_ids, "status": "Available"}
+        response = self.client.put(url, data, content_type="application/json")
+        self.assertEqual(len(response.json()["product_items"]), len(item_ids) - 1)
+        self.assertEqual(
+            ProductItem.objects.filter(
+                id__in=item_ids, available=True, status="Available"
+            ).count(),
+            len(item_ids) - 1,
+        )
+        self.assertEqual(
+            ProductItem.objects.get(id=item_ids[1])
+            .log_entries.values_list("action", flat=True)
+            .last(),
+            "Came back to circulation",
+        )
+
+        data = {"product_items": item_ids, "status": "In cart"}
+        response = self.client.put(url, data, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_product_item_log(self):
+        self.login_test_user()
+        item = ProductItem.objects.filter(product=self.test_product.id).first()
+        for status in ("Unavailable", "Available", "Unavailable"):
+            self.client.put(
+                "/products/items/bulk_status/",
+                {"product_items": [item.id], "status": status},
+                content_type="application/json",
+            )
+        entry_ids = list(
+            item.log_entries.order_by("-date", "-id").values_list("id", flat=True)
+        )
+
+        url = f"/products/items/{item.id}/log/"
+        response = self.client.get(url, {"page_size": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], len(entry_ids))
+        self.assertEqual(
+            [entry["id"] for entry in response.data["results"]], entry_ids[:2]
+        )
+        self.assertEqual(
+            {entry["product_item"] for entry in response.data["results"]}, {item.id}
+        )
+
+        response = self.client.get(url, {"cursor": "", "page_size": 2})
+        self.assertEqual(
+            [entry["id"] for entry in response.data["results"]], entry_ids[:2]
+        )
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            [entry["id"] for entry in response.data["results"]], entry_ids[2:4]
+        )
+
+        response = self.client.get("/products/items/0/log/")
+        self.assertEqual(response.status_code, 404)
+
+        # the log of a retired item stays reachable
+        retire_product_items(ProductItem.objects.filter(id=item.id))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], len(entry_ids))
+
+    def test_product_availability_counters(self):
+        availability = ProductAvailability.objects.get(product=self.test_product2)
+        self.assertEqual((availability.available, availability.total), (1, 1))
+
+        self.client.login(username="kahvimake@turku.fi", password="asd123")
+        self.client.put(
+            "/shopping_cart/",
+            {"product": self.test_product2.id, "amount": 1},
+            content_type="application/json",
+        )
+        availability.refresh_from_db()
+        self.assertEqual((availability.available, availability.in_cart), (0, 1))
+
+        availability = ProductAvailability.objects.get(product=self.test_product1)
+        self.assertEqual(
+            (availability.available, availability.unavailable, availability.total),
+            (10, 5, 15),
+        )
+        call_command("availability", "--verify", stdout=StringIO())
+
+        ProductAvailability.objects.filter(product=self.test_product1).update(
+            available=0
+        )
+        with self.assertRaises(CommandError):
+            call_command("availability", "--verify", stdout=StringIO())
+        call_command("availability", stdout=StringIO())
+        call_command("availability", "--verify", stdout=StringIO())
+
+        # editing other fields of an item keeps the cached product listings
+        item = ProductItem.objects.filter(
+            product=self.test_product1, available=True
+        ).first()
+        version = cache_version(CATEGORY_CACHE)
+        item.barcode = "1234"
+        item.save()
+        self.assertEqual(cache_version(CATEGORY_CACHE), version)
+
+        # moving an item refreshes both products, deleting refreshes its product
+        item.product = self.test_product2
+        item.save()
+        self.assertNotEqual(cache_version(CATEGORY_CACHE), version)
+        totals = dict(ProductAvailability.objects.values_list("product", "total"))
+        self.assertEqual(totals[self.test_product1.id], 14)
+        self.assertEqual(totals[self.test_product2.id], 2)
+        ProductItemDetailView().perform_destroy(item)
+        self.assertEqual(
+            ProductAvailability.objects.get(product=self.test_product2).total, 1
+        )
+        unavailable_ids = ProductItem.objects.filter(
+            product=self.test_product1, available=False
+        ).values("id")[:2]
+        retire_product_items(ProductItem.objects.filter(id__in=unavailable_ids))
+        availability = ProductAvailability.objects.get(product=self.test_product1)
+        self.assertEqual((availability.unavailable, availability.total), (3, 12))
+        call_command("availability", "--verify", stdout=StringIO())
+
     def test_shoppingcart_available_amount_list(self):
         url = "/shopping_cart/available_amount/"
         self.client.login(username="kahvimake@turku.fi", password="asd123")
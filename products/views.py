@@ -1,17 +1,16 @@
-from functools import reduce
-from operator import and_, or_
-
 from io import BytesIO
 from PIL import Image, ImageOps
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.files.base import ContentFile
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
 from django_filters import rest_framework as filters
 from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
 from drf_spectacular.types import OpenApiTypes
 from rest_framework import generics, status
 from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.exceptions import NotFound
 from rest_framework.filters import OrderingFilter
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
@@ -21,12 +20,27 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from categories.models import Category
 from orders.models import ShoppingCart
-from orders.serializers import ShoppingCartDetailSerializer
-from users.custom_functions import check_product_watch
+from tavarat_kiertoon.pagination import OptionalCursorPagination
 from users.permissions import HasGroupPermission, is_in_group
 from users.views import CustomJWTAuthentication
+from users.watch import check_product_watch
 
-from .models import Color, Picture, Product, ProductItem, ProductItemLogEntry, Storage
+from .bulk import (
+    create_product_items,
+    log_items,
+    retire_product_items,
+    transition_product_items,
+)
+from .models import (
+    Color,
+    Picture,
+    Product,
+    ProductAvailability,
+    ProductItem,
+    ProductItemLogEntry,
+    Storage,
+)
+from .search import SearchRankOrderingFilter, search_products
 from .serializers import (
     ColorSerializer,
     PictureCreateSerializer,
@@ -35,7 +49,10 @@ from .serializers import (
     ProductCreateSerializer,
     ProductDetailResponseSerializer,
     ProductDetailSerializer,
+    ProductItemBulkStatusSerializer,
     ProductItemDetailResponseSerializer,
+    ProductItemLogEntryResponseSerializer,
+    ProductItemLogEntrySerializer,
     ProductItemResponseSerializer,
     ProductItemSerializer,
     ProductItemUpdateSerializer,
@@ -96,27 +113,20 @@ def color_check_create(instance):
 
 
 def available_products_filter():
-    return Product.objects.filter(
-        productitem__in=ProductItem.objects.filter(available=True)
-    ).distinct()
+    return Product.objects.available()
 
 
 def non_available_products_in_cart(user_id):
-    return (
-        Product.objects.filter(
-            productitem__in=ProductItem.objects.filter(
-                shoppingcart=ShoppingCart.objects.get(user=user_id)
-            )
-        )
-        .exclude(productitem__in=ProductItem.objects.filter(available=True))
-        .distinct()
-    )
+    return Product.objects.filter(
+        id__in=ProductItem.objects.filter(
+            shoppingcart=ShoppingCart.objects.get(user=user_id)
+        ).values("product")
+    ).exclude(availability__available__gt=0)
 
 
 # Create your views here.
-class ProductListPagination(PageNumberPagination):
+class ProductListPagination(OptionalCursorPagination):
     page_size = 30
-    page_size_query_param = "page_size"
 
 
 class CategoryProductListPagination(PageNumberPagination):
@@ -134,30 +144,9 @@ class ProductFilter(filters.FilterSet):
         fields = ["search", "category", "colors"]
 
     def search_filter(self, queryset, value, *args, **kwargs):
-        word_list = args[0].split(" ")
-
-        def filter_function(operator):
-            """Function that takes operator like 'and_' or 'or_' and returns reduced queryset
-            of products that have word of wordlist contained in name or free_description
-            """
-            qs = queryset.filter(
-                reduce(
-                    operator,
-                    (
-                        Q(name__icontains=word) | Q(free_description__icontains=word)
-                        for word in word_list
-                    ),
-                )
-            )
-            qs._hints["filter"] = operator.__name__.strip("_")
-            return qs
-
-        """Creates queryset with and_ and if its empty it creates new queryset with or_"""
-        and_queryset = filter_function(and_)
-        if and_queryset.count():
-            return and_queryset
-        or_queryset = filter_function(or_)
-        return or_queryset
+        """Products that have all words of search in name or free_description,
+        or any of the words if none has them all. See products.search"""
+        return search_products(queryset, args[0])
 
 
 @extend_schema_view(
@@ -186,9 +175,9 @@ class ProductListView(generics.ListCreateAPIView):
     }
 
     pagination_class = ProductListPagination
-    filter_backends = [filters.DjangoFilterBackend, OrderingFilter]
+    filter_backends = [filters.DjangoFilterBackend, SearchRankOrderingFilter]
     search_fields = ["name", "free_description"]
-    ordering_fields = ["id"]
+    ordering_fields = ["id", "available_item_count"]
     ordering = ["-id"]
     filterset_class = ProductFilter
 
@@ -203,7 +192,7 @@ class ProductListView(generics.ListCreateAPIView):
             )
             available_products = available_products | non_available_cart_products
 
-        return available_products
+        return available_products.for_catalog()
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
@@ -211,8 +200,9 @@ class ProductListView(generics.ListCreateAPIView):
         if page is not None:
             serializer = self.get_serializer(page, many=True)
             response = self.get_paginated_response(serializer.data)
-            if queryset._hints:
-                response.data["filter"] = queryset._hints["filter"]
+            if request.query_params.get("search", "").strip():
+                # every row carries the same and/or hint, empty result means or was tried
+                response.data["filter"] = page[0].search_operator if page else "or"
             return Response(response.data)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
@@ -274,30 +264,9 @@ class ProductStorageFilter(filters.FilterSet):
         return qs
 
     def search_filter(self, queryset, value, *args, **kwargs):
-        word_list = args[0].split(" ")
-
-        def filter_function(operator):
-            """Function that takes operator like 'and_' or 'or_' and returns reduced queryset
-            of products that have word of wordlist contained in name or free_description
-            """
-            qs = queryset.filter(
-                reduce(
-                    operator,
-                    (
-                        Q(name__icontains=word) | Q(free_description__icontains=word)
-                        for word in word_list
-                    ),
-                )
-            )
-            qs._hints["filter"] = operator.__name__.strip("_")
-            return qs
-
-        """Creates queryset with and_ and if its empty it creates new queryset with or_"""
-        and_queryset = filter_function(and_)
-        if and_queryset.count():
-            return and_queryset
-        or_queryset = filter_function(or_)
-        return or_queryset
+        """Products that have all words of search in name or free_description,
+        or any of the words if none has them all. See products.search"""
+        return search_products(queryset, args[0])
 
     def storage_filter(self, queryset, value, *args, **kwargs):
         storage = args[0]
@@ -326,7 +295,7 @@ class ProductStorageListView(generics.ListAPIView):
         CustomJWTAuthentication,
     ]
     pagination_class = ProductListPagination
-    filter_backends = [filters.DjangoFilterBackend, OrderingFilter]
+    filter_backends = [filters.DjangoFilterBackend, SearchRankOrderingFilter]
     ordering_fields = ["id"]
     ordering = ["-id"]
     filterset_class = ProductStorageFilter
@@ -337,12 +306,18 @@ class ProductStorageListView(generics.ListAPIView):
             if is_in_group(self.request.user, "storage_group") or is_in_group(
                 self.request.user, "admin_group"
             ):
-                return Product.objects.exclude(productitem__isnull=True).distinct()
+                return self.with_storage_data(
+                    Product.objects.exclude(productitem__isnull=True).distinct()
+                )
 
         # Hides Products that are not available
         available_products = available_products_filter()
 
-        return available_products
+        return self.with_storage_data(available_products)
+
+    @staticmethod
+    def with_storage_data(queryset):
+        return queryset.with_item_counts().prefetch_related("productitem_set__storage")
 
 
 @extend_schema_view(
@@ -360,7 +335,7 @@ class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     """Field new_pictures must be sent as new_pictures[] in PUT"""
 
-    queryset = Product.objects.all()
+    queryset = Product.objects.with_item_counts()
     serializer_class = ProductDetailSerializer
 
     authentication_classes = [
@@ -431,41 +406,34 @@ class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
                     prev_data.storage.id != int(request.data["storage"])
                     and log_created == False
                 ):
-                    log_entry = ProductItemLogEntry.objects.create(
-                        action=ProductItemLogEntry.ActionChoices.MODIFY,
-                        user=request.user,
-                    )
                     log_created = True
             if "shelf_id" in request.data:
                 if (
                     prev_data.shelf_id != request.data["shelf_id"]
                     and log_created == False
                 ):
-                    log_entry = ProductItemLogEntry.objects.create(
-                        action=ProductItemLogEntry.ActionChoices.MODIFY,
-                        user=request.user,
-                    )
                     log_created = True
             if "barcode" in request.data:
                 if (
                     prev_data.barcode != request.data["barcode"]
                     and log_created == False
                 ):
-                    log_entry = ProductItemLogEntry.objects.create(
-                        action=ProductItemLogEntry.ActionChoices.MODIFY,
-                        user=request.user,
-                    )
                     log_created = True
-            for product_item in ProductItem.objects.filter(product=instance.id):
+            product_items = ProductItem.objects.filter(product=instance.id)
+            for product_item in product_items:
                 if "storage" in request.data:
                     product_item.storage = storage
                 if "shelf_id" in request.data:
                     product_item.shelf_id = request.data["shelf_id"]
                 if "barcode" in request.data:
                     product_item.barcode = request.data["barcode"]
-                if log_created == True:
-                    product_item.log_entries.add(log_entry)
                 product_item.save()
+            if log_created == True:
+                log_items(
+                    [product_item.id for product_item in product_items],
+                    ProductItemLogEntry.ActionChoices.MODIFY,
+                    request.user,
+                )
 
         if getattr(instance, "_prefetched_objects_cache", None):
             # If 'prefetch_related' has been applied to a queryset, we need to
@@ -475,9 +443,8 @@ class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Response(response.data)
 
 
-class ProductItemListPagination(PageNumberPagination):
+class ProductItemListPagination(OptionalCursorPagination):
     page_size = 30
-    page_size_query_param = "page_size"
 
 
 class ProductItemListFilter(filters.FilterSet):
@@ -495,9 +462,11 @@ class ProductItemListView(generics.ListAPIView):
     Lists all Product items
     """
 
-    queryset = ProductItem.objects.all()
+    queryset = ProductItem.objects.select_related("storage").prefetch_related(
+        Prefetch("product", queryset=Product.objects.for_catalog())
+    )
     serializer_class = ProductItemSerializer
-    pagination_class = ProductListPagination
+    pagination_class = ProductItemListPagination
     filter_backends = [filters.DjangoFilterBackend, OrderingFilter]
     ordering_fields = ["modified_date", "id", "available", "product", "storage"]
     ordering = ["-modified_date", "-id"]
@@ -560,15 +529,13 @@ class ProductItemDetailView(generics.RetrieveUpdateDestroyAPIView):
         serializer.is_valid(raise_exception=True)
         if "modify_date" in request.data:
             serializer.save(modified_date=timezone.now())
-            log_entry = ProductItemLogEntry.objects.create(
-                action=ProductItemLogEntry.ActionChoices.CIRCULATION, user=request.user
-            )
+            action = ProductItemLogEntry.ActionChoices.CIRCULATION
         else:
             serializer.save()
-            log_entry = ProductItemLogEntry.objects.create(
-                action=ProductItemLogEntry.ActionChoices.MODIFY, user=request.user
-            )
-        instance.log_entries.add(log_entry)
+            action = ProductItemLogEntry.ActionChoices.MODIFY
+        ProductItemLogEntry.objects.create(
+            action=action, user=request.user, product_item=instance
+        )
         data = serializer.data
 
         if getattr(instance, "_prefetched_objects_cache", None):
@@ -578,6 +545,50 @@ class ProductItemDetailView(generics.RetrieveUpdateDestroyAPIView):
 
         return Response(data)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            ProductAvailability.refresh([instance.product_id])
+
+
+class ProductItemLogPagination(OptionalCursorPagination):
+    page_size = 30
+
+
+@extend_schema_view(
+    get=extend_schema(responses=ProductItemLogEntryResponseSerializer()),
+)
+class ProductItemLogView(generics.ListAPIView):
+    """
+    Lists log entries of a Product item, newest first
+    """
+
+    serializer_class = ProductItemLogEntrySerializer
+    pagination_class = ProductItemLogPagination
+    ordering = ["-date", "-id"]
+
+    authentication_classes = [
+        SessionAuthentication,
+        BasicAuthentication,
+        JWTAuthentication,
+        CustomJWTAuthentication,
+    ]
+
+    permission_classes = [IsAuthenticated, HasGroupPermission]
+    required_groups = {
+        "GET": ["storage_group", "user_group"],
+    }
+
+    def get_queryset(self):
+        # the log outlives the item, entries of retired items are listed too
+        entries = ProductItemLogEntry.objects.filter(product_item_id=self.kwargs["pk"])
+        if (
+            not entries.exists()
+            and not ProductItem.objects.filter(pk=self.kwargs["pk"]).exists()
+        ):
+            raise NotFound()
+        return entries.order_by(*self.ordering)
+
 
 class ColorListView(generics.ListCreateAPIView):
     queryset = Color.objects.all()
@@ -754,6 +765,42 @@ class ProductStorageTransferView(APIView):
         return Response(serializer.data)
 
 
+@extend_schema_view(put=extend_schema(responses=ProductItemBulkStatusSerializer))
+class ProductItemBulkStatusView(APIView):
+    """View for changing status of a list of product items at once.
+    Items in shopping carts are left untouched."""
+
+    serializer_class = ProductItemBulkStatusSerializer
+
+    authentication_classes = [
+        SessionAuthentication,
+        BasicAuthentication,
+        JWTAuthentication,
+        CustomJWTAuthentication,
+    ]
+
+    permission_classes = [IsAuthenticated, HasGroupPermission]
+    required_groups = {
+        "PUT": ["storage_group", "user_group"],
+    }
+
+    def put(self, request, *args, **kwargs):
+        serializer = ProductItemBulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        item_status = serializer.validated_data["status"]
+        product_items = ProductItem.objects.filter(
+            id__in=serializer.validated_data["product_items"]
+        ).exclude(status="In cart")
+        item_ids = transition_product_items(product_items, item_status, request.user)
+
+        if item_status == "Available":
+            # checking if the returned products were in product watch list on any user
+            for product in Product.objects.filter(productitem__in=item_ids).distinct():
+                check_product_watch(product)
+
+        return Response({"status": item_status, "product_items": item_ids})
+
+
 class ShoppingCartAvailableAmountList(APIView):
     """View for getting Products in users shopping cart and their available amounts for ProductItems not already in shopping cart"""
 
@@ -773,20 +820,22 @@ class ShoppingCartAvailableAmountList(APIView):
             instance = ShoppingCart.objects.get(user=request.user)
         except ObjectDoesNotExist:
             return Response("Shopping cart for this user does not exist")
-        cartserializer = ShoppingCartDetailSerializer(instance)
-        product_ids = []
-        duplicate_checker = []
-        for product_item in cartserializer.data["product_items"]:
-            if product_item["product"]["id"] not in duplicate_checker:
-                product_id = product_item["product"]["id"]
-                amount = ProductItem.objects.filter(
-                    product=product_id, available=True
-                ).count()
-                pair = {"id": product_id, "amount": amount}
-                product_ids.append(pair)
-                duplicate_checker.append(product_id)
+        product_ids = (
+            instance.product_items.exclude(product=None)
+            .values_list("product", flat=True)
+            .distinct()
+        )
+        availabilities = ProductAvailability.objects.filter(product__in=product_ids)
+        amounts = {
+            availability.product_id: availability.available
+            for availability in availabilities
+        }
         returnserializer = ShoppingCartAvailableAmountListSerializer(
-            product_ids, many=True
+            [
+                {"id": product_id, "amount": amounts.get(product_id, 0)}
+                for product_id in product_ids
+            ],
+            many=True,
         )
         return Response(returnserializer.data)
 
@@ -820,9 +869,7 @@ class ReturnProductItemsView(generics.ListCreateAPIView):
             product = Product.objects.get(id=kwargs["pk"])
         except:
             return Response(status=status.HTTP_204_NO_CONTENT)
-        amount = ProductItem.objects.filter(
-            product=product, status="Unavailable"
-        ).count()
+        amount = getattr(product, "availability", ProductAvailability()).unavailable
         response = [{"amount": amount}]
 
         return Response(response)
@@ -833,18 +880,12 @@ class ReturnProductItemsView(generics.ListCreateAPIView):
         except ValueError:
             return Response(status=status.HTTP_400_BAD_REQUEST)
         product = Product.objects.get(id=kwargs["pk"])
-        product_itemset = ProductItem.objects.filter(
-            product=product, status="Unavailable"
-        )[:amount]
-        log_entry = ProductItemLogEntry.objects.create(
-            action=ProductItemLogEntry.ActionChoices.CIRCULATION, user=request.user
+        transition_product_items(
+            ProductItem.objects.filter(product=product, status="Unavailable"),
+            "Available",
+            request.user,
+            amount,
         )
-        for product_item in product_itemset:
-            product_item.available = True
-            product_item.status = "Available"
-            product_item.modified_date = timezone.now()
-            product_item.log_entries.add(log_entry)
-            product_item.save()
 
         # checking if the created product was in product watch list on any user
         check_product_watch(product)
@@ -894,18 +935,14 @@ class AddProductItemsView(generics.ListCreateAPIView):
             return Response(status=status.HTTP_400_BAD_REQUEST)
         product = Product.objects.get(id=kwargs["pk"])
         item = ProductItem.objects.filter(product=kwargs["pk"]).first()
-        log_entry = ProductItemLogEntry.objects.create(
-            action=ProductItemLogEntry.ActionChoices.CREATE, user=request.user
+        create_product_items(
+            product,
+            amount,
+            request.user,
+            storage=item.storage,
+            barcode=str(item.barcode),
+            shelf_id=str(item.shelf_id),
         )
-        for _ in range(amount):
-            product_item = ProductItem.objects.create(
-                product=product,
-                modified_date=timezone.now(),
-                storage=item.storage,
-                barcode=str(item.barcode),
-                shelf_id=str(item.shelf_id),
-            )
-            product_item.log_entries.add(log_entry)
 
         # checking if the created product was in product watch list on any user
         check_product_watch(product)
@@ -942,9 +979,7 @@ class RetireProductItemsView(generics.ListCreateAPIView):
             product = Product.objects.get(id=kwargs["pk"])
         except:
             return Response(status=status.HTTP_204_NO_CONTENT)
-        amount = ProductItem.objects.filter(
-            product=product, status="Available", available=True
-        ).count()
+        amount = getattr(product, "availability", ProductAvailability()).available
         response = [{"amount": amount}]
 
         return Response(response)
@@ -955,10 +990,10 @@ class RetireProductItemsView(generics.ListCreateAPIView):
         except ValueError:
             return Response(status=status.HTTP_400_BAD_REQUEST)
         product = Product.objects.get(id=kwargs["pk"])
-        product_itemset = ProductItem.objects.filter(
-            product=product, status="Available", available=True
-        )[:amount]
-        print(product_itemset)
-        for product_item in product_itemset:
-            product_item.delete()
+        retire_product_items(
+            ProductItem.objects.filter(
+                product=product, status="Available", available=True
+            ),
+            amount,
+        )
         return Response("items retired successfully")
@@ -0,0 +1,70 @@
+"""Finnish business days, weekdays that aren't Finnish public holidays.
+
+The business days of a year are computed once per process, as a bitmap of the days
+of the year and a running count of business days over it. is_business_day and
+business_days_between are then answered from them in constant time per year, and
+add_business_days with one binary search per year. Used for the maintenance time of
+rented bikes, see bikes.availability, and usable for any other date that has to fall
+on a business day, like pickup dates of orders.
+"""
+
+import datetime
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+
+import holidays
+
+
+@lru_cache(maxsize=None)
+def year_calendar(year):
+    """Bitmap of the business days of year, bit n being the nth day of the year, and
+    running counts where counts[n] is the amount of business days before the nth day
+    """
+    fin_holidays = holidays.FI(years=year)
+    first = datetime.date(year, 1, 1)
+    days = (datetime.date(year + 1, 1, 1) - first).days
+    bitmap = 0
+    counts = array("H", [0])
+    for number in range(days):
+        day = first + datetime.timedelta(days=number)
+        is_business = day.weekday() < 5 and day not in fin_holidays
+        bitmap |= is_business << number
+        counts.append(counts[-1] + is_business)
+    return bitmap, counts
+
+
+def day_number(day):
+    return day.timetuple().tm_yday - 1
+
+
+def is_business_day(day):
+    bitmap, _ = year_calendar(day.year)
+    return bool(bitmap >> day_number(day) & 1)
+
+
+def business_days_between(first, last):
+    """Amount of business days from first to last, both included"""
+    if last < first:
+        return 0
+    _, first_counts = year_calendar(first.year)
+    _, last_counts = year_calendar(last.year)
+    amount = last_counts[day_number(last) + 1] - first_counts[day_number(first)]
+    for year in range(first.year, last.year):
+        amount += year_calendar(year)[1][-1]
+    return amount
+
+
+def add_business_days(day, amount):
+    """The amount:th business day after day, amount being at least 1"""
+    year = day.year
+    _, counts = year_calendar(year)
+    target = counts[day_number(day) + 1] + amount
+    while target > counts[-1]:
+        target -= counts[-1]
+        year += 1
+        _, counts = year_calendar(year)
+    # counts[n + 1] reaches target on the business day n
+    return datetime.date(year, 1, 1) + datetime.timedelta(
+        days=bisect_left(counts, target) - 1
+    )
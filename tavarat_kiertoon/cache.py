@@ -0,0 +1,161 @@
+"""Versioned caching.
+
+Values are cached under keys containing the current version of their namespace.
+Bumping the version makes everything cached in the namespace stale at once, without
+having to know the keys, old entries just expire from the cache.
+
+Every model has its own namespace. The namespaces of the models registered with
+track_model_cache are bumped when an instance is saved or deleted. Other models aren't
+listened to, delete receivers would make Django load and signal every deleted row
+instead of deleting them with one query. Bulk writes don't send signals, so their
+callers bump the namespace once per operation with bump_model_cache_version.
+
+get_or_compute_many computes missing values single flight: the first caller missing a
+key takes a lock on it and computes it, other callers wait for it to be cached
+instead of computing it at the same time, so a miss under load costs one computation
+and not one per worker. The lock is a cache.add, atomic within the backend.
+
+Invalidation and the locks only reach the processes sharing the cache, so running
+several workers or cron jobs needs a shared backend, see the CACHE_BACKEND setting.
+With the default local memory cache, values are kept for LOCAL_CACHE_TIMEOUT seconds
+only, so that changes made by other processes are seen soon, and the deploy checks
+warn about it.
+"""
+
+import time
+
+from django.core import checks
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+CACHE_TIMEOUT = 60 * 60
+LOCAL_CACHE_TIMEOUT = 10
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+
+
+def is_local_cache():
+    """True when the cache lives in the memory of each process"""
+    return isinstance(caches["default"], LocMemCache)
+
+
+def cache_timeout():
+    """Seconds values are cached, short when other processes can't invalidate them"""
+    return LOCAL_CACHE_TIMEOUT if is_local_cache() else CACHE_TIMEOUT
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if not is_local_cache():
+        return []
+    return [
+        checks.Warning(
+            "The default cache is local to each process, cached values can't be "
+            "invalidated by the other workers and cron jobs.",
+            hint="Set CACHE_BACKEND and CACHE_LOCATION to a shared cache, e.g. "
+            "django.core.cache.backends.memcached.PyMemcacheCache.",
+            id="tavarat_kiertoon.W001",
+        )
+    ]
+
+
+def cache_version(namespace):
+    return cache.get_or_set(f"{namespace}:version", time.time_ns, timeout=None)
+
+
+def bump_cache_version(namespace):
+    """Invalidates everything cached in namespace. The version is bumped again when the
+    running transaction commits, so that values computed by other requests from the
+    data before the commit don't stay cached under the new version."""
+
+    def bump():
+        cache.set(f"{namespace}:version", time.time_ns(), timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def versioned_key(namespace, key):
+    return f"{namespace}:{cache_version(namespace)}:{key}"
+
+
+def versioned_keys(namespaces, key):
+    """versioned_key of key in each of namespaces, as namespace -> versioned key, with
+    the versions read in one cache call"""
+    version_keys = {namespace: f"{namespace}:version" for namespace in namespaces}
+    versions = cache.get_many(version_keys.values())
+    missing = [key for key in version_keys.values() if key not in versions]
+    for version_key in missing:
+        cache.add(version_key, time.time_ns(), timeout=None)
+    versions.update(cache.get_many(missing))
+    return {
+        namespace: f"{namespace}:{versions[version_key]}:{key}"
+        for namespace, version_key in version_keys.items()
+    }
+
+
+def versioned_cache(namespace, key, default):
+    """Returns value cached under key in namespace, calling default to compute and
+    cache it when it's missing"""
+    return cache.get_or_set(
+        versioned_key(namespace, key), default, timeout=cache_timeout()
+    )
+
+
+def get_or_compute_many(keys, compute):
+    """Returns key -> value of keys, computing the ones missing from the cache with
+    compute(missing keys) -> {key: value} and caching them. A key missing for many
+    callers at once is computed by one of them, the others wait for its value up to
+    LOCK_TIMEOUT seconds before computing it themselves."""
+    values = cache.get_many(keys)
+    waiting = [key for key in keys if key not in values]
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while waiting:
+        locked = [
+            key
+            for key in waiting
+            if cache.add(f"{key}:lock", True, timeout=LOCK_TIMEOUT)
+        ]
+        # the holder of a lock is stuck or gone, don't wait for it any longer
+        computing = waiting if time.monotonic() >= deadline else locked
+        if computing:
+            try:
+                # the value may have been cached right before the lock was taken
+                values.update(cache.get_many(computing))
+                missing = [key for key in computing if key not in values]
+                if missing:
+                    computed = compute(missing)
+                    cache.set_many(computed, timeout=cache_timeout())
+                    values.update(computed)
+            finally:
+                cache.delete_many([f"{key}:lock" for key in locked])
+        waiting = [key for key in waiting if key not in values]
+        if waiting:
+            time.sleep(LOCK_POLL_INTERVAL)
+            values.update(cache.get_many(waiting))
+            waiting = [key for key in waiting if key not in values]
+    return values
+
+
+def model_cache_namespace(model):
+    return f"model:{model._meta.label_lower}"
+
+
+def bump_model_cache_version(*models):
+    for model in models:
+        bump_cache_version(model_cache_namespace(model))
+
+
+def invalidate_model_cache(sender, **kwargs):
+    bump_model_cache_version(sender)
+
+
+def track_model_cache(*models):
+    """Bumps the namespace of each of models when an instance is saved or deleted.
+    Called for the models whose namespace has values cached per instance change."""
+    for model in models:
+        uid = f"invalidate_model_cache:{model._meta.label_lower}"
+        post_save.connect(invalidate_model_cache, sender=model, dispatch_uid=uid)
+        post_delete.connect(invalidate_model_cache, sender=model, dispatch_uid=uid)
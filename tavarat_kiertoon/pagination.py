@@ -0,0 +1,228 @@
+"""Pagination shared by the list views.
+
+OptionalCursorPagination is page number pagination which switches to cursor (keyset)
+pagination when the request has the cursor query parameter, empty for the first page.
+Cursor pages are filtered with WHERE on the ordering columns of the last row of the
+previous page instead of OFFSET, and don't COUNT(*) the whole queryset, so any page
+costs the same as the first one. Cursor pages are always in the default ordering of
+the view, tie-broken by id, and the response has next and previous but no count.
+The page_size of cursor pages is capped at max_cursor_page_size, page number pages
+keep the page_size limits of the view.
+
+Page number mode counts with EstimatedCountPaginator, so large counts come from the
+planner and small ones are counted once per PAGINATION_COUNT_CACHE_TIMEOUT.
+"""
+
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from datetime import date
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .cache import model_cache_namespace, versioned_key
+
+
+def encode_cursor(position, reverse):
+    data = json.dumps(
+        {"p": position, "r": reverse},
+        default=lambda value: value.isoformat() if isinstance(value, date) else value,
+    )
+    return b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns position and reverse flag of cursor made by encode_cursor"""
+    try:
+        data = json.loads(b64decode(cursor.encode(), validate=True))
+        return list(data["p"]), bool(data["r"])
+    except (BinasciiError, ValueError, TypeError, KeyError):
+        raise NotFound("Invalid cursor")
+
+
+def keyset_filter(ordering, position, reverse):
+    """Q matching the rows after position (before it if reverse) in ordering.
+    The first column is bounded on its own too, so that postgres can use it as an
+    index condition instead of filtering the rows before the position."""
+    match = Q()
+    equal = {}
+    for field, value in zip(ordering, position):
+        name = field.lstrip("-")
+        descending = field.startswith("-") != reverse
+        match |= Q(**equal, **{f"{name}__{'lt' if descending else 'gt'}": value})
+        equal[name] = value
+    first_field = ordering[0]
+    descending = first_field.startswith("-") != reverse
+    bound = Q(
+        **{f"{first_field.lstrip('-')}__{'lte' if descending else 'gte'}": position[0]}
+    )
+    return bound & match
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that doesn't COUNT(*) big querysets on every request.
+
+    When the planner estimates the queryset to have at least
+    PAGINATION_COUNT_ESTIMATE_THRESHOLD rows, the estimate is used as count. Otherwise
+    the exact count is cached for PAGINATION_COUNT_CACHE_TIMEOUT seconds under the SQL
+    of the queryset, so it's shared by requests with the same filters. The cached
+    counts are versioned by the model of the queryset, see tavarat_kiertoon.cache. The
+    counts of append only logs aren't invalidated by inserts and expire instead.
+    Estimated and cached counts may be off, so pages are not cut to them and pages past
+    them are empty instead of 404.
+    """
+
+    count_is_approximate = False
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        queryset = self.object_list.order_by()
+        sql, params = queryset.query.sql_with_params()
+        key = versioned_key(
+            model_cache_namespace(queryset.model),
+            f"count:{md5(repr((sql, params)).encode()).hexdigest()}",
+        )
+        count = cache.get(key)
+        if count is not None:
+            self.count_is_approximate = True
+            return count
+        estimate = self.estimate_count(queryset)
+        if estimate >= settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD:
+            self.count_is_approximate = True
+            return estimate
+        count = queryset.count()
+        cache.set(key, count, timeout=settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    @staticmethod
+    def estimate_count(queryset):
+        """Row estimate of the top node of the query plan, without running the query"""
+        plan = json.loads(queryset.explain(format="json"))
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def validate_number(self, number):
+        self.count  # evaluated first, it decides count_is_approximate
+        if self.count_is_approximate and str(number).isdigit() and int(number) > 0:
+            return int(number)
+        return super().validate_number(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_approximate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom : bottom + self.per_page], number, self
+        )
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    django_paginator_class = EstimatedCountPaginator
+    page_size_query_param = "page_size"
+    max_cursor_page_size = 200
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), self.page_query_param
+        )
+        self.ordering = self.get_cursor_ordering(view)
+        page_size = self.get_cursor_page_size(request)
+        cursor = request.query_params[self.cursor_query_param]
+        position, reverse = decode_cursor(cursor) if cursor else (None, False)
+        if position is not None and len(position) != len(self.ordering):
+            raise NotFound("Invalid cursor")
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [self.reverse_field(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(self.ordering, position, reverse))
+
+        # one extra row tells if there is a page after this one
+        rows = list(queryset[: page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page_rows = rows
+        return rows
+
+    def get_cursor_page_size(self, request):
+        return min(self.get_page_size(request), self.max_cursor_page_size)
+
+    def get_cursor_ordering(self, view):
+        ordering = list(getattr(view, "ordering", None) or ["-id"])
+        if not {"id", "-id", "pk", "-pk"} & set(ordering):
+            ordering.append("-id" if ordering[0].startswith("-") else "id")
+        return ordering
+
+    @staticmethod
+    def reverse_field(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    def get_position(self, row):
+        return [row.serializable_value(field.lstrip("-")) for field in self.ordering]
+
+    def get_cursor_link(self, row, reverse):
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            encode_cursor(self.get_position(row), reverse),
+        )
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.page_rows:
+            return None
+        return self.get_cursor_link(self.page_rows[-1], False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_rows:
+            return None
+        return self.get_cursor_link(self.page_rows[0], True)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Cursor pagination, empty for the first page.",
+                "schema": {"type": "string"},
+            }
+        ]
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
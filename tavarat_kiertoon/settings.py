@@ -61,10 +61,13 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "drf_spectacular",
     "holidays",
     "django_crontab",
     "pauseshop",
+    "emails",
+    "analytics",
 ]
 
 MIDDLEWARE = [
@@ -108,6 +111,26 @@ REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "EXCEPTION_HANDLER": "tavarat_kiertoon.exceptions.custom_exception_handler",
 }
+
+# Paginated lists report planner row estimates as count when the estimate is at least
+# this, smaller counts are counted exactly and cached for the timeout (seconds)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = config(
+    "PAGINATION_COUNT_ESTIMATE_THRESHOLD", default=10000, cast=int
+)
+PAGINATION_COUNT_CACHE_TIMEOUT = config(
+    "PAGINATION_COUNT_CACHE_TIMEOUT", default=60, cast=int
+)
+
+# Items reserved to a ShoppingCart are released this many minutes after the cart was
+# last changed
+CART_RESERVATION_MINUTES = config("CART_RESERVATION_MINUTES", default=120, cast=int)
+
+# Log entries older than this many days are moved from the database to compressed
+# files under LOG_ARCHIVE_DIR by the archive_logs command. A relative directory is
+# relative to BASE_DIR, cron doesn't run the command in the project directory.
+LOG_ARCHIVE_DAYS = config("LOG_ARCHIVE_DAYS", default=365, cast=int)
+LOG_ARCHIVE_DIR = BASE_DIR / config("LOG_ARCHIVE_DIR", default="log_archive")
+
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
@@ -128,6 +151,19 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/ref/settings/#caches
+# production needs a shared backend, see tavarat_kiertoon.cache
+
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": config("CACHE_LOCATION", default=""),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -257,7 +293,13 @@ EMAIL_USE_TLS = config("EMAIL_USE_TLS")
 
 URL_FRONT = config("URL_FRONT")
 
-CRONJOBS = [("0 * * * *", "cron.clear_shopping_carts", ">> /usr/src/app/file.log")]
+CRONJOBS = [
+    ("* * * * *", "cron.clear_shopping_carts", ">> /usr/src/app/file.log"),
+    ("* * * * *", "cron.send_search_watch_digests", ">> /usr/src/app/file.log"),
+    ("* * * * *", "cron.send_queued_mail", ">> /usr/src/app/file.log"),
+    ("*/10 * * * *", "cron.rollup_analytics", ">> /usr/src/app/file.log"),
+    ("30 3 * * *", "cron.archive_logs", ">> /usr/src/app/file.log"),
+]
 
 
 def add_status_code(record):
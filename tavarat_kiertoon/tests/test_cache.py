@@ -0,0 +1,44 @@
+import threading
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from tavarat_kiertoon.cache import (
+    CACHE_TIMEOUT,
+    LOCAL_CACHE_TIMEOUT,
+    cache_timeout,
+    check_shared_cache,
+    get_or_compute_many,
+)
+
+
+class TestCache(TestCase):
+    def test_single_flight_cache(self):
+        cache.clear()
+        computed = []
+
+        def compute(keys):
+            computed.append(keys)
+            return {key: key.upper() for key in keys}
+
+        # another worker is computing "b" and caches it while this one waits for it
+        cache.add("b:lock", True)
+        worker = threading.Timer(0.2, cache.set, ["b", "B of the other worker"])
+        worker.start()
+        values = get_or_compute_many(["a", "b"], compute)
+        worker.join()
+        self.assertEqual(values, {"a": "A", "b": "B of the other worker"})
+        self.assertEqual(computed, [["a"]])
+        self.assertEqual(get_or_compute_many(["a", "b"], compute), values)
+        self.assertEqual(computed, [["a"]])
+
+    def test_local_cache_timeout(self):
+        # other workers can't invalidate a per process cache, keep values shortly
+        self.assertEqual(cache_timeout(), LOCAL_CACHE_TIMEOUT)
+        self.assertEqual(
+            [error.id for error in check_shared_cache(None)], ["tavarat_kiertoon.W001"]
+        )
+        shared = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(cache_timeout(), CACHE_TIMEOUT)
+            self.assertEqual(check_shared_cache(None), [])
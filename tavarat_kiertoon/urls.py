@@ -21,6 +21,11 @@ from django.contrib import admin
 from django.urls import include, path
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from analytics.views import (
+    ArchivedItemLogView,
+    ArchivedUserLogView,
+    ItemActionStatListView,
+)
 from bulletins.views import BulletinDetailView, BulletinListView
 from categories.views import CategoryDetailView, CategoryListView, CategoryTreeView
 from contact_forms.views import (
@@ -46,7 +51,9 @@ from products.views import (
     PictureDetailView,
     PictureListView,
     ProductDetailView,
+    ProductItemBulkStatusView,
     ProductItemDetailView,
+    ProductItemLogView,
     ProductItemListView,
     ProductListView,
     ProductStorageListView,
@@ -105,7 +112,9 @@ urlpatterns = [
     path("products/", ProductListView.as_view()),
     path("products/<int:pk>/", ProductDetailView.as_view()),
     path("products/items/", ProductItemListView.as_view()),
+    path("products/items/bulk_status/", ProductItemBulkStatusView.as_view()),
     path("products/items/<int:pk>/", ProductItemDetailView.as_view()),
+    path("products/items/<int:pk>/log/", ProductItemLogView.as_view()),
     path("products/<int:pk>/return/", ReturnProductItemsView.as_view()),
     path("products/<int:pk>/add/", AddProductItemsView.as_view()),
     path("products/<int:pk>/retire/", RetireProductItemsView.as_view()),
@@ -156,6 +165,9 @@ urlpatterns = [
     path("pausestore/", PauseView.as_view()),
     path("pausestore/today", TodayPauseView.as_view()),
     path("pausestore/<int:pk>/", PauseEditView.as_view()),
+    path("analytics/item_actions/", ItemActionStatListView.as_view()),
+    path("analytics/archive/item_log/", ArchivedItemLogView.as_view()),
+    path("analytics/archive/user_log/", ArchivedUserLogView.as_view()),
 ] + static(
     settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
 )  # works only during developoment? check when ready for deplayment?
@@ -1,14 +1,9 @@
 from django.conf import settings
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
-from django.core.mail import send_mail
 from django.utils.crypto import constant_time_compare
 from django.utils.http import base36_to_int
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from products.models import Color, Product
-
-from .models import SearchWatch
-
 
 def validate_email_domain(email):
     if "@" in email:
@@ -48,41 +43,6 @@ def cookie_setter(key, value, remember_me, response):
     )
 
 
-def check_product_watch(product: Product, additional_info="") -> bool:
-    """
-    Function to check if all search words and colors of the watch list is found in product and sends email to person with match.
-    """
-
-    colors = [color.name.lower() for color in Color.objects.all()]
-    product_colors = [color.name.lower() for color in product.colors.all()]
-    for search in SearchWatch.objects.all():
-        match = True
-        for word in search.words:
-            if word.lower() in colors:
-                if word.lower() not in product_colors:
-                    match = False
-                    break
-            elif word.lower() not in product.name.lower():
-                match = False
-                break
-        if match:
-            subject = f"Uusi tuote saatavilla sinun hakuvahdin mukaan: {product.name}"
-            message = (
-                f"Löytyi uusi tuote hakusanalla: {', '.join(search.words)}.\n\n"
-                f"Sen nimi on: {additional_info}{product.name} ja tuote löytyy tavarat kiertoon järjestelmästä nyt."
-                f"\n\Linkki tuotteeseen: {settings.URL_FRONT}tuotteet/{product.id}"
-                f"\n\nJos haluat poistaa tämän hakuvahdin, sinun pitää olla kirjautuneena tavarat kiertoon järjestelmään ja mene osoitteeseen: {settings.URL_FRONT}tili/hakuvahti"
-            )
-
-            send_mail(
-                subject,
-                message,
-                settings.EMAIL_HOST_USER,
-                [search.user.email],
-                fail_silently=False,
-            )
-
-
 class CustomTimeTokenGenerator(PasswordResetTokenGenerator):
     """
     copy of PasswordResetTokenGenerator,
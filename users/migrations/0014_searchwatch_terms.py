@@ -0,0 +1,67 @@
+# Generated by Django 4.1.4 on 2026-10-17 11:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def index_search_watches(apps, schema_editor):
+    """Same as SearchWatch.update_terms for the existing watches"""
+    SearchWatch = apps.get_model("users", "SearchWatch")
+    SearchWatchTerm = apps.get_model("users", "SearchWatchTerm")
+    terms = []
+    for watch in SearchWatch.objects.all():
+        watch_terms = {str(word).strip().lower()[:50] for word in watch.words}
+        watch_terms.discard("")
+        terms += [SearchWatchTerm(watch=watch, term=term) for term in watch_terms]
+    SearchWatchTerm.objects.bulk_create(terms)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0024_productitem_modified_idx"),
+        ("users", "0013_alter_customuser_group"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchWatchTerm",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("term", models.CharField(max_length=50)),
+                (
+                    "watch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="terms",
+                        to="users.searchwatch",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ProductWatchCheck",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "additional_info",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="products.product",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="searchwatchterm",
+            constraint=models.UniqueConstraint(
+                fields=("term", "watch"), name="unique_searchwatchterm"
+            ),
+        ),
+        migrations.RunPython(index_search_watches, migrations.RunPython.noop),
+    ]
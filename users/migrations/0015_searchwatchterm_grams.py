@@ -0,0 +1,44 @@
+# Generated by Django 4.1.4 on 2026-10-17 16:20
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+def index_term_grams(apps, schema_editor):
+    """Same as users.models.term_grams for the existing terms"""
+    SearchWatchTerm = apps.get_model("users", "SearchWatchTerm")
+    terms = list(SearchWatchTerm.objects.all())
+    for term in terms:
+        if len(term.term) < 3:
+            term.grams = [term.term]
+        else:
+            term.grams = sorted(
+                {term.term[start : start + 3] for start in range(len(term.term) - 2)}
+            )
+    SearchWatchTerm.objects.bulk_update(terms, ["grams"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0014_searchwatch_terms"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="searchwatchterm",
+            name="grams",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.CharField(max_length=3), default=list, size=None
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(index_term_grams, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="searchwatchterm",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["grams"], name="searchwatchterm_grams_idx"
+            ),
+        ),
+    ]
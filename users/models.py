@@ -4,7 +4,16 @@ from django.contrib.auth.models import (
     Group,
     PermissionsMixin,
 )
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+# longest indexed SearchWatch term, longer words are indexed by their beginning
+MAX_TERM_LENGTH = 50
+# terms are indexed by their substrings of this length, shorter terms by themselves
+GRAM_LENGTH = 3
 
 # Create your models here.
 
@@ -185,3 +194,74 @@ class SearchWatch(models.Model):
 
     def __str__(self) -> str:
         return f"Search watch for {self.user} , with words: {self.words}"
+
+    def update_terms(self):
+        """Replaces the indexed terms of the watch with its current words"""
+        self.terms.all().delete()
+        SearchWatchTerm.objects.bulk_create(
+            [
+                SearchWatchTerm(watch=self, term=term, grams=term_grams(term))
+                for term in watch_terms(self.words)
+            ]
+        )
+
+
+def watch_terms(words):
+    """Normalized terms of SearchWatch words, in the form they are matched in"""
+    terms = {str(word).strip().lower()[:MAX_TERM_LENGTH] for word in words}
+    terms.discard("")
+    return terms
+
+
+def term_grams(term):
+    """Distinct GRAM_LENGTH long substrings of term, or term itself when it's shorter.
+    A name can contain the term only if it contains all of them."""
+    if len(term) < GRAM_LENGTH:
+        return [term]
+    return sorted(
+        {
+            term[start : start + GRAM_LENGTH]
+            for start in range(len(term) - GRAM_LENGTH + 1)
+        }
+    )
+
+
+class SearchWatchTerm(models.Model):
+    """Inverted index of SearchWatch words, one row per term of a watch.
+    Kept up to date on every save of a SearchWatch, see users.watch for matching."""
+
+    id = models.BigAutoField(primary_key=True)
+    watch = models.ForeignKey(
+        SearchWatch, on_delete=models.CASCADE, related_name="terms"
+    )
+    term = models.CharField(max_length=MAX_TERM_LENGTH)
+    grams = ArrayField(models.CharField(max_length=GRAM_LENGTH))
+
+    def __str__(self) -> str:
+        return f"Search watch term: {self.term} ({self.watch_id})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["term", "watch"], name="unique_searchwatchterm"
+            ),
+        ]
+        indexes = [GinIndex(fields=["grams"], name="searchwatchterm_grams_idx")]
+
+
+@receiver(post_save, sender=SearchWatch)
+def index_search_watch(sender, instance, **kwargs):
+    instance.update_terms()
+
+
+class ProductWatchCheck(models.Model):
+    """Product waiting to be matched against SearchWatches by
+    users.watch.send_search_watch_digests"""
+
+    id = models.BigAutoField(primary_key=True)
+    product = models.ForeignKey("products.Product", on_delete=models.CASCADE)
+    additional_info = models.CharField(max_length=255, default="", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"Search watch check of {self.product_id} ({self.id})"
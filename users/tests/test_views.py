@@ -7,12 +7,13 @@ from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
 from categories.models import Category
+from emails.outbox import send_queued_mail
 from orders.models import ShoppingCart
 from products.models import Color, Product, Storage
-from users.custom_functions import check_product_watch
 from users.models import CustomUser, SearchWatch, UserAddress, UserLogEntry
 from users.permissions import is_in_group
 from users.serializers import GroupPermissionsSerializer
+from users.watch import check_product_watch, send_search_watch_digests
 
 
 # check the changed data is the same data as the changed data instead htat jsut the data has changed.
@@ -977,6 +978,7 @@ class TestUsers(TestCase):
         self.assertEqual(
             response.status_code, 200, "should get 200 even on non existing username"
         )
+        send_queued_mail()
         self.assertEqual(
             len(mail.outbox),
             0,
@@ -995,6 +997,7 @@ class TestUsers(TestCase):
         user.save()
 
         # checking the front url is in reset email
+        send_queued_mail()
         self.assertTrue(
             (settings.PASSWORD_RESET_URL_FRONT in mail.outbox[0].body),
             "password reset front url should be in reset email",
@@ -1163,6 +1166,7 @@ class TestUsers(TestCase):
         response = self.client.post(url, data, content_type="application/json")
 
         # testing that email was sent
+        send_queued_mail()
         self.assertEqual(
             len(mail.outbox),
             1,
@@ -1187,6 +1191,7 @@ class TestUsers(TestCase):
         url = "/users/activate/"
 
         # checking that te front url is in the  activation mail
+        send_queued_mail()
         self.assertTrue(
             (settings.USER_ACTIVATION_URL_FRONT in mail.outbox[0].body),
             "front address should be in activation mail",
@@ -1300,6 +1305,7 @@ class TestUsers(TestCase):
             204, response.status_code, "should not be valid on non valid email domain,"
         )
 
+        send_queued_mail()
         self.assertEqual(
             len(mail.outbox),
             0,
@@ -1309,6 +1315,7 @@ class TestUsers(TestCase):
         # checking that the email was sent
         data = {"new_email": "t@turku.fi"}
         response = self.client.post(url, data, content_type="application/json")
+        send_queued_mail()
         self.assertEqual(
             len(mail.outbox),
             1,
@@ -1374,6 +1381,7 @@ class TestUsers(TestCase):
 
         data = {"new_email": "t@turku.fi"}
         response = self.client.post(url, data, content_type="application/json")
+        send_queued_mail()
         end_part_of_email_link = mail.outbox[0].body.split(
             settings.EMAIL_CHANGE_URL_FRONT
         )
@@ -1394,6 +1402,7 @@ class TestUsers(TestCase):
         user2 = self.login_test_admin()
         data = {"new_email": "t@turku.fi"}
         response = self.client.post(url, data, content_type="application/json")
+        send_queued_mail()
         end_part_of_email_link = mail.outbox[1].body.split(
             settings.EMAIL_CHANGE_URL_FRONT
         )
@@ -1608,6 +1617,8 @@ class TestUsers(TestCase):
 
         # testing the function when there is no matches but entris in seearch watch
         check_product_watch(product_for_test)
+        self.assertEqual(send_search_watch_digests(), 0)
+        send_queued_mail()
         self.assertEqual(
             len(mail.outbox), 0, "ei matcheja niin ei pitäisi lähteä emaileja"
         )
@@ -1616,26 +1627,62 @@ class TestUsers(TestCase):
         data = {"words": ["nahkasohva"]}
         SearchWatch.objects.create(words=data["words"], user=user)
         check_product_watch(product_for_test)
+        # matching happens only when the digests are sent
+        send_queued_mail()
+        self.assertEqual(len(mail.outbox), 0)
+        send_search_watch_digests()
+        send_queued_mail()
         self.assertEqual(
             len(mail.outbox), 1, "1 match (name) pitäisi olla joten 1 email"
         )
 
-        # testing the function when there is name and color match
+        # matches of all watches of the user come in one digest email
         mail.outbox.clear()
         data = {"words": ["punainen"]}
         SearchWatch.objects.create(words=data["words"], user=user)
-        check_product_watch(product_for_test)
+        data = {"words": ["punainen", "nahka"]}
+        SearchWatch.objects.create(words=data["words"], user=user)
+        # color word matches only the color of the product, not its name
+        SearchWatch.objects.create(words=["sininen"], user=user)
+        Color.objects.create(name="Sininen")
+        product_for_test.name = "sininen nahkasohva"
+        product_for_test.save()
+        check_product_watch(product_for_test, "palautettu: ")
+        self.assertEqual(send_search_watch_digests(), 1)
+        send_queued_mail()
         self.assertEqual(
-            len(mail.outbox), 2, "2 matchiä (name, color) pitäisi olla joten 2 mailia"
+            len(mail.outbox),
+            1,
+            "3 matchia (name, color, nimi + color) yhdessä mailissa",
+        )
+        self.assertIn("palautettu: sininen nahkasohva", mail.outbox[0].body)
+        self.assertIn(
+            "hakusanat: nahkasohva; punainen; punainen, nahka", mail.outbox[0].body
         )
 
-        # testing the function when there is name and color and comined name+color match
+        # watches follow changes of their words
+        watch = SearchWatch.objects.get(words=["sininen"])
+        watch.words = ["nahka"]
+        watch.save()
+        other_user = CustomUser.objects.exclude(id=user.id).first()
+        SearchWatch.objects.create(words=["SOHVA"], user=other_user)
         mail.outbox.clear()
-        data = {"words": ["punainen", "nahka"]}
-        SearchWatch.objects.create(words=data["words"], user=user)
         check_product_watch(product_for_test)
+        self.assertEqual(send_search_watch_digests(), 2)
+        send_queued_mail()
         self.assertEqual(
-            len(mail.outbox),
-            3,
-            "3 matchia (name, color, nimi + color) pitäis olla joten 3 mailia",
+            sorted(email.to[0] for email in mail.outbox),
+            sorted([user.email, other_user.email]),
         )
+
+        # terms match anywhere in long names, wildcard characters are literal
+        product_for_test.name = "iso " * 50 + "nahkasohva 100%"
+        product_for_test.save()
+        SearchWatch.objects.create(words=["sohva 100%"], user=other_user)
+        SearchWatch.objects.create(words=["n_hka%"], user=other_user)
+        mail.outbox.clear()
+        check_product_watch(product_for_test)
+        self.assertEqual(send_search_watch_digests(), 2)
+        send_queued_mail()
+        other_email = next(email for email in mail.outbox if email.to[0] != user.email)
+        self.assertIn("hakusanat: SOHVA; sohva 100%\n", other_email.body)
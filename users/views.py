@@ -2,8 +2,8 @@ from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model, logout
 from django.contrib.auth.models import Group, update_last_login
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
 from django.core.signing import Signer
+from django.db import transaction
 from django.middleware import csrf
 from django.utils.decorators import method_decorator
 from django.utils.encoding import force_bytes
@@ -25,7 +25,9 @@ from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenViewBase
 
+from emails.outbox import queue_mail
 from orders.models import ShoppingCart
+from tavarat_kiertoon.pagination import OptionalCursorPagination
 
 from .authenticate import CustomJWTAuthentication
 from .custom_functions import cookie_setter, get_tokens_for_user
@@ -79,6 +81,7 @@ class UserCreateListView(APIView):
     serializer_class = UserCreateSerializer
 
     @extend_schema(responses=UserCreateReturnResponseSchemaSerializer)
+    @transaction.atomic
     def post(self, request, format=None):
         # if no username field comes in request = normal user and email will be copied to username
         # if username comes it means the user will be "joint_user" and user will use the transmitted username
@@ -150,13 +153,7 @@ class UserCreateListView(APIView):
                     "Jos ette ole rekisteröityneet tavarat kiertoon järjestelmään, jättäkää tämä viesti huomioimatta."
                 )
 
-                send_mail(
-                    subject,
-                    message,
-                    settings.EMAIL_HOST_USER,
-                    [user.email],
-                    fail_silently=False,
-                )
+                queue_mail(subject, message, settings.EMAIL_HOST_USER, [user.email])
 
             return_serializer = UserCreateReturnSerializer(
                 data=serialized_values.data, context={"message": activate_url_back}
@@ -943,13 +940,7 @@ class UserPasswordResetMailView(APIView):
                 "Jos ette pyytäneet salasanan vaihtoa, jättäkää tämä viesti huomioimatta."
             )
 
-            send_mail(
-                subject,
-                message,
-                settings.EMAIL_HOST_USER,
-                [user.email],
-                fail_silently=False,
-            )
+            queue_mail(subject, message, settings.EMAIL_HOST_USER, [user.email])
 
             response = Response()
             response.status_code = status.HTTP_200_OK
@@ -1076,12 +1067,11 @@ class UserEmailChangeView(APIView):
                 "Jos ette pyytäneet sähköpostin vaihtoa, jättäkää tämä viesti huomioimatta."
             )
 
-            send_mail(
+            queue_mail(
                 subject,
                 message,
                 settings.EMAIL_HOST_USER,
                 [serializer.data["new_email"]],
-                fail_silently=False,
             )
 
             # if debug is on should retuirn the links in response for ease of testing
@@ -1150,9 +1140,8 @@ class UserEmailChangeFinishView(APIView):
             )
 
 
-class UserLogListPagination(PageNumberPagination):
+class UserLogListPagination(OptionalCursorPagination):
     page_size = 50
-    page_size_query_param = "page_size"
 
 
 class UserLogFilter(filters.FilterSet):
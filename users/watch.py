@@ -0,0 +1,127 @@
+"""Matching new Products to SearchWatches.
+
+Words of every SearchWatch are indexed as SearchWatchTerm rows. A term that is a Color
+name matches Products of that color, other terms match Products whose name contains
+them. Each term is indexed by its trigrams, and the name of a Product is split to its
+substrings of up to GRAM_LENGTH characters, linear in the length of the name. The
+terms whose every gram is in the name are found with the GIN index and checked to be
+contained in the name, then the watches that have all of their terms among the
+matched ones are returned, in one query, without going through the watches one by
+one.
+
+check_product_watch only queues the Product. send_search_watch_digests, run by cron,
+does the matching and queues one digest email per user for all of their matches.
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Lower
+from django.db.models.lookups import Contains
+
+from emails.outbox import queue_mail
+from products.models import Color
+
+from .models import GRAM_LENGTH, ProductWatchCheck, SearchWatch, SearchWatchTerm
+
+
+def name_grams(name):
+    """Substrings of name up to GRAM_LENGTH characters long, the term_grams of every
+    term contained in name are among them"""
+    return {
+        name[start : start + length]
+        for length in range(1, GRAM_LENGTH + 1)
+        for start in range(len(name) - length + 1)
+    }
+
+
+def matching_watch_ids(product):
+    """Ids of SearchWatches whose every term matches product"""
+    color_terms = Color.objects.annotate(term=Lower("name")).values("term")
+    product_color_terms = product.colors.annotate(term=Lower("name")).values("term")
+    name = product.name.lower()
+    name_matches = Q(grams__contained_by=list(name_grams(name))) & Q(
+        Contains(Value(name), F("term"))
+    )
+    matched_terms = SearchWatchTerm.objects.filter(
+        name_matches & ~Q(term__in=color_terms) | Q(term__in=product_color_terms)
+    )
+    term_count = (
+        SearchWatchTerm.objects.filter(watch=OuterRef("watch"))
+        .order_by()
+        .values("watch")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    return (
+        matched_terms.order_by()
+        .values("watch")
+        .annotate(matched=Count("id"), total=Subquery(term_count))
+        .filter(matched=F("total"))
+        .order_by("watch")
+        .values_list("watch", flat=True)
+    )
+
+
+def check_product_watch(product, additional_info=""):
+    """Queues product to be matched against SearchWatches"""
+    ProductWatchCheck.objects.create(product=product, additional_info=additional_info)
+
+
+def digest_message(matches):
+    """Email subject and message for one user, matches being list of
+    (ProductWatchCheck, list of words of the matching watches)"""
+    if len(matches) == 1:
+        subject = (
+            "Uusi tuote saatavilla sinun hakuvahdin mukaan: "
+            f"{matches[0][0].product.name}"
+        )
+    else:
+        subject = f"{len(matches)} uutta tuotetta saatavilla sinun hakuvahtiesi mukaan"
+    lines = ["Löytyi uusia tuotteita hakuvahtiesi mukaan.\n"]
+    for check, watch_words in matches:
+        words = "; ".join(", ".join(map(str, words)) for words in watch_words)
+        lines.append(
+            f"{check.additional_info}{check.product.name}, hakusanat: {words}\n"
+            f"Linkki tuotteeseen: {settings.URL_FRONT}tuotteet/{check.product.id}\n"
+        )
+    lines.append(
+        "Jos haluat poistaa hakuvahdin, sinun pitää olla kirjautuneena tavarat kiertoon "
+        f"järjestelmään ja mene osoitteeseen: {settings.URL_FRONT}tili/hakuvahti"
+    )
+    return subject, "\n".join(lines)
+
+
+def send_search_watch_digests():
+    """Matches the queued Products and queues one email per user with all the Products
+    matching their watches. Returns amount of queued emails."""
+    with transaction.atomic():
+        checks = list(
+            ProductWatchCheck.objects.select_for_update(skip_locked=True, of=("self",))
+            .select_related("product")
+            .order_by("id")
+        )
+        if not checks:
+            return 0
+        matching = {check: list(matching_watch_ids(check.product)) for check in checks}
+        watches = SearchWatch.objects.select_related("user").in_bulk(
+            {watch_id for watch_ids in matching.values() for watch_id in watch_ids}
+        )
+
+        # user -> product id -> (first check of the product, words of matching watches)
+        user_matches = defaultdict(dict)
+        for check, watch_ids in matching.items():
+            for watch_id in watch_ids:
+                watch = watches[watch_id]
+                product_matches = user_matches[watch.user].setdefault(
+                    check.product_id, (check, [])
+                )
+                product_matches[1].append(watch.words)
+
+        for user, product_matches in user_matches.items():
+            subject, message = digest_message(list(product_matches.values()))
+            queue_mail(subject, message, settings.EMAIL_HOST_USER, [user.email])
+        ProductWatchCheck.objects.filter(id__in=[check.id for check in checks]).delete()
+    return len(user_matches)